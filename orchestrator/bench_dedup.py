@@ -0,0 +1,123 @@
+"""Micro-benchmark for ``_deduplicate_chunks``.
+
+Compares the vectorized MMR selector against the previous pairwise Python
+loop on synthetic candidates shaped like Qdrant matches (384-dim vectors,
+a few dozen domains, mixed publish dates).
+
+    python orchestrator/bench_dedup.py --candidates 100 1000 5000
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from server import DEDUP_THRESHOLD, _deduplicate_chunks, _parse_date, _source_type  # noqa: E402
+
+
+def _legacy_deduplicate(matches: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """The pre-MMR O(n^2) implementation, kept here as the baseline."""
+
+    def cosine(a, b):
+        a_vec, b_vec = np.array(a), np.array(b)
+        return float(np.dot(a_vec, b_vec) / ((np.linalg.norm(a_vec) * np.linalg.norm(b_vec)) + 1e-10))
+
+    unique: List[Dict[str, Any]] = []
+    diversity: Dict[str, int] = {}
+    for match in matches:
+        vec = match.get("vector")
+        meta = match.get("metadata", {})
+        dom = meta.get("domain", "")
+        pub_date = _parse_date.__wrapped__(meta.get("publish_date", meta.get("meta_date", "")))
+        s_type = _source_type(dom)
+        duplicate = False
+        for existing in unique:
+            if vec is not None and existing.get("vector") is not None:
+                if cosine(vec, existing["vector"]) > DEDUP_THRESHOLD:
+                    duplicate = True
+                    break
+            if dom and dom == existing.get("metadata", {}).get("domain"):
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        if len(unique) > 5 and pub_date < datetime.now() - timedelta(days=365):
+            continue
+        if diversity.get(s_type, 0) >= 3:
+            continue
+        diversity[s_type] = diversity.get(s_type, 0) + 1
+        unique.append(match)
+
+    now = datetime.now()
+    for m in unique:
+        meta = m.get("metadata", {})
+        pub_date = _parse_date.__wrapped__(meta.get("publish_date", meta.get("meta_date", "")))
+        recency = max(0.0, 1 - (now - pub_date).days / 365)
+        m["confidence"] = m.get("score", 0) * 0.7 + recency * 0.3
+    unique.sort(key=lambda m: m["confidence"], reverse=True)
+    return unique[:k]
+
+
+def make_candidates(n: int, dim: int = 384, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    suffixes = ["arxiv.org", "medium.com", "wikipedia.org", "example.com", "news.site"]
+    domains = [f"d{i}.{rng.choice(suffixes)}" for i in range(max(4, n // 20))]
+    today = datetime.now()
+    out = []
+    for _ in range(n):
+        date = today - timedelta(days=rng.randint(0, 900))
+        out.append(
+            {
+                "text": "lorem ipsum",
+                "score": rng.random(),
+                "vector": np_rng.standard_normal(dim).tolist(),
+                "metadata": {
+                    "domain": rng.choice(domains),
+                    "publish_date": date.strftime(rng.choice(["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y/%m/%d"])),
+                },
+            }
+        )
+    out.sort(key=lambda m: m["score"], reverse=True)
+    return out
+
+
+def _time(fn, matches, k, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        batch = [{**m, "metadata": dict(m["metadata"])} for m in matches]
+        _parse_date.cache_clear()
+        start = time.perf_counter()
+        fn(batch, k)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("-k", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy-above", type=int, default=2000,
+                        help="skip the O(n^2) baseline for larger candidate counts")
+    args = parser.parse_args(argv)
+
+    print(f"{'candidates':>10} {'mmr_ms':>10} {'legacy_ms':>10} {'speedup':>8}")
+    for n in args.candidates:
+        matches = make_candidates(n)
+        new_ms = _time(_deduplicate_chunks, matches, args.k, args.repeat)
+        if n <= args.skip_legacy_above:
+            old_ms = _time(_legacy_deduplicate, matches, args.k, args.repeat)
+            print(f"{n:>10} {new_ms:>10.2f} {old_ms:>10.2f} {old_ms / new_ms:>7.1f}x")
+        else:
+            print(f"{n:>10} {new_ms:>10.2f} {'-':>10} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+"""Offline end-to-end benchmark for ``search_and_retrieve`` and ``rag_query``.
+
+Nothing leaves the machine.  A SearXNG stand-in answers with configurable
+per-engine latency and failure rates, a generated HTML corpus (realistic page
+sizes, a share of slow responders) is served from several loopback hosts,
+and vectors go to an in-process store.  Tool calls are driven at a fixed
+concurrency; latency percentiles, per-stage breakdowns, throughput and peak
+RSS are written as JSON so runs can be compared.
+
+    python orchestrator/bench_e2e.py --requests 40 --concurrency 8 --out after.json
+    python orchestrator/bench_e2e.py --requests 40 --concurrency 8 --compare before.json
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+try:
+    import orchestrator.server as srv
+except ImportError:  # run as a script next to server.py
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import server as srv
+
+WORDS = (
+    "search engine vector database embedding chunk page query retrieval latency throughput model "
+    "transformer token index payload cache network crawler benchmark cluster memory storage "
+    "compression protocol scheduler kernel compiler runtime graph neural attention context window "
+    "ranking relevance freshness citation source article research paper dataset evaluation metric"
+).split()
+
+# SearXNG's answer when an engine is blocked: an HTML CAPTCHA page, not JSON
+CAPTCHA = b"<html><body>Please complete the security check.</body></html>"
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(8, 24))
+    return " ".join(words).capitalize() + "."
+
+
+def make_page(idx: int, target_bytes: int, seed: int = 0) -> bytes:
+    """A news-article-like HTML page of roughly ``target_bytes``.
+
+    Navigation, inline script and footer boilerplate surround the article so
+    extraction has realistic work to do.
+    """
+    rng = random.Random(seed * 100003 + idx)
+    title = " ".join(rng.choices(WORDS, k=5)).title()
+    head = (
+        f"<html><head><title>{title}</title>"
+        f'<meta name="author" content="Author {idx % 37}">'
+        f'<meta name="date" content="2024-{1 + idx % 12:02d}-{1 + idx % 28:02d}">'
+        "<script>var tracking = {" + ",".join(f'"k{i}": {i}' for i in range(40)) + "};</script>"
+        "</head><body><nav>" + "".join(f'<a href="/s/{i}">Section {i}</a>' for i in range(25)) + "</nav>"
+        f"<article><h1>{title}</h1>"
+    )
+    tail = "</article><footer>" + "Copyright notice. " * 20 + "</footer></body></html>"
+    parts = [head]
+    size = len(head) + len(tail)
+    while size < target_bytes:
+        para = "<p>" + " ".join(_sentence(rng) for _ in range(rng.randint(3, 7))) + "</p>"
+        parts.append(para)
+        size += len(para)
+    parts.append(tail)
+    return "".join(parts).encode()
+
+
+class Corpus:
+    """Generated HTML pages served from ``hosts`` loopback addresses.
+
+    Page ``i`` lives on ``127.0.0.{1 + i % hosts}`` so per-host connection
+    limits behave as they would across real sites.  Sizes are log-normal
+    around ``median_kb``; ``slow_fraction`` of the pages answer after
+    ``slow_ms``.
+    """
+
+    def __init__(
+        self,
+        pages: int = 200,
+        hosts: int = 8,
+        median_kb: float = 40.0,
+        slow_fraction: float = 0.1,
+        slow_ms: float = 2000.0,
+        seed: int = 0,
+    ):
+        rng = random.Random(seed)
+        self.sizes = [int(min(1024, max(2, rng.lognormvariate(0, 0.8) * median_kb)) * 1024) for _ in range(pages)]
+        self.slow = {i for i in range(pages) if rng.random() < slow_fraction}
+        self.slow_ms = slow_ms
+        self.seed = seed
+        self._pages: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self._servers = [_serve((f"127.0.0.{h + 1}", 0), self._handler()) for h in range(hosts)]
+
+    def url(self, idx: int) -> str:
+        host, port = self._servers[idx % len(self._servers)].server_address[:2]
+        return f"http://{host}:{port}/p/{idx}.html"
+
+    def page(self, idx: int) -> bytes:
+        with self._lock:
+            if idx not in self._pages:
+                self._pages[idx] = make_page(idx, self.sizes[idx], self.seed)
+            return self._pages[idx]
+
+    def _handler(self):
+        corpus = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                try:
+                    idx = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                    body = corpus.page(idx)
+                except (ValueError, IndexError):
+                    self.send_error(404)
+                    return
+                if idx in corpus.slow:
+                    time.sleep(corpus.slow_ms / 1000)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def close(self) -> None:
+        for httpd in self._servers:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+class FakeSearx:
+    """SearXNG JSON endpoint stand-in with per-engine latency and failures.
+
+    ``engines`` maps an engine name to ``(latency_ms, failure_rate)``;
+    latencies are jittered by +-50%.  Each query deterministically links
+    ``results`` pages of ``corpus``, so overlapping prompts share pages.
+    """
+
+    def __init__(self, corpus: Corpus, engines: Dict[str, Tuple[float, float]], results: int = 10, seed: int = 0):
+        self.corpus = corpus
+        self.engines = engines
+        self.results = results
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.failures: Dict[str, int] = defaultdict(int)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _serve(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}/search"
+
+    def links(self, query: str) -> List[Dict[str, str]]:
+        rng = random.Random(zlib.crc32(srv._normalize_query(query).encode()))
+        n = len(self.corpus.sizes)
+        return [
+            {"title": f"{query} result {i}", "url": self.corpus.url(idx), "content": f"Snippet about {query}."}
+            for i, idx in enumerate(rng.sample(range(n), min(self.results, n)))
+        ]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                query = params.get("q", [""])[0]
+                engine = params.get("engines", [""])[0]
+                latency_ms, failure_rate = fake.engines.get(engine, (0.0, 1.0))
+                with fake._lock:
+                    fake.requests[engine] += 1
+                    delay = latency_ms * fake._rng.uniform(0.5, 1.5) / 1000
+                    failed = fake._rng.random() < failure_rate
+                    if failed:
+                        fake.failures[engine] += 1
+                time.sleep(delay)
+                if failed:
+                    body, ctype = CAPTCHA, "text/html"
+                else:
+                    results = [{**r, "engine": engine} for r in fake.links(query)]
+                    body, ctype = json.dumps({"results": results}).encode(), "application/json"
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def _serve(address, handler) -> ThreadingHTTPServer:
+    httpd = ThreadingHTTPServer(address, handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+class HashEmbedder:
+    """Model-free stand-in: L2-normalized hashed bag of words.
+
+    Isolates the orchestration cost (search, fetch, extract, store) from
+    model inference when ``--embedder hash`` is given.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in srv._bm25_tokens(text):
+                out[row, zlib.crc32(token.encode()) % self.dim] += 1.0
+        out[:, 0] += 1e-6
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+class StageTimer:
+    """Wall-clock durations of the pipeline stages, collected by wrapping them.
+
+    The wrapped callables are looked up as ``server`` module globals, so
+    replacing the attributes is enough to time every call.
+    """
+
+    STAGES = {
+        "search": "searx_top_links",
+        "fetch": "fetch_page_with_metadata",
+        "extract": "extract_page",
+        "upsert": "_upsert_texts",
+        "retrieve": "_smart_rag_search_many",
+        "dedup": "_deduplicate_chunks",
+    }
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self._originals: Dict[str, Any] = {}
+
+    def _wrap(self, stage: str, fn):
+        durations = self.durations[stage]
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    durations.append(time.perf_counter() - start)
+        else:
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    durations.append(time.perf_counter() - start)
+        return timed
+
+    def install(self) -> None:
+        for stage, attr in self.STAGES.items():
+            self._originals[attr] = getattr(srv, attr)
+            setattr(srv, attr, self._wrap(stage, self._originals[attr]))
+        # The embedding service is an instance; time its encode() in place
+        self._originals["_embedder.encode"] = srv._embedder.encode
+        srv._embedder.encode = self._wrap("embed", srv._embedder.encode)
+
+    def uninstall(self) -> None:
+        if "_embedder.encode" in self._originals:
+            srv._embedder.encode = self._originals.pop("_embedder.encode")
+        for attr, fn in self._originals.items():
+            setattr(srv, attr, fn)
+        self._originals.clear()
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {stage: _summary(d) for stage, d in self.durations.items() if d}
+
+
+def _summary(durations: List[float]) -> Dict[str, float]:
+    ms = np.asarray(durations) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": len(durations),
+        "total_ms": round(float(ms.sum()), 1),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+def make_workload(requests: int, prompts: int, rag_ratio: float, seed: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+    """``requests`` tool calls over ``prompts`` distinct topics.
+
+    Topics repeat, so later calls exercise the caches the way a real session
+    does; ``rag_ratio`` of the calls are ``rag_query``.
+    """
+    rng = random.Random(seed)
+    topics = [" ".join(rng.sample(WORDS, 3)) for _ in range(prompts)]
+    calls = []
+    for _ in range(requests):
+        topic = rng.choice(topics)
+        if rng.random() < rag_ratio:
+            calls.append(("rag_query", {"query": topic}))
+        else:
+            calls.append(("search_and_retrieve", {"prompt": topic}))
+    return calls
+
+
+def _peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is in KiB on Linux; children covers the reaped extraction workers
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+async def _setup(args, store_dir: str) -> float:
+    start = time.perf_counter()
+    factory = (lambda: HashEmbedder()) if args.embedder == "hash" else srv._load_embed_model
+    srv._embedder = srv.EmbeddingService(factory)
+    await srv._embedder.encode(["warm up"])
+    if args.store == "local":
+        store = srv.LocalVectorStore(store_dir)
+    else:
+        from qdrant_client import QdrantClient
+
+        store = srv.QdrantStore(QdrantClient(":memory:"))
+    store.bootstrap(srv._embedder.dim)
+    srv._vector_store = store
+    return time.perf_counter() - start
+
+
+async def _drive(calls: List[Tuple[str, Dict[str, Any]]], concurrency: int):
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    response_chars: Dict[str, List[int]] = defaultdict(list)
+    partial = 0
+    todo = iter(calls)
+
+    async def worker():
+        nonlocal partial
+        for tool, arguments in todo:
+            handler = srv.search_and_retrieve if tool == "search_and_retrieve" else srv.rag_query
+            start = time.perf_counter()
+            try:
+                out = await handler(tool, arguments)
+                text = out[0].text
+                response_chars[tool].append(len(text))
+                # RESPONSE_FORMAT=text answers are not JSON
+                body = json.loads(text) if text.startswith("{") else {}
+                if "error" in body:
+                    errors[tool] += 1
+                partial += bool(body.get("partial"))
+            except Exception as e:
+                errors[tool] += 1
+                print(f"{tool} failed: {e!r}", file=sys.stderr)
+            latencies[tool].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, response_chars, partial, time.perf_counter() - start
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    engines = dict(_parse_engine(spec) for spec in args.engines)
+    corpus = Corpus(args.pages, args.hosts, args.page_kb, args.slow_fraction, args.slow_ms, args.seed)
+    searx = FakeSearx(corpus, engines, args.results, args.seed)
+    srv.SEARX_URL = searx.url
+    srv.SEARCH_ENGINES = list(engines)
+    srv.TOP_K = args.top_k
+    srv.RAG_CACHE = srv.RagCache(srv.RAG_CACHE_MAX_ENTRIES, srv.RAG_CACHE_MAX_BYTES, srv.CACHE_TTL)
+    srv.ENGINE_SCOREBOARD = srv.EngineScoreboard()
+    # The stand-in has no limiter of its own; cap searches only when asked to
+    srv.HTTP_POOL = srv.HttpPool(searx_rate=args.searx_rate)
+    for cache in (srv.SEARCH_CACHE, srv.PAGE_STORE):
+        if cache is not None:
+            cache.close()
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Caches start empty in a scratch database, or are switched off
+        cache_db = str(Path(tmp) / "cache.sqlite3")
+        srv.SEARCH_CACHE = srv.SearchCache(srv.SEARCH_CACHE_TTL, cache_db) if args.caches else None
+        srv.PAGE_STORE = srv.PageStore(cache_db) if args.caches else None
+        srv.SEMANTIC_CACHE = (
+            srv.SemanticCache(srv.SEMANTIC_CACHE_MAX_ENTRIES, srv.SEMANTIC_CACHE_THRESHOLD, srv.SEMANTIC_CACHE_TTL)
+            if args.caches
+            else None
+        )
+        try:
+            setup_s = await _setup(args, str(Path(tmp) / "vectors"))
+            timer.install()
+            calls = make_workload(args.requests, args.prompts, args.rag_ratio, args.seed)
+            latencies, errors, response_chars, partial, wall_s = await _drive(calls, args.concurrency)
+        finally:
+            timer.uninstall()
+            srv._shutdown_extract_pool()
+            pool_stats = srv.HTTP_POOL.stats()
+            await srv.HTTP_POOL.aclose()
+            for closable in (srv.SEARCH_CACHE, srv.PAGE_STORE, srv._embedder, srv._vector_store):
+                if closable is not None:
+                    closable.close()
+            searx.close()
+            corpus.close()
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "totals": {
+            "requests": len(calls),
+            "errors": sum(errors.values()),
+            "partial": partial,
+            "wall_s": round(wall_s, 3),
+            "throughput_rps": round(len(calls) / wall_s, 2) if wall_s else 0.0,
+            "setup_s": round(setup_s, 3),
+        },
+        "tools": {
+            tool: {
+                **_summary(d),
+                "errors": errors[tool],
+                "mean_response_chars": round(float(np.mean(response_chars[tool])), 1) if response_chars[tool] else 0.0,
+            }
+            for tool, d in latencies.items()
+        },
+        "stages": timer.report(),
+        "http_pool": pool_stats,
+        "searx": {"requests": dict(searx.requests), "failures": dict(searx.failures)},
+        "embedding": srv._embedder.stats(),
+        "rag_cache": srv.RAG_CACHE.stats(),
+        "semantic_cache": srv.SEMANTIC_CACHE.stats() if srv.SEMANTIC_CACHE is not None else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _parse_engine(spec: str) -> Tuple[str, Tuple[float, float]]:
+    name, latency_ms, failure_rate = (spec.split(":") + ["0", "0"])[:3]
+    return name, (float(latency_ms), float(failure_rate))
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Side-by-side lines for the latency and throughput figures of two runs."""
+    lines = [f"{'metric':<36} {'baseline':>10} {'current':>10} {'change':>8}"]
+
+    def row(name: str, old: Optional[float], new: Optional[float]) -> None:
+        if old is None or new is None:
+            return
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        lines.append(f"{name:<36} {old:>10.2f} {new:>10.2f} {change:>8}")
+
+    row("throughput_rps", baseline["totals"].get("throughput_rps"), current["totals"].get("throughput_rps"))
+    row("peak_rss_mb.self", baseline["peak_rss_mb"].get("self"), current["peak_rss_mb"].get("self"))
+    for section in ("tools", "stages"):
+        for name, stats in current[section].items():
+            old = baseline.get(section, {}).get(name, {})
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                row(f"{section}.{name}.{key}", old.get(key), stats.get(key))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40, help="tool calls to make")
+    parser.add_argument("--concurrency", type=int, default=4, help="tool calls in flight")
+    parser.add_argument("--prompts", type=int, default=10, help="distinct topics the calls draw from")
+    parser.add_argument("--rag-ratio", type=float, default=0.5, help="share of calls that are rag_query")
+    parser.add_argument("--engines", nargs="+", default=["bing:300:0.05", "brave:500:0.1", "qwant:800:0.3"],
+                        help="name:latency_ms:failure_rate per SearXNG engine")
+    parser.add_argument("--searx-rate", default="", help="SEARX_RATE_LIMIT to apply, e.g. 20/60 (default: none)")
+    parser.add_argument("--results", type=int, default=10, help="links per SearXNG answer")
+    parser.add_argument("--top-k", type=int, default=srv.TOP_K, help="links fetched per query (TOP_K)")
+    parser.add_argument("--pages", type=int, default=200, help="corpus size")
+    parser.add_argument("--hosts", type=int, default=8, help="loopback hosts serving the corpus")
+    parser.add_argument("--page-kb", type=float, default=40.0, help="median page size")
+    parser.add_argument("--slow-fraction", type=float, default=0.1, help="share of slow pages")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="delay of a slow page")
+    parser.add_argument("--embedder", choices=["model", "hash"], default="model",
+                        help="EMBED_BACKEND model, or a model-free hashing stand-in")
+    parser.add_argument("--store", choices=["local", "memory"], default="local",
+                        help="LocalVectorStore, or Qdrant's in-process :memory: mode")
+    parser.add_argument("--caches", action="store_true", help="enable the search, page and semantic caches (start empty)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON result here")
+    parser.add_argument("--compare", help="baseline JSON result to compare against")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run_benchmark(args))
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    print(text)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print("\n".join(compare(result, baseline)), file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Throughput and memory benchmark for the embedding backends.
+
+Each backend (see ``EMBED_BACKEND``) is loaded in a fresh subprocess so the
+reported peak RSS covers only that backend's imports and weights.  Cosine
+agreement is measured against the first backend listed.
+
+    python orchestrator/bench_embed.py --backends flag onnx onnx-int8 --texts 512
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+
+def make_texts(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = (
+        "search engine vector database embedding chunk page query retrieval latency "
+        "throughput model transformer token index payload cache network crawler"
+    ).split()
+    # Roughly CHUNK_CHARS-sized passages, like the chunks bulk_retrieve embeds
+    return [" ".join(rng.choice(words, size=rng.integers(30, 60))) for _ in range(n)]
+
+
+def _worker(backend: str, n: int, batch: int, out_path: str) -> None:
+    from server import _load_embed_model
+
+    texts = make_texts(n)
+    start = time.perf_counter()
+    model = _load_embed_model(backend)
+    load_s = time.perf_counter() - start
+    model.encode(texts[:batch])  # warm-up
+    start = time.perf_counter()
+    vectors = np.concatenate([np.asarray(model.encode(texts[i:i + batch])) for i in range(0, n, batch)])
+    encode_s = time.perf_counter() - start
+    np.save(out_path, vectors)
+    print(json.dumps({
+        "load_s": load_s,
+        "texts_per_s": n / encode_s,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["flag", "onnx", "onnx-int8"])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        _worker(args.worker, args.texts, args.batch, args.out)
+        return
+
+    print(f"{'backend':>10} {'load_s':>8} {'texts/s':>9} {'rss_mb':>8} {'min_cos':>8}")
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends:
+            out = str(Path(tmp) / f"{backend}.npy")
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", backend, "--out", out,
+                 "--texts", str(args.texts), "--batch", str(args.batch)],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                error = (proc.stderr.strip().splitlines() or [f"exit {proc.returncode}"])[-1]
+                print(f"{backend:>10} failed: {error}")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            vectors = np.load(out)
+            if reference is None:
+                reference = vectors
+            cos = np.sum(reference * vectors, axis=1) / (
+                np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+            )
+            print(
+                f"{backend:>10} {result['load_s']:>8.2f} {result['texts_per_s']:>9.1f} "
+                f"{result['rss_mb']:>8.0f} {cos.min():>8.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,5 +11,5 @@ TOP_K = 3
 # Maximum characters to keep per fetched page
 PER_PAGE_CHARS = 5000
 
-# Maximum characters across all pages
+# Maximum characters in one tool response (0 = unlimited)
 TOTAL_CHARS = 25000
@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+
+class FakeSearx:
+    """Local SearXNG stand-in: per-engine latency, failures and request log."""
+
+    def __init__(self):
+        self.latency = {}  # engine -> seconds
+        self.failing = set()  # engines answering with an HTML CAPTCHA page
+        self.status = 200
+        self.requests = []
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/search"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                query = params.get("q", [""])[0]
+                engine = params.get("engines", [""])[0]
+                with fake.lock:
+                    fake.requests.append((query, engine))
+                time.sleep(fake.latency.get(engine, 0))
+                if engine in fake.failing:
+                    body, ctype = b"<html>captcha</html>", "text/html"
+                else:
+                    results = [
+                        {
+                            "title": f"{query} {i}",
+                            "url": f"https://site{i}.example/{query.replace(' ', '-')}",
+                            "content": f"snippet {i}",
+                            "engine": engine,
+                        }
+                        for i in range(5)
+                    ]
+                    body, ctype = json.dumps({"results": results}).encode(), "application/json"
+                self.send_response(fake.status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fake_searx(monkeypatch):
+    import orchestrator.server as srv
+
+    fake = FakeSearx()
+    monkeypatch.setattr(srv, "SEARX_URL", fake.url)
+    yield fake
+    fake.close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(monkeypatch):
+    """Keep tests away from the on-disk caches under ~/.cache and from each other."""
+    import orchestrator.server as srv
+
+    monkeypatch.setattr(srv, "PAGE_STORE", None)
+    monkeypatch.setattr(srv, "SEARCH_CACHE", None)
+    monkeypatch.setattr(srv, "SEMANTIC_CACHE", None)
@@ -1,15 +1,277 @@
+"""Bulk-load local documents into the vector store that ``rag_query`` searches.
+
+Directories are walked recursively.  Files are read, extracted and chunked
+on a process pool, then embedded and upserted in large batches through the
+same ``_upsert_texts`` path as fetched web pages.  A SQLite manifest of
+content hashes makes re-runs skip unchanged files and lets an interrupted
+run resume where it stopped; files deleted under an ingested directory are
+dropped from the manifest and the store.  Files are not held to the web-page
+chunk cap, only to ``--max-chunks`` (default ``INGEST_MAX_CHUNKS``, 0 =
+unlimited).  Ingested chunks are pinned, so cache maintenance never expires
+or evicts them.
+
+    python orchestrator/ingest_files.py docs/ notes/ --workers 8
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
 import sys
+import time
+from collections import Counter
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import orchestrator.server as srv
+except ImportError:  # run as a script next to server.py
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import server as srv
+
+DEFAULT_EXTENSIONS = (".md", ".markdown", ".txt", ".rst", ".html", ".htm")
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(srv.CACHE_DB_PATH), "ingest-manifest.sqlite3")
+
+
+class Manifest:
+    """Path -> (content hash, chunk count) of files already in the store."""
+
+    def __init__(self, path: str):
+        self._conn = srv._open_cache_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, sha256 TEXT NOT NULL, chunks INTEGER NOT NULL, ingested_at REAL NOT NULL)"
+        )
+        self._files = {
+            path: (sha, chunks) for path, sha, chunks in self._conn.execute("SELECT path, sha256, chunks FROM files")
+        }
 
+    def get(self, path: str) -> Optional[Tuple[str, int]]:
+        return self._files.get(path)
 
-def main(paths):
+    def items(self) -> List[Tuple[str, Tuple[str, int]]]:
+        return list(self._files.items())
+
+    def put_many(self, entries: List[Tuple[str, str, int]]) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files (path, sha256, chunks, ingested_at) VALUES (?, ?, ?, ?)",
+            [(path, sha, chunks, now) for path, sha, chunks in entries],
+        )
+        self._conn.commit()
+        for path, sha, chunks in entries:
+            self._files[path] = (sha, chunks)
+
+    def remove_many(self, paths: List[str]) -> None:
+        self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in paths])
+        self._conn.commit()
+        for path in paths:
+            self._files.pop(path, None)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def iter_files(paths: Iterable[str], extensions: Iterable[str] = DEFAULT_EXTENSIONS) -> Iterator[Path]:
+    extensions = {e.lower() for e in extensions}
     for p in paths:
+        path = Path(p).resolve()
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for name in sorted(files):
+                    if Path(name).suffix.lower() in extensions:
+                        yield Path(root) / name
+        elif path.is_file():
+            yield path
+        else:
+            print(f"Skipping {p}: not found", file=sys.stderr)
+
+
+def load_document(path: str, known_sha: Optional[str] = None, max_chunks: int = 0) -> Dict[str, Any]:
+    """Read, hash, extract and chunk one file (runs in a worker process).
+
+    Returns ``{"path", "sha256", "docs", "truncated"}``; ``docs`` is ``None``
+    when the content hash equals ``known_sha`` and the file can be skipped,
+    and ``truncated`` is set when the file had more than ``max_chunks``
+    chunks (0 = unlimited) and only the first ones were kept.
+    """
+    data = Path(path).read_bytes()
+    sha = hashlib.sha256(data).hexdigest()
+    if sha == known_sha:
+        return {"path": path, "sha256": sha, "docs": None, "truncated": False}
+    url = Path(path).as_uri()
+    text = data.decode("utf-8", errors="replace")
+    title = Path(path).name
+    if Path(path).suffix.lower() in (".html", ".htm"):
+        text, meta = srv.clean_html_with_metadata(text, url)
+        title = meta.get("page_title") or title
+    metadata = {
+        "url": url,
+        "domain": "local",
+        "title": title,
+        "path": path,
+        "source_query": "",
+        "content_type": "file",
+        "fetch_timestamp": datetime.now().isoformat(),
+        "pinned": True,
+    }
+    if not text.strip():
+        return {"path": path, "sha256": sha, "docs": [], "truncated": False}
+    # One chunk past the cap tells a truncated file from one that just fits
+    limit = max_chunks + 1 if max_chunks > 0 else 0
+    docs = srv._chunk_documents([{"text": text, "metadata": metadata}], max_chunks=limit)
+    truncated = 0 < max_chunks < len(docs)
+    if truncated:
+        docs = docs[:max_chunks]
+        for doc in docs:
+            doc["metadata"]["chunk_count"] = max_chunks
+    return {"path": path, "sha256": sha, "docs": docs, "truncated": truncated}
+
+
+def _is_under(path: str, roots: List[Path]) -> bool:
+    p = Path(path)
+    return any(p == root or root in p.parents for root in roots)
+
+
+async def ingest(
+    paths: List[str],
+    workers: int = os.cpu_count() or 1,
+    batch_size: int = 512,
+    manifest_path: str = DEFAULT_MANIFEST,
+    extensions: Iterable[str] = DEFAULT_EXTENSIONS,
+    progress_every: float = 10.0,
+    max_chunks: int = srv.INGEST_MAX_CHUNKS,
+) -> Dict[str, Any]:
+    manifest = Manifest(manifest_path)
+    files = [str(p) for p in iter_files(paths, extensions)]
+    roots = [Path(p).resolve() for p in paths]
+    gone = [
+        (path, chunks)
+        for path, (_, chunks) in manifest.items()
+        if _is_under(path, roots) and not os.path.isfile(path)
+    ]
+    # Load the model and open the store while the first files are read
+    if srv._vector_store is None or srv._embedder is None:
+        srv.STARTUP.start()
+    loop = asyncio.get_running_loop()
+    stats: Counter = Counter(files=len(files), ingested=0, skipped=0, failed=0, truncated=0, removed=0, chunks=0)
+    batch: List[Dict[str, Any]] = []
+    batch_files: List[Dict[str, Any]] = []
+    started = last_report = time.perf_counter()
+
+    def report(final: bool = False) -> Dict[str, Any]:
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        summary = {
+            **stats,
+            "elapsed_s": round(elapsed, 1),
+            "files_per_s": round((stats["ingested"] + stats["skipped"]) / elapsed, 1),
+            "chunks_per_s": round(stats["chunks"] / elapsed, 1),
+        }
+        print(("Done: " if final else "Progress: ") + ", ".join(f"{k}={v}" for k, v in summary.items()), flush=True)
+        return summary
+
+    async def flush():
+        if not batch_files:
+            return
+        await srv._upsert_texts(batch)
+        # A file that shrank leaves chunks beyond its new length behind
+        stale = [
+            srv._point_id(Path(f["path"]).as_uri(), idx)
+            for f in batch_files
+            for idx in range(len(f["docs"]), f["previous_chunks"])
+        ]
+        if stale:
+            await loop.run_in_executor(None, srv._vector_store.delete, stale)
+        manifest.put_many([(f["path"], f["sha256"], len(f["docs"])) for f in batch_files])
+        stats["ingested"] += len(batch_files)
+        stats["chunks"] += len(batch)
+        batch.clear()
+        batch_files.clear()
+
+    try:
+        # Workers must not fork: the warm-up above already runs threads
+        with srv._process_pool(workers) as pool:
+            todo = iter(files)
+            pending: Dict[asyncio.Future, str] = {}
+
+            def submit() -> None:
+                path = next(todo, None)
+                if path is not None:
+                    known = manifest.get(path)
+                    fut = loop.run_in_executor(pool, load_document, path, known[0] if known else None, max_chunks)
+                    pending[fut] = path
+
+            for _ in range(workers * 4):
+                submit()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    path = pending.pop(fut)
+                    submit()
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        stats["failed"] += 1
+                        print(f"Failed to ingest {path}: {e}", file=sys.stderr)
+                        continue
+                    if result["docs"] is None:
+                        stats["skipped"] += 1
+                        continue
+                    if result["truncated"]:
+                        stats["truncated"] += 1
+                        print(f"Truncated {path} to its first {max_chunks} chunks (--max-chunks)", file=sys.stderr)
+                    known = manifest.get(result["path"])
+                    result["previous_chunks"] = known[1] if known else 0
+                    batch_files.append(result)
+                    batch.extend(result["docs"])
+                    if len(batch) >= batch_size:
+                        await flush()
+                if progress_every and time.perf_counter() - last_report >= progress_every:
+                    last_report = time.perf_counter()
+                    report()
+            await flush()
+        if gone:
+            # Files deleted from an ingested directory: drop their chunks
+            await srv._ensure_clients()
+            ids = [srv._point_id(Path(path).as_uri(), idx) for path, chunks in gone for idx in range(chunks)]
+            if ids:
+                await loop.run_in_executor(None, srv._vector_store.delete, ids)
+            manifest.remove_many([path for path, _ in gone])
+            stats["removed"] = len(gone)
+    finally:
+        manifest.close()
+    return report(final=True)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="files or directories to ingest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=512, help="chunks per embed/upsert batch")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--ext", nargs="+", default=list(DEFAULT_EXTENSIONS), help="file extensions to include")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument(
+        "--max-chunks", type=int, default=srv.INGEST_MAX_CHUNKS, help="chunks kept per file (0 = unlimited)"
+    )
+    args = parser.parse_args(argv)
+
+    async def run():
         try:
-            text = Path(p).read_text(encoding='utf-8')
-            print(f"Ingested {p} ({len(text)} bytes)")
-        except Exception as e:
-            print(f"Failed to ingest {p}: {e}", file=sys.stderr)
+            return await ingest(
+                args.paths, args.workers, args.batch_size, args.manifest, args.ext, args.progress_every,
+                args.max_chunks,
+            )
+        finally:
+            if srv._embedder is not None:
+                srv._embedder.close()
+            if srv._vector_store is not None:
+                srv._vector_store.close()
+
+    return asyncio.run(run())
 
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    main()
@@ -1,16 +1,28 @@
-import os, re, json, random, asyncio, aiohttp, httpx, ast, uuid, time, hashlib, logging
-from typing import Any, Dict, List, Optional, Tuple
-from bs4 import BeautifulSoup
+import os, re, json, random, asyncio, httpx, ast, uuid, time, hashlib, logging, sqlite3, sys, threading, zlib, contextvars
+import multiprocessing
+
+_MODULE_STARTED = time.perf_counter()
+import importlib.util
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, OrderedDict, deque
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import lxml.html
 from datetime import datetime, timedelta
-from urllib.parse import urlparse
+from functools import lru_cache
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
-from FlagEmbedding import FlagModel
 import numpy as np
 
+# qdrant_client and FlagEmbedding (torch) take seconds to import; they are
+# loaded by the background warm-up so the MCP handshake is not delayed
+
 # Load paging configuration either from a local config module or environment
 try:
     from config import TOP_K, PER_PAGE_CHARS, TOTAL_CHARS
@@ -24,10 +36,24 @@ N_QUERIES = int(os.getenv("QUERIES", "5"))
 
 # Configurable tuning knobs
 DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
 NUM_QUERIES = int(os.getenv("NUM_QUERIES", str(N_QUERIES)))
 CHUNKS_PER_QUERY = int(os.getenv("CHUNKS_PER_QUERY", "15"))
 CHUNK_CHARS = int(os.getenv("CHUNK_CHARS", "350"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "60"))
+MAX_CHUNKS_PER_PAGE = int(os.getenv("MAX_CHUNKS_PER_PAGE", "48"))
+INGEST_MAX_CHUNKS = int(os.getenv("INGEST_MAX_CHUNKS", "0"))  # per local file; 0 = unlimited
 CACHE_TTL = int(os.getenv("RAG_CACHE_TTL", "3600"))
+RAG_CACHE_MAX_ENTRIES = int(os.getenv("RAG_CACHE_MAX_ENTRIES", "512"))
+RAG_CACHE_MAX_BYTES = int(os.getenv("RAG_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Semantic cache of whole search_and_retrieve answers, matched by prompt
+# embedding (opt-in: a wrong hit silently answers a different question)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(CACHE_TTL)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+SEMANTIC_CACHE_MERGE = int(os.getenv("SEMANTIC_CACHE_MERGE", "3"))  # answers merged per hit
 
 STRICT_ARGS = os.getenv("STRICT_ARGS", "false").lower() == "true"
 MAX_QUERIES = int(os.getenv("MAX_QUERIES", "12"))
@@ -38,97 +64,2067 @@ QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_COLLECTION = os.getenv("WEB_CACHE_COLLECTION", "web-cache")
 EMBED_MODEL_NAME = os.getenv("EMBED_MODEL", "BAAI/bge-small-en-v1.5")
 
-_qdrant_client: Optional[QdrantClient] = None
-_embed_model: Optional[FlagModel] = None
-RAG_CACHE: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+# Qdrant collection layout, created or migrated at startup (_ensure_collection)
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_SEARCH_EF = int(os.getenv("QDRANT_SEARCH_EF", "0"))  # 0 = server default
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()  # none | int8
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "false").lower() == "true"
+# Opt-in: drop and recreate a collection whose vector size no longer matches
+QDRANT_RECREATE = os.getenv("QDRANT_RECREATE", "false").lower() == "true"
+QDRANT_PAYLOAD_INDEXES = {
+    "domain": "keyword",
+    "url": "keyword",
+    "source_query": "keyword",
+    "fetched_at": "float",
+    "last_hit_at": "float",
+    "pinned": "bool",
+    "parent_id": "keyword",
+    "chunk_index": "integer",
+}
 
-logging.basicConfig(level=logging.INFO)
+# Hybrid retrieval: BM25 sparse vectors fused with dense results server-side (RRF)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_PREFETCH_FACTOR = int(os.getenv("HYBRID_PREFETCH_FACTOR", "4"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_AVG_TOKENS = float(os.getenv("BM25_AVG_TOKENS", "55"))
+SPARSE_VECTOR = "bm25"
+RRF_K = 60
 
+# Vector store backend: "qdrant" (the service) or "local" (in-process,
+# memory-mapped vectors + SQLite payloads; no Qdrant container needed)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant").lower()
+LOCAL_STORE_PATH = os.getenv(
+    "LOCAL_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "gabesearch", "vectors", QDRANT_COLLECTION)
+)
+LOCAL_STORE_DTYPE = os.getenv("LOCAL_STORE_DTYPE", "float32").lower()  # float32 | int8
+LOCAL_STORE_IVF_LISTS = int(os.getenv("LOCAL_STORE_IVF_LISTS", "0"))  # 0 = brute force
+LOCAL_STORE_IVF_PROBES = int(os.getenv("LOCAL_STORE_IVF_PROBES", "8"))
 
-def _ensure_clients():
-    global _qdrant_client, _embed_model
-    if _qdrant_client is None:
-        _qdrant_client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-    if _embed_model is None:
-        _embed_model = FlagModel(EMBED_MODEL_NAME, use_fp16=False)
+# Vector cache maintenance: TTL expiry (WEB_CACHE_TTL_DAYS), LRU eviction and
+# compaction, run in the background every MAINTENANCE_INTERVAL_S (0 disables)
+MAINTENANCE_INTERVAL_S = float(os.getenv("MAINTENANCE_INTERVAL_S", "3600"))
+MAX_CACHE_POINTS = int(os.getenv("MAX_CACHE_POINTS", "0"))  # 0 = unlimited
+VACUUM_DELETED_THRESHOLD = float(os.getenv("VACUUM_DELETED_THRESHOLD", "0.1"))
 
+# Shared HTTP connection pools
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "32"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "4"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2", "false").lower() == "true"
 
-async def _upsert_text(text: str, metadata: Dict[str, Any]):
-    _ensure_clients()
-    loop = asyncio.get_running_loop()
-    vector = await loop.run_in_executor(None, lambda: _embed_model.encode([text])[0])
-    point = PointStruct(
-        id=metadata.get("url") or metadata.get("id") or str(uuid.uuid4()),
-        vector=vector.tolist(),
-        payload={"text": text, **metadata},
+# Adaptive (AIMD) fetch concurrency: the global and per-host limits halve on
+# 429/503, timeouts or slow answers and grow back while fetches are healthy
+FETCH_MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", "32"))
+FETCH_MIN_CONCURRENCY = int(os.getenv("FETCH_MIN_CONCURRENCY", "4"))
+FETCH_HOST_DELAY_MS = float(os.getenv("FETCH_HOST_DELAY_MS", "100"))  # between request starts to one host
+FETCH_LATENCY_TARGET_MS = float(os.getenv("FETCH_LATENCY_TARGET_MS", "3000"))
+FETCH_AIMD_BACKOFF = float(os.getenv("FETCH_AIMD_BACKOFF", "0.5"))
+FETCH_RETRY_AFTER_MAX_S = float(os.getenv("FETCH_RETRY_AFTER_MAX_S", "10"))
+
+# SearXNG's own limiter (limiter.toml: 20 requests per 60 s) bans clients
+# that exceed it, so searches are rate-capped to match ("" disables)
+SEARX_RATE_LIMIT = os.getenv("SEARX_RATE_LIMIT", "20/60")
+SEARX_MAX_CONCURRENCY = int(os.getenv("SEARX_MAX_CONCURRENCY", "4"))
+
+# SearXNG engine selection: health scoreboard and hedged requests
+SEARX_TIMEOUT = float(os.getenv("SEARX_TIMEOUT", "15"))
+ENGINE_EWMA_ALPHA = float(os.getenv("ENGINE_EWMA_ALPHA", "0.3"))
+ENGINE_COOLDOWN_S = float(os.getenv("ENGINE_COOLDOWN_S", "120"))
+ENGINE_FAILURE_THRESHOLD = int(os.getenv("ENGINE_FAILURE_THRESHOLD", "2"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "400"))
+HEDGE_MAX_DELAY_MS = float(os.getenv("HEDGE_MAX_DELAY_MS", "3000"))
+
+# Query -> links cache in front of SearXNG (0 TTL disables)
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "21600"))
+SEARCH_CACHE_PERSIST = os.getenv("SEARCH_CACHE_PERSIST", "true").lower() == "true"
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "4096"))
+
+# HTML extraction runs on a process pool; 0 workers keeps it on a thread
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACT_CPU_SECONDS = float(os.getenv("EXTRACT_CPU_SECONDS", "5"))
+
+# Streaming ingestion pipeline (search -> fetch -> embed/upsert)
+PIPELINE_FETCH_WORKERS = int(os.getenv("PIPELINE_FETCH_WORKERS", "16"))
+PIPELINE_FETCH_QUEUE = int(os.getenv("PIPELINE_FETCH_QUEUE", "32"))
+PIPELINE_EMBED_QUEUE = int(os.getenv("PIPELINE_EMBED_QUEUE", "256"))
+
+# End-to-end budget for search_and_retrieve (0 disables); part of it is
+# reserved for the final RAG retrieval so ingestion cannot consume all of it
+DEADLINE_MS = int(os.getenv("DEADLINE_MS", "45000"))
+DEADLINE_RETRIEVAL_RESERVE_MS = int(os.getenv("DEADLINE_RETRIEVAL_RESERVE_MS", "3000"))
+
+# Tool responses are packed into TOTAL_CHARS in confidence order, chunks
+# grouped under their source; "json" (indented), "compact" (minified) or "text".
+# "legacy" keeps the pre-packing layout (indented, "chunks"/"total_chunks")
+RESPONSE_FORMAT = os.getenv("RESPONSE_FORMAT", "compact").lower()
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))  # for token estimates
+
+# MCP transport: "stdio" (one client per process) or "sse" (many clients
+# share one process and with it the model, caches and HTTP pools)
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio").lower()
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", "8765"))
+# Tool calls admitted at once, overall and per SSE client (round-robin across
+# clients); the single stdio client is bounded by the overall limit only
+MAX_CONCURRENT_CALLS = int(os.getenv("MAX_CONCURRENT_CALLS", "8"))
+MAX_CALLS_PER_CLIENT = int(os.getenv("MAX_CALLS_PER_CLIENT", "2"))
+
+# Shared embedding service: requests from all callers are micro-batched
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+# Model intra-op threads: by default the cores the extraction workers leave
+# free, so the two pools do not oversubscribe the CPU; 0 = library default
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", str(max(1, (os.cpu_count() or 1) - max(0, EXTRACT_WORKERS)))))
+
+# Embedding backend: "flag" (FlagEmbedding/PyTorch fp32), "onnx" (ONNX Runtime
+# fp32) or "onnx-int8" (ONNX Runtime with dynamic int8 quantization)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "flag").lower()
+EMBED_MAX_LENGTH = int(os.getenv("EMBED_MAX_LENGTH", "512"))
+EMBED_ONNX_DIR = os.getenv(
+    "EMBED_ONNX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "gabesearch", "onnx")
+)
+
+# Persistent page cache (cleaned text + validators), keyed by canonical URL;
+# maintenance drops pages unfetched for PAGE_CACHE_MAX_AGE_DAYS and the
+# least recently fetched beyond PAGE_CACHE_MAX_PAGES (0 disables either)
+WEB_CACHE_TTL_DAYS = float(os.getenv("WEB_CACHE_TTL_DAYS", "10"))
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE", "true").lower() == "true"
+PAGE_CACHE_MAX_AGE_DAYS = float(os.getenv("PAGE_CACHE_MAX_AGE_DAYS", "30"))
+PAGE_CACHE_MAX_PAGES = int(os.getenv("PAGE_CACHE_MAX_PAGES", "20000"))
+CACHE_DB_PATH = os.getenv(
+    "CACHE_DB_PATH", os.path.join(os.path.expanduser("~"), ".cache", "gabesearch", "cache.sqlite3")
+)
+
+# Observability: leveled logging, per-stage timing spans and an optional
+# OpenMetrics endpoint (served on METRICS_PORT; 0 disables metrics entirely)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+TRACE_RESPONSES = os.getenv("TRACE_RESPONSES", "false").lower() == "true"
+
+_vector_store: Optional["VectorStore"] = None
+_embedder: Optional["EmbeddingService"] = None
+
+
+class _JsonLogFormatter(logging.Formatter):
+    """One JSON object per record; fields passed via ``extra`` are kept."""
+
+    _RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        out.update({k: v for k, v in vars(record).items() if k not in self._RESERVED})
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+def _configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    # Logs go to stderr; stdout carries the MCP stdio protocol
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(_JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.basicConfig(level=getattr(logging, level, logging.INFO), handlers=[handler], force=True)
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, logging.getLogger().level))
+
+
+_configure_logging()
+
+
+class Metrics:
+    """Process-wide counters and histograms rendered as OpenMetrics text.
+
+    Families are declared in ``FAMILIES``; samples are keyed by their label
+    values.  When disabled every update returns at once, so instrumented
+    code costs one attribute check.  Gauges are not stored: ``render`` takes
+    their current samples (see ``_runtime_gauges``).
+    """
+
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+    SIMILARITY_BUCKETS = (0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0)
+    FAMILIES = {
+        "gabesearch_tool_calls": ("counter", "Tool calls by tool and outcome"),
+        "gabesearch_tool_seconds": ("histogram", "End-to-end tool call latency"),
+        "gabesearch_stage_seconds": ("histogram", "Time spent per pipeline stage"),
+        "gabesearch_cache_requests": ("counter", "Cache lookups by cache and result"),
+        "gabesearch_engine_requests": ("counter", "SearXNG engine requests by engine and outcome"),
+        "gabesearch_fetches": ("counter", "Page fetches by outcome"),
+        "gabesearch_fetch_bytes": ("counter", "Bytes of page bodies downloaded"),
+        "gabesearch_embed_batch_size": ("histogram", "Texts per embedding model call"),
+        "gabesearch_response_tokens_saved": ("counter", "Estimated tokens saved by response packing"),
+        "gabesearch_scheduler_wait_seconds": ("histogram", "Time tool calls waited for a scheduler slot"),
+        "gabesearch_backoffs": ("counter", "Adaptive limit decreases by scope and cause"),
+        "gabesearch_semantic_cache_similarity": ("histogram", "Prompt similarity of semantic cache hits"),
+        "gabesearch_engine_success_rate": ("gauge", "EWMA success rate per SearXNG engine"),
+        "gabesearch_engine_latency_seconds": ("gauge", "EWMA latency per SearXNG engine"),
+        "gabesearch_engine_cooldown_seconds": ("gauge", "Seconds left in an engine's cooldown"),
+        "gabesearch_http_limit": ("gauge", "Current adaptive concurrency limit by scope (and host)"),
+        "gabesearch_fetches_in_flight": ("gauge", "Page fetches in flight"),
+    }
+
+    def __init__(self, enabled: bool = METRICS_PORT > 0):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        # (name, labels) -> [bucket bounds, per-bucket counts, sum, count]
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[Any]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(hist[0]):
+                if value <= bound:
+                    hist[1][i] += 1
+                    break
+            hist[2] += value
+            hist[3] += 1
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...], le: Optional[str] = None) -> str:
+        pairs = list(labels) + ([("le", le)] if le is not None else [])
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self, gauges: Iterable[Tuple[str, Dict[str, str], float]] = ()) -> str:
+        gauge_samples = sorted((name, tuple(sorted(labels.items())), value) for name, labels, value in gauges)
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, [v[0], list(v[1]), v[2], v[3]]) for k, v in self._histograms.items())
+        lines = []
+        for name, (kind, help_text) in self.FAMILIES.items():
+            lines += [f"# TYPE {name} {kind}", f"# HELP {name} {help_text}"]
+            if kind == "counter":
+                for (family, labels), value in counters:
+                    if family == name:
+                        lines.append(f"{name}_total{self._labels(labels)} {value:g}")
+                continue
+            if kind == "gauge":
+                for family, labels, value in gauge_samples:
+                    if family == name:
+                        lines.append(f"{name}{self._labels(labels)} {value:g}")
+                continue
+            for (family, labels), (bounds, counts, total, count) in histograms:
+                if family != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(bounds, counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{self._labels(labels, f'{bound:g}')} {cumulative}")
+                lines.append(f"{name}_bucket{self._labels(labels, '+Inf')} {count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total:g}")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+# Per-call stage durations (seconds) of the tool call being served, if traced
+_STAGE_TIMINGS: "contextvars.ContextVar[Optional[Dict[str, float]]]" = contextvars.ContextVar(
+    "stage_timings", default=None
+)
+_NO_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("stage", "timings", "started")
+
+    def __init__(self, stage: str, timings: Optional[Dict[str, float]]):
+        self.stage = stage
+        self.timings = timings
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        if self.timings is not None:
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + elapsed
+        METRICS.observe("gabesearch_stage_seconds", elapsed, stage=self.stage)
+        return False
+
+
+def span(stage: str):
+    """Time a pipeline stage for the current call's breakdown and the metrics.
+
+    Stages running concurrently (parallel fetches, say) add up, so a
+    breakdown can exceed the call's wall time.  With neither tracing nor
+    metrics enabled this returns a shared no-op context manager.
+    """
+    timings = _STAGE_TIMINGS.get()
+    if timings is None and not METRICS.enabled:
+        return _NO_SPAN
+    return _Span(stage, timings)
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve ``METRICS`` at ``/metrics`` from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = METRICS.render(_runtime_gauges()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{httpd.server_address[1]}/metrics")
+    return httpd
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class RagCache:
+    """Bounded LRU + TTL cache of deduplicated RAG matches keyed by query.
+
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or the approximate ``max_bytes`` budget is exceeded, and dropped lazily
+    when older than ``ttl`` seconds.  Vectors are stripped before storing.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (stored_at, size, query, urls, matches)
+        self._entries: "OrderedDict[str, Tuple[float, int, str, frozenset, List[Dict[str, Any]]]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return hashlib.sha256(_normalize_query(query).encode()).hexdigest()
+
+    @staticmethod
+    def _strip(match: Dict[str, Any]) -> Dict[str, Any]:
+        meta = {k: v for k, v in match.get("metadata", {}).items() if k != "text"}
+        return {**{k: v for k, v in match.items() if k != "vector"}, "metadata": meta}
+
+    @staticmethod
+    def _approx_size(matches: List[Dict[str, Any]]) -> int:
+        size = 0
+        for m in matches:
+            size += 64 + len(m.get("text", ""))
+            size += sum(len(str(k)) + len(str(v)) for k, v in m["metadata"].items())
+        return size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry[1]
+
+    def get(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        key = self._key(query)
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[0] >= self.ttl:
+            self._drop(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            METRICS.inc("gabesearch_cache_requests", cache="rag", result="miss")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        METRICS.inc("gabesearch_cache_requests", cache="rag", result="hit")
+        # Hand out copies so callers can annotate matches without touching the cache
+        return [{**m, "metadata": dict(m["metadata"])} for m in entry[4]]
+
+    def put(self, query: str, matches: List[Dict[str, Any]]) -> None:
+        key = self._key(query)
+        if key in self._entries:
+            self._drop(key)
+        stored = [self._strip(m) for m in matches]
+        size = self._approx_size(stored)
+        if size > self.max_bytes:
+            return
+        urls = frozenset(m["metadata"].get("url", "") for m in stored) - {""}
+        self._entries[key] = (time.time(), size, _normalize_query(query), urls, stored)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, queries: Iterable[str] = (), urls: Iterable[str] = ()) -> int:
+        """Drop entries for any of ``queries`` or containing any of ``urls``."""
+        queries = {_normalize_query(q) for q in queries if q}
+        urls = set(urls)
+        stale = [
+            key
+            for key, (_, _, query, entry_urls, _) in self._entries.items()
+            if query in queries or not entry_urls.isdisjoint(urls)
+        ]
+        for key in stale:
+            self._drop(key)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+RAG_CACHE = RagCache(RAG_CACHE_MAX_ENTRIES, RAG_CACHE_MAX_BYTES, CACHE_TTL)
+
+
+def _invalidate_cache_for(docs: List[Dict[str, Any]]) -> None:
+    metas = [d["metadata"] for d in docs]
+    dropped = RAG_CACHE.invalidate(
+        queries={m.get("source_query", "") for m in metas},
+        urls={m.get("url", "") for m in metas},
     )
-    await loop.run_in_executor(
-        None,
-        lambda: _qdrant_client.upsert(collection_name=QDRANT_COLLECTION, points=[point]),
+    if dropped:
+        logging.info(f"Invalidated {dropped} cached RAG results after upsert")
+
+
+_PROMPT_TOKEN_RE = re.compile(r"[\w'+-]+")
+_NEGATIONS = frozenset({"no", "not", "never", "without", "nor", "none", "neither", "except", "vs", "versus"})
+
+
+def _prompt_signature(prompt: str) -> frozenset:
+    """Tokens embeddings barely register but that change the question.
+
+    Numbers (years, versions), negations and names (tokens capitalized past
+    the first word, or with inner capitals like ``OpenAI``), case-folded.
+    """
+    signature = set()
+    for i, token in enumerate(_PROMPT_TOKEN_RE.findall(prompt)):
+        low = token.lower()
+        if (
+            any(c.isdigit() for c in token)
+            or low in _NEGATIONS
+            or low.endswith("n't")
+            or any(c.isupper() for c in token[1:])
+            or (i and token[0].isupper())
+        ):
+            signature.add(low)
+    return frozenset(signature)
+
+
+class SemanticCache:
+    """Bounded LRU + TTL cache of ``search_and_retrieve`` answers keyed by prompt meaning.
+
+    A lookup compares the prompt embedding with those of earlier prompts.
+    Fresh entries at or above ``threshold`` cosine similarity are hits if
+    they also share the prompt's numbers, negations and names (see
+    ``_prompt_signature``), which embeddings blur: "... in 2023" and
+    "... in 2024" score well above any usable threshold.  Up to ``merge``
+    hits (best first) are merged and deduplicated again, so a rephrased
+    prompt is answered without any web traffic.  Entries are
+    evicted least-recently-used first beyond ``max_entries`` and dropped
+    lazily once older than ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int, threshold: float, ttl: float, merge: int = SEMANTIC_CACHE_MERGE):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.merge = max(1, merge)
+        # normalized prompt -> (stored_at, prompt, unit vector, signature, matches)
+        self._entries: "OrderedDict[str, Tuple[float, str, np.ndarray, frozenset, List[Dict[str, Any]]]]" = OrderedDict()
+        # Stacked prompt vectors in entry order; rebuilt after any change
+        self._keys: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.similarity_sum = 0.0
+        self.min_similarity: Optional[float] = None
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    @staticmethod
+    def _strip(match: Dict[str, Any]) -> Dict[str, Any]:
+        # Keep vectors (as compact float32) so merged answers dedup by content
+        stored = RagCache._strip(match)
+        vector = match.get("vector")
+        stored["vector"] = None if vector is None else np.asarray(vector, dtype=np.float32)
+        return stored
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str) -> None:
+        del self._entries[key]
+        self._matrix = None
+
+    def _index(self) -> Optional[np.ndarray]:
+        if self._matrix is None and self._entries:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([entry[2] for entry in self._entries.values()])
+        return self._matrix
+
+    def get(
+        self, prompt: str, vector, k: int = CHUNKS_PER_QUERY * 2
+    ) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """``(matches, info)`` for a similar earlier prompt, or ``None``.
+
+        ``info`` names the closest cached prompt and its similarity, and
+        how many cached answers were merged.
+        """
+        cutoff = time.time() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry[0] <= cutoff]
+        for key in expired:
+            self._drop(key)
+        self.expirations += len(expired)
+
+        matrix = self._index()
+        hits: List[Tuple[str, float]] = []
+        if matrix is not None:
+            q = self._unit(vector)
+            signature = _prompt_signature(prompt)
+            if q.shape[0] == matrix.shape[1]:
+                sims = matrix @ q
+                for i in np.argsort(-sims):
+                    if sims[i] < self.threshold or len(hits) == self.merge:
+                        break
+                    if self._entries[self._keys[i]][3] == signature:
+                        hits.append((self._keys[i], float(sims[i])))
+        if not hits:
+            self.misses += 1
+            METRICS.inc("gabesearch_cache_requests", cache="semantic", result="miss")
+            return None
+
+        best = hits[0][1]
+        self.hits += 1
+        self.merged += len(hits) > 1
+        self.similarity_sum += best
+        self.min_similarity = best if self.min_similarity is None else min(self.min_similarity, best)
+        METRICS.inc("gabesearch_cache_requests", cache="semantic", result="hit")
+        METRICS.observe("gabesearch_semantic_cache_similarity", best, Metrics.SIMILARITY_BUCKETS)
+        for key, _ in hits:
+            self._entries.move_to_end(key)
+        self._matrix = None
+        # Hand out copies so callers can annotate matches without touching the cache
+        matches = [{**m, "metadata": dict(m["metadata"])} for key, _ in hits for m in self._entries[key][4]]
+        if len(hits) > 1:
+            matches = _deduplicate_chunks(matches, k)
+        info = {"prompt": self._entries[hits[0][0]][1], "similarity": round(best, 4), "merged": len(hits)}
+        return matches[:k], info
+
+    def put(self, prompt: str, vector, matches: List[Dict[str, Any]]) -> None:
+        key = _normalize_query(prompt)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (
+            time.time(), prompt, self._unit(vector), _prompt_signature(prompt), [self._strip(m) for m in matches]
+        )
+        self._matrix = None
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "merged": self.merged,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "mean_hit_similarity": self.similarity_sum / self.hits if self.hits else 0.0,
+            "min_hit_similarity": self.min_similarity,
+        }
+
+
+SEMANTIC_CACHE: Optional[SemanticCache] = (
+    SemanticCache(SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL)
+    if SEMANTIC_CACHE_ENABLED
+    else None
+)
+
+
+class EmbeddingService:
+    """Shared embedding model with dynamic micro-batching.
+
+    Callers from every concurrent tool call submit texts through ``encode``;
+    requests are split into pieces of at most ``max_batch`` texts, queued, and
+    coalesced for up to ``max_wait_ms`` into one model call on a dedicated
+    worker thread.  The model is loaded lazily on that thread by calling
+    ``model_factory`` (see ``_load_embed_model``).
+    """
+
+    def __init__(
+        self,
+        model_factory,
+        max_batch: int = EMBED_MAX_BATCH,
+        max_wait_ms: float = EMBED_MAX_WAIT_MS,
+    ):
+        self._model_factory = model_factory
+        self.model = None
+        self.dim: Optional[int] = None
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.max_batch_seen = 0
+        self.encode_seconds = 0.0
+        self.max_encode_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+
+    def _encode_sync(self, texts: List[str]) -> np.ndarray:
+        if self.model is None:
+            self.model = self._model_factory()
+        vectors = np.asarray(self.model.encode(texts))
+        self.dim = vectors.shape[1]
+        return vectors
+
+    def _check_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._batcher is None or self._batcher.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._batcher = loop.create_task(self._run())
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed ``texts``; returns one row per input text."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        self._check_loop()
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        futures = []
+        for i in range(0, len(texts), self.max_batch):
+            fut = loop.create_future()
+            self._queue.put_nowait((texts[i:i + self.max_batch], fut, loop.time()))
+            futures.append(fut)
+        parts = await asyncio.gather(*futures)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            window_end = loop.time() + self.max_wait
+            while size < self.max_batch:
+                if self._queue.empty():
+                    remaining = window_end - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                if size + len(item[0]) > self.max_batch:
+                    # Keep the oversized piece for the next batch
+                    self._queue.put_nowait(item)
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            texts = [t for item, _, _ in batch for t in item]
+            started = loop.time()
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._encode_sync, texts)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            elapsed = loop.time() - started
+            METRICS.observe("gabesearch_embed_batch_size", len(texts), Metrics.SIZE_BUCKETS)
+            self.batches += 1
+            self.texts += len(texts)
+            self.max_batch_seen = max(self.max_batch_seen, len(texts))
+            self.encode_seconds += elapsed
+            self.max_encode_seconds = max(self.max_encode_seconds, elapsed)
+            offset = 0
+            for item, fut, enqueued in batch:
+                self.queue_wait_seconds += started - enqueued
+                if not fut.done():
+                    fut.set_result(vectors[offset:offset + len(item)])
+                offset += len(item)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "mean_encode_ms": 1000 * self.encode_seconds / self.batches if self.batches else 0.0,
+            "max_encode_ms": 1000 * self.max_encode_seconds,
+            "texts_per_second": self.texts / self.encode_seconds if self.encode_seconds else 0.0,
+            "mean_queue_wait_ms": 1000 * self.queue_wait_seconds / self.batches if self.batches else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._executor.shutdown(wait=False)
+
+
+class OnnxEmbedder:
+    """ONNX Runtime encoder for BERT-style bge models.
+
+    Mirrors ``FlagModel.encode``: CLS pooling followed by L2 normalisation,
+    truncating inputs at ``max_length`` tokens.  ``session`` is an
+    ``onnxruntime.InferenceSession`` and ``tokenizer`` a ``tokenizers.Tokenizer``;
+    use ``from_pretrained`` to build both from a Hugging Face model id.
+    """
+
+    def __init__(self, session, tokenizer, max_length: int = EMBED_MAX_LENGTH, batch_size: int = 32):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.input_names = {i.name for i in session.get_inputs()}
+        tokenizer.enable_truncation(max_length)
+        tokenizer.enable_padding()
+
+    @classmethod
+    def from_pretrained(
+        cls,
+        model_name: str,
+        quantize: bool = False,
+        threads: int = EMBED_THREADS,
+        cache_dir: str = EMBED_ONNX_DIR,
+        max_length: int = EMBED_MAX_LENGTH,
+    ) -> "OnnxEmbedder":
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        model_path = hf_hub_download(model_name, "onnx/model.onnx")
+        if quantize:
+            quantized = os.path.join(cache_dir, model_name.replace("/", "--") + "-int8.onnx")
+            if not os.path.exists(quantized):
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = quantized + ".tmp"
+                quantize_dynamic(model_path, tmp, weight_type=QuantType.QInt8)
+                os.replace(tmp, quantized)
+            model_path = quantized
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        tokenizer = Tokenizer.from_pretrained(model_name)
+        return cls(session, tokenizer, max_length=max_length)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        cls_vectors = hidden[:, 0].astype(np.float32)
+        norms = np.linalg.norm(cls_vectors, axis=1, keepdims=True)
+        return cls_vectors / np.maximum(norms, 1e-12)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        texts = list(texts)
+        # Sort by length so each batch pads to a similar size, then restore order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vectors = self._encode_batch([texts[i] for i in idx])
+            if out.shape[1] == 0:
+                out = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[idx] = vectors
+        return out
+
+
+def _load_embed_model(backend: str = EMBED_BACKEND, model_name: str = EMBED_MODEL_NAME):
+    """Load the embedding model for ``backend`` (see ``EMBED_BACKEND``)."""
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbedder.from_pretrained(model_name, quantize=backend == "onnx-int8")
+    if backend != "flag":
+        raise ValueError(f"Unknown EMBED_BACKEND {backend!r}; expected flag, onnx or onnx-int8")
+    from FlagEmbedding import FlagModel
+
+    if EMBED_THREADS > 0:
+        import torch
+
+        torch.set_num_threads(EMBED_THREADS)
+    return FlagModel(model_name, use_fp16=False)
+
+
+async def _warm_embedder() -> None:
+    """Load the embedding model and run one dummy encode through it."""
+    global _embedder
+    service = EmbeddingService(_load_embed_model)
+    try:
+        await service.encode(["warm up"])
+    except BaseException:
+        service.close()
+        raise
+    _embedder = service
+
+
+def _ensure_collection(client, dim: int, name: str = QDRANT_COLLECTION) -> str:
+    """Create ``name`` or migrate it to the configured layout.
+
+    Applies the vector size, HNSW ``m``/``ef_construct``, optional scalar int8
+    quantization, on-disk vectors, the BM25 sparse vector and the
+    ``QDRANT_PAYLOAD_INDEXES``.  Settings are only sent when they differ, so an
+    unchanged collection is not re-indexed.  A collection built for a different
+    vector size (the embedding model changed) cannot be migrated in place:
+    that is an error unless ``QDRANT_RECREATE`` allows dropping its points.
+    A collection from before hybrid search gains the sparse vector in place
+    where Qdrant allows it (existing points have none and are found by the
+    dense branch only); otherwise the same opt-in applies.  Returns
+    ``"created"``, ``"recreated"``, ``"updated"`` or ``"unchanged"``.
+    """
+    from qdrant_client import models
+
+    hnsw = models.HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT)
+    sparse_config = {SPARSE_VECTOR: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+    quantization = None
+    if QDRANT_QUANTIZATION == "int8":
+        quantization = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    elif QDRANT_QUANTIZATION != "none":
+        raise ValueError(f"Unknown QDRANT_QUANTIZATION {QDRANT_QUANTIZATION!r}; expected none or int8")
+
+    action, indexed = "created", set()
+    if client.collection_exists(name):
+        info = client.get_collection(name)
+        vectors = info.config.params.vectors
+        sparse = info.config.params.sparse_vectors or {}
+        size = getattr(vectors, "size", None)
+        if size != dim and not QDRANT_RECREATE:
+            raise RuntimeError(
+                f"Collection {name} holds {size}-dim vectors but {EMBED_MODEL_NAME} produces {dim}; "
+                f"set WEB_CACHE_COLLECTION to a new name, or QDRANT_RECREATE=true to drop its points"
+            )
+        added_sparse = False
+        if SPARSE_VECTOR not in sparse and size == dim:
+            try:
+                client.update_collection(name, sparse_vectors_config=sparse_config)
+                logging.info(f"Added sparse vector {SPARSE_VECTOR!r} to collection {name}")
+                added_sparse = True
+            except Exception as e:
+                if not QDRANT_RECREATE:
+                    raise RuntimeError(
+                        f"Collection {name} has no {SPARSE_VECTOR!r} sparse vector and Qdrant cannot add one "
+                        f"in place ({e}); set WEB_CACHE_COLLECTION to a new name, or QDRANT_RECREATE=true "
+                        f"to drop its points"
+                    ) from e
+        if size != dim or (SPARSE_VECTOR not in sparse and not added_sparse):
+            logging.warning(f"Recreating collection {name} (vectors {vectors}, sparse vectors {sorted(sparse)})")
+            client.delete_collection(name)
+            action = "recreated"
+        else:
+            indexed = set(info.payload_schema or {})
+            diff: Dict[str, Any] = {}
+            current = info.config.hnsw_config
+            if (current.m, current.ef_construct) != (QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT):
+                diff["hnsw_config"] = hnsw
+            if (info.config.quantization_config is not None) != (quantization is not None):
+                diff["quantization_config"] = quantization or models.Disabled.DISABLED
+            if bool(vectors.on_disk) != QDRANT_ON_DISK:
+                diff["vectors_config"] = {"": models.VectorParamsDiff(on_disk=QDRANT_ON_DISK)}
+            if diff:
+                client.update_collection(name, **diff)
+            action = "updated" if diff or added_sparse else "unchanged"
+
+    if action in ("created", "recreated"):
+        client.create_collection(
+            name,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=QDRANT_ON_DISK),
+            sparse_vectors_config=sparse_config,
+            hnsw_config=hnsw,
+            quantization_config=quantization,
+        )
+    for field, schema in QDRANT_PAYLOAD_INDEXES.items():
+        if field not in indexed:
+            client.create_payload_index(name, field, field_schema=models.PayloadSchemaType(schema))
+    if action != "unchanged":
+        logging.info(f"Qdrant collection {name} {action} (dim={dim}, m={QDRANT_HNSW_M}, "
+                     f"ef_construct={QDRANT_HNSW_EF_CONSTRUCT}, quantization={QDRANT_QUANTIZATION}, "
+                     f"on_disk={QDRANT_ON_DISK})")
+    return action
+
+
+def _search_params():
+    """Search-time HNSW ``ef`` and quantization rescoring for the configured layout."""
+    from qdrant_client import models
+
+    if not QDRANT_SEARCH_EF and QDRANT_QUANTIZATION == "none":
+        return None
+    return models.SearchParams(
+        hnsw_ef=QDRANT_SEARCH_EF or None,
+        quantization=(
+            models.QuantizationSearchParams(rescore=True, oversampling=QDRANT_OVERSAMPLING)
+            if QDRANT_QUANTIZATION != "none" else None
+        ),
     )
 
 
+class VectorStore(ABC):
+    """Storage and retrieval of chunk vectors behind ``_upsert_texts``/``_rag_search``.
+
+    Methods block and are run in an executor by their callers.  Points are
+    dicts with ``id``, ``vector`` (dense), ``sparse`` (``_bm25_document``
+    weights) and ``payload``.  ``search`` takes one dense vector and one
+    ``_bm25_query`` per query and returns, per query, ranked hits exposing
+    ``id``, ``score``, ``payload`` and ``vector`` like Qdrant's ``ScoredPoint``.
+    Payloads carry ``fetched_at`` and ``last_hit_at`` timestamps, which the
+    maintenance methods use for TTL expiry and LRU eviction; points with
+    ``pinned: true`` (ingested local documents) are exempt from both.
+    """
+
+    @abstractmethod
+    def bootstrap(self, dim: Optional[int]) -> None:
+        """Create or migrate storage for ``dim``-sized vectors.
+
+        ``None`` attaches to existing storage as-is (used by maintenance).
+        """
+
+    @abstractmethod
+    def upsert(self, points: List[Dict[str, Any]]) -> None:
+        ...
+
+    @abstractmethod
+    def search(self, vectors: np.ndarray, sparse: List[Dict[int, float]], k: int) -> List[List[Any]]:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[Any]) -> None:
+        ...
+
+    @abstractmethod
+    def existing(self, ids: List[Any]) -> set:
+        """The subset of ``ids`` that are stored."""
+
+    @abstractmethod
+    def delete_stale_chunks(self, chunk_counts: Dict[str, int]) -> int:
+        """Delete chunks at or past each ``parent_id``'s new ``chunk_count``.
+
+        They are left over from a longer earlier version of the same page.
+        """
+
+    @abstractmethod
+    def touch(self, hits: Dict[Any, float]) -> None:
+        """Record ``id -> last hit time`` for LRU eviction."""
+
+    @abstractmethod
+    def delete_older_than(self, cutoff: float) -> int:
+        """Delete unpinned points fetched before ``cutoff`` (or without a timestamp)."""
+
+    @abstractmethod
+    def evict_lru(self, max_points: int) -> int:
+        """Delete the least recently hit unpinned points beyond ``max_points``.
+
+        Pinned points are never evicted and do not count against the limit.
+        """
+
+    def compact(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class QdrantStore(VectorStore):
+    """The Qdrant service; hybrid queries are fused server-side."""
+
+    def __init__(self, client, collection: str = QDRANT_COLLECTION):
+        self.client = client
+        self.collection = collection
+
+    def bootstrap(self, dim: Optional[int]) -> None:
+        if dim is not None:
+            _ensure_collection(self.client, dim, self.collection)
+
+    def upsert(self, points: List[Dict[str, Any]]) -> None:
+        from qdrant_client.models import PointStruct
+
+        structs = [
+            PointStruct(
+                id=p["id"],
+                vector={"": np.asarray(p["vector"]).tolist(), SPARSE_VECTOR: _sparse_vector(p["sparse"])},
+                payload=p["payload"],
+            )
+            for p in points
+        ]
+        self.client.upsert(collection_name=self.collection, points=structs)
+
+    def search(self, vectors: np.ndarray, sparse: List[Dict[int, float]], k: int) -> List[List[Any]]:
+        from qdrant_client import models
+
+        params = _search_params()
+        common = {"limit": k, "offset": 0, "with_payload": True, "with_vector": [""]}
+        requests = []
+        for vec, terms in zip(vectors, sparse):
+            vec = np.asarray(vec).tolist()
+            if HYBRID_SEARCH:
+                prefetch_limit = k * HYBRID_PREFETCH_FACTOR
+                prefetch = [
+                    models.Prefetch(query=vec, limit=prefetch_limit, params=params),
+                    models.Prefetch(query=_sparse_vector(terms), using=SPARSE_VECTOR, limit=prefetch_limit),
+                ]
+                requests.append(
+                    models.QueryRequest(prefetch=prefetch, query=models.FusionQuery(fusion=models.Fusion.RRF), **common)
+                )
+            else:
+                requests.append(models.QueryRequest(query=vec, params=params, **common))
+        results = self.client.query_batch_points(collection_name=self.collection, requests=requests)
+        return [res.points for res in results]
+
+    def count(self) -> int:
+        return self.client.count(collection_name=self.collection, exact=True).count
+
+    def delete(self, ids: List[Any]) -> None:
+        from qdrant_client import models
+
+        if ids:
+            self.client.delete(collection_name=self.collection, points_selector=models.PointIdsList(points=list(ids)))
+
+    def existing(self, ids: List[Any]) -> set:
+        if not ids:
+            return set()
+        points = self.client.retrieve(
+            collection_name=self.collection, ids=list(ids), with_payload=False, with_vectors=False
+        )
+        return {str(p.id) for p in points}
+
+    def delete_stale_chunks(self, chunk_counts: Dict[str, int]) -> int:
+        from qdrant_client import models
+
+        if not chunk_counts:
+            return 0
+        stale = models.Filter(
+            should=[
+                models.Filter(
+                    must=[
+                        models.FieldCondition(key="parent_id", match=models.MatchValue(value=parent_id)),
+                        models.FieldCondition(key="chunk_index", range=models.Range(gte=count)),
+                    ]
+                )
+                for parent_id, count in chunk_counts.items()
+            ]
+        )
+        count = self.client.count(collection_name=self.collection, count_filter=stale, exact=True).count
+        if count:
+            self.client.delete(collection_name=self.collection, points_selector=models.FilterSelector(filter=stale))
+        return count
+
+    @staticmethod
+    def _unpinned(*must):
+        from qdrant_client import models
+
+        pinned = models.FieldCondition(key="pinned", match=models.MatchValue(value=True))
+        return models.Filter(must=list(must) or None, must_not=[pinned])
+
+    def touch(self, hits: Dict[Any, float]) -> None:
+        # One set_payload call per minute bucket rather than per point
+        buckets: Dict[float, List[Any]] = {}
+        for point_id, when in hits.items():
+            buckets.setdefault(when // 60 * 60, []).append(point_id)
+        for when, ids in buckets.items():
+            self.client.set_payload(collection_name=self.collection, payload={"last_hit_at": when}, points=ids)
+
+    def delete_older_than(self, cutoff: float) -> int:
+        from qdrant_client import models
+
+        expired = self._unpinned(
+            models.Filter(
+                should=[
+                    models.FieldCondition(key="fetched_at", range=models.Range(lt=cutoff)),
+                    models.IsEmptyCondition(is_empty=models.PayloadField(key="fetched_at")),
+                ]
+            )
+        )
+        count = self.client.count(collection_name=self.collection, count_filter=expired, exact=True).count
+        if count:
+            self.client.delete(collection_name=self.collection, points_selector=models.FilterSelector(filter=expired))
+        return count
+
+    def _backfill_last_hit(self) -> None:
+        """Give points stored before LRU tracking ``last_hit_at = fetched_at``.
+
+        ``order_by`` skips points without the field, so they could never be
+        evicted; the local store orders them by ``fetched_at`` the same way.
+        """
+        from qdrant_client import models
+
+        missing = models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="last_hit_at"))])
+        while True:
+            points, _ = self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=missing,
+                limit=1000,
+                with_payload=["fetched_at"],
+                with_vectors=False,
+            )
+            if not points:
+                return
+            buckets: Dict[float, List[Any]] = {}
+            for p in points:
+                buckets.setdefault(float((p.payload or {}).get("fetched_at") or 0.0), []).append(p.id)
+            for when, ids in buckets.items():
+                self.client.set_payload(collection_name=self.collection, payload={"last_hit_at": when}, points=ids)
+
+    def evict_lru(self, max_points: int) -> int:
+        from qdrant_client import models
+
+        self._backfill_last_hit()
+        unpinned = self.client.count(collection_name=self.collection, count_filter=self._unpinned(), exact=True)
+        excess = unpinned.count - max_points
+        evicted = 0
+        while excess > 0:
+            points, _ = self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=self._unpinned(),
+                order_by=models.OrderBy(key="last_hit_at", direction=models.Direction.ASC),
+                limit=min(excess, 1000),
+                with_payload=False,
+                with_vectors=False,
+            )
+            if not points:
+                break
+            self.client.delete(
+                collection_name=self.collection, points_selector=models.PointIdsList(points=[p.id for p in points])
+            )
+            evicted += len(points)
+            excess -= len(points)
+        return evicted
+
+    def compact(self) -> None:
+        from qdrant_client import models
+
+        # Qdrant vacuums segments itself; lowering the threshold (and sending
+        # the diff at all) prompts the optimizer to pick up the deletions now
+        self.client.update_collection(
+            collection_name=self.collection,
+            optimizers_config=models.OptimizersConfigDiff(deleted_threshold=VACUUM_DELETED_THRESHOLD),
+        )
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class LocalHit(NamedTuple):
+    id: str
+    score: float
+    payload: Dict[str, Any]
+    vector: List[float]
+
+
+def _rrf_fuse(rankings: List[List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion of several ranked id lists, best first."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store: memory-mapped vectors, payloads in SQLite.
+
+    Vectors are L2-normalized and kept as float32, or as int8 scaled by 127,
+    in ``vectors.bin``, a memory-mapped matrix that doubles in size as it
+    fills.  Point ids, payloads and BM25 postings live in ``store.sqlite3``
+    next to it.  Dense search is a blocked brute-force matrix product; with
+    ``ivf_lists`` > 0 and enough points a spherical k-means IVF index limits
+    it to the ``ivf_probes`` closest lists.  Hybrid search ranks BM25 with
+    the same IDF formula as Qdrant and fuses both rankings with RRF.
+    """
+
+    BLOCK_ROWS = 65536
+    MIN_CAPACITY = 1024
+    IVF_MIN_POINTS_PER_LIST = 32
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = LOCAL_STORE_DTYPE,
+        ivf_lists: int = LOCAL_STORE_IVF_LISTS,
+        ivf_probes: int = LOCAL_STORE_IVF_PROBES,
+    ):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unknown LOCAL_STORE_DTYPE {dtype!r}; expected float32 or int8")
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = max(1, ivf_probes)
+        self.dim: Optional[int] = None
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._vectors: Optional[np.memmap] = None
+        self._live = np.zeros(0, dtype=bool)
+        self._ids: Dict[str, int] = {}
+        self._rows = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._ivf_trained_on = 0
+
+    @property
+    def _vector_file(self) -> str:
+        return os.path.join(self.path, "vectors.bin")
+
+    def bootstrap(self, dim: Optional[int]) -> None:
+        with self._lock:
+            if dim is None and not os.path.exists(os.path.join(self.path, "store.sqlite3")):
+                raise FileNotFoundError(f"No local vector store at {self.path}")
+            conn = _open_cache_db(os.path.join(self.path, "store.sqlite3"))
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS points (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, "
+                "payload TEXT NOT NULL, fetched_at REAL, last_hit REAL)"
+            )
+            columns = {info[1] for info in conn.execute("PRAGMA table_info(points)")}
+            for column in ("fetched_at", "last_hit"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE points ADD COLUMN {column} REAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS postings (term INTEGER NOT NULL, row INTEGER NOT NULL, weight REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_term ON postings (term)")
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_row ON postings (row)")
+            conn.execute("CREATE INDEX IF NOT EXISTS points_parent ON points (json_extract(payload, '$.parent_id'))")
+            stored = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            if dim is None:
+                dim = int(stored.get("dim", 0))
+                if not dim:
+                    conn.close()
+                    raise FileNotFoundError(f"No local vector store at {self.path}")
+            layout = {"dim": str(dim), "dtype": self.dtype.name}
+            if stored and stored != layout:
+                conn.close()
+                raise RuntimeError(
+                    f"Local vector store at {self.path} has layout {stored}, expected {layout}; "
+                    f"set LOCAL_STORE_PATH to a new directory, or move this one away to start over"
+                )
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", layout.items())
+            conn.commit()
+            self._conn, self.dim = conn, dim
+
+            rows = conn.execute("SELECT row, id FROM points").fetchall()
+            self._ids = {point_id: row for row, point_id in rows}
+            self._rows = max(self._ids.values(), default=-1) + 1
+            self._vectors = None
+            self._live = np.zeros(0, dtype=bool)
+            self._centroids = None
+            self._reserve(max(self._rows, 1))
+            self._live[[row for row, _ in rows]] = True
+
+    def _reserve(self, rows: int) -> None:
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        row_bytes = self.dim * self.dtype.itemsize
+        if self._vectors is None and os.path.exists(self._vector_file):
+            capacity = os.path.getsize(self._vector_file) // row_bytes
+        if self._vectors is not None and rows <= capacity:
+            return
+        new_capacity = capacity if rows <= capacity else max(self.MIN_CAPACITY, 2 * capacity, rows)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vector_file, "ab") as f:
+            f.truncate(new_capacity * row_bytes)
+        self._vectors = np.memmap(self._vector_file, dtype=self.dtype, mode="r+", shape=(new_capacity, self.dim))
+        grow = new_capacity - len(self._live)
+        self._live = np.concatenate([self._live, np.zeros(grow, dtype=bool)])
+        self._assign = np.concatenate([self._assign, np.full(grow, -1, dtype=np.int32)])
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.dtype == np.int8:
+            return np.round(vectors * 127).astype(np.int8)
+        return vectors
+
+    def _decode(self, stored: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(stored, dtype=np.float32)
+        return vectors / 127 if self.dtype == np.int8 else vectors
+
+    def upsert(self, points: List[Dict[str, Any]]) -> None:
+        if not points:
+            return
+        with self._lock:
+            rows = []
+            for p in points:
+                point_id = str(p["id"])
+                row = self._ids.get(point_id)
+                if row is None:
+                    row = self._ids[point_id] = self._rows
+                    self._rows += 1
+                rows.append(row)
+            self._reserve(self._rows)
+            self._vectors[rows] = self._encode(np.stack([np.asarray(p["vector"]) for p in points]))
+            self._vectors.flush()
+            self._live[rows] = True
+            if self._centroids is not None:
+                self._assign[rows] = np.argmax(self._decode(self._vectors[rows]) @ self._centroids.T, axis=1)
+
+            placeholders = ",".join("?" * len(rows))
+            self._conn.execute(f"DELETE FROM postings WHERE row IN ({placeholders})", rows)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (row, id, payload, fetched_at, last_hit) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (row, str(p["id"]), json.dumps(p["payload"]), p["payload"].get("fetched_at"),
+                     p["payload"].get("last_hit_at"))
+                    for row, p in zip(rows, points)
+                ],
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, row, weight) VALUES (?, ?, ?)",
+                [(term, row, weight) for row, p in zip(rows, points) for term, weight in p["sparse"].items()],
+            )
+            self._conn.commit()
+
+    def _train_ivf(self) -> None:
+        live_rows = np.flatnonzero(self._live[:self._rows])
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(live_rows, min(len(live_rows), 256 * self.ivf_lists), replace=False))
+        sample = self._decode(self._vectors[sample_rows])
+        centroids = sample[rng.choice(len(sample), self.ivf_lists, replace=False)].copy()
+        for _ in range(10):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.ivf_lists):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        self._centroids = centroids
+        for start in range(0, self._rows, self.BLOCK_ROWS):
+            block = self._decode(self._vectors[start:start + self.BLOCK_ROWS][: self._rows - start])
+            self._assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self._ivf_trained_on = len(live_rows)
+
+    def _ivf_candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self.ivf_lists <= 0:
+            return None
+        live = len(self._ids)
+        if self._centroids is None or live > 2 * self._ivf_trained_on:
+            if live < self.ivf_lists * self.IVF_MIN_POINTS_PER_LIST:
+                return None
+            self._train_ivf()
+        probes = np.argsort(self._centroids @ query)[-self.ivf_probes:]
+        return np.flatnonzero(np.isin(self._assign[:self._rows], probes) & self._live[:self._rows])
+
+    def _dense_ranking(self, query: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+        candidates = self._ivf_candidates(query)
+        if candidates is None:
+            scores = np.empty(self._rows, dtype=np.float32)
+            for start in range(0, self._rows, self.BLOCK_ROWS):
+                block = self._vectors[start:min(start + self.BLOCK_ROWS, self._rows)]
+                scores[start:start + len(block)] = self._decode(block) @ query
+            scores[~self._live[:self._rows]] = -np.inf
+            candidates = np.arange(self._rows)
+        else:
+            scores = self._decode(self._vectors[candidates]) @ query
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def _sparse_ranking(self, terms: Dict[int, float], limit: int) -> List[int]:
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        ids = list(terms)
+        df = dict(
+            self._conn.execute(f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", ids)
+        )
+        n = len(self._ids)
+        idf = {term: float(np.log((n - count + 0.5) / (count + 0.5) + 1)) for term, count in df.items()}
+        scores: Dict[int, float] = {}
+        for term, row, weight in self._conn.execute(
+            f"SELECT term, row, weight FROM postings WHERE term IN ({placeholders})", ids
+        ):
+            scores[row] = scores.get(row, 0.0) + terms[term] * weight * idf[term]
+        return [row for row, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]]
+
+    def search(self, vectors: np.ndarray, sparse: List[Dict[int, float]], k: int) -> List[List[Any]]:
+        with self._lock:
+            results = []
+            for vec, terms in zip(vectors, sparse):
+                query = self._encode(np.asarray(vec)[None, :]).astype(np.float32)[0]
+                query /= max(float(np.linalg.norm(query)), 1e-12)
+                if HYBRID_SEARCH:
+                    limit = k * HYBRID_PREFETCH_FACTOR
+                    dense = [row for row, _ in self._dense_ranking(query, limit)]
+                    ranked = _rrf_fuse([dense, self._sparse_ranking(terms, limit)])[:k]
+                else:
+                    ranked = self._dense_ranking(query, k)
+                results.append(self._hits(ranked))
+            return results
+
+    def _hits(self, ranked: List[Tuple[int, float]]) -> List[LocalHit]:
+        if not ranked:
+            return []
+        rows = [row for row, _ in ranked]
+        placeholders = ",".join("?" * len(rows))
+        stored = {
+            row: (point_id, payload)
+            for row, point_id, payload in self._conn.execute(
+                f"SELECT row, id, payload FROM points WHERE row IN ({placeholders})", rows
+            )
+        }
+        vectors = self._decode(self._vectors[rows])
+        return [
+            LocalHit(stored[row][0], score, json.loads(stored[row][1]), vec.tolist())
+            for (row, score), vec in zip(ranked, vectors)
+            if row in stored
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._ids)
+
+    def delete(self, ids: List[Any]) -> None:
+        with self._lock:
+            rows = [self._ids[str(i)] for i in ids if str(i) in self._ids]
+            if rows:
+                self._delete_rows(rows)
+
+    def existing(self, ids: List[Any]) -> set:
+        with self._lock:
+            return {str(i) for i in ids if str(i) in self._ids}
+
+    def delete_stale_chunks(self, chunk_counts: Dict[str, int]) -> int:
+        if not chunk_counts:
+            return 0
+        with self._lock:
+            parents = list(chunk_counts)
+            placeholders = ",".join("?" * len(parents))
+            rows = [
+                row
+                for row, parent_id, index in self._conn.execute(
+                    f"SELECT row, json_extract(payload, '$.parent_id'), json_extract(payload, '$.chunk_index') "
+                    f"FROM points WHERE json_extract(payload, '$.parent_id') IN ({placeholders})",
+                    parents,
+                )
+                if index is not None and index >= chunk_counts[parent_id]
+            ]
+            return self._delete_rows(rows) if rows else 0
+
+    def touch(self, hits: Dict[Any, float]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE points SET last_hit = ? WHERE id = ?", [(when, str(point_id)) for point_id, when in hits.items()]
+            )
+            self._conn.commit()
+
+    def _delete_rows(self, rows: List[int]) -> int:
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self._conn.execute(f"DELETE FROM points WHERE row IN ({placeholders})", chunk)
+            self._conn.execute(f"DELETE FROM postings WHERE row IN ({placeholders})", chunk)
+        self._conn.commit()
+        self._live[rows] = False
+        self._vectors[rows] = 0
+        self._ids = {point_id: row for point_id, row in self._ids.items() if self._live[row]}
+        return len(rows)
+
+    def delete_older_than(self, cutoff: float) -> int:
+        with self._lock:
+            rows = [
+                row
+                for (row,) in self._conn.execute(
+                    "SELECT row FROM points WHERE (fetched_at IS NULL OR fetched_at < ?) "
+                    "AND NOT COALESCE(json_extract(payload, '$.pinned'), 0)",
+                    (cutoff,),
+                )
+            ]
+            return self._delete_rows(rows)
+
+    def evict_lru(self, max_points: int) -> int:
+        with self._lock:
+            (unpinned,) = self._conn.execute(
+                "SELECT COUNT(*) FROM points WHERE NOT COALESCE(json_extract(payload, '$.pinned'), 0)"
+            ).fetchone()
+            excess = unpinned - max_points
+            if excess <= 0:
+                return 0
+            rows = [
+                row
+                for (row,) in self._conn.execute(
+                    "SELECT row FROM points WHERE NOT COALESCE(json_extract(payload, '$.pinned'), 0) "
+                    "ORDER BY COALESCE(last_hit, fetched_at, 0) LIMIT ?",
+                    (excess,),
+                )
+            ]
+            return self._delete_rows(rows)
+
+    def compact(self) -> None:
+        """Renumber live rows densely, shrink the vector file and VACUUM SQLite."""
+        with self._lock:
+            live_rows = np.flatnonzero(self._live[:self._rows])
+            if len(live_rows) == self._rows and self._vectors.shape[0] <= max(self.MIN_CAPACITY, 2 * self._rows):
+                return
+            conn = self._conn
+            conn.execute("CREATE TEMP TABLE remap (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+            conn.executemany("INSERT INTO remap (old, new) VALUES (?, ?)", ((int(o), n) for n, o in enumerate(live_rows)))
+            conn.execute("CREATE TABLE points_compact AS SELECT * FROM points WHERE 0")
+            conn.execute(
+                "INSERT INTO points_compact SELECT remap.new, id, payload, fetched_at, last_hit "
+                "FROM points JOIN remap ON remap.old = points.row"
+            )
+            conn.execute("DELETE FROM points")
+            conn.execute("INSERT INTO points SELECT * FROM points_compact")
+            conn.execute("DROP TABLE points_compact")
+            conn.execute("UPDATE postings SET row = (SELECT new FROM remap WHERE old = postings.row)")
+            conn.execute("DROP TABLE remap")
+            conn.commit()
+            conn.execute("VACUUM")
+
+            capacity = max(self.MIN_CAPACITY, len(live_rows))
+            compacted = np.array(self._vectors[live_rows])
+            self._vectors.flush()
+            self._vectors = None
+            with open(self._vector_file, "r+b") as f:
+                f.truncate(capacity * self.dim * self.dtype.itemsize)
+            self._vectors = np.memmap(self._vector_file, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+            self._vectors[:] = 0
+            self._vectors[: len(live_rows)] = compacted
+            self._vectors.flush()
+            self._rows = len(live_rows)
+            self._live = np.zeros(capacity, dtype=bool)
+            self._live[: self._rows] = True
+            self._assign = np.full(capacity, -1, dtype=np.int32)
+            self._centroids = None
+            self._ids = dict(conn.execute("SELECT id, row FROM points").fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _open_vector_store(backend: str = VECTOR_STORE) -> VectorStore:
+    if backend == "local":
+        return LocalVectorStore(LOCAL_STORE_PATH)
+    if backend != "qdrant":
+        raise ValueError(f"Unknown VECTOR_STORE {backend!r}; expected qdrant or local")
+    from qdrant_client import QdrantClient
+
+    return QdrantStore(QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT))
+
+
+async def _connect_vector_store() -> None:
+    """Open the configured vector store and bootstrap it.
+
+    The store is opened while the model is still loading; bootstrapping needs
+    the embedding size, so it waits for the embedder.  ``_vector_store`` is
+    only published after that succeeds.
+    """
+    global _vector_store
+    loop = asyncio.get_running_loop()
+    store = await loop.run_in_executor(None, _open_vector_store)
+    await STARTUP.wait_for("embedder")
+    await loop.run_in_executor(None, store.bootstrap, _embedder.dim)
+    _vector_store = store
+
+
+class Startup:
+    """Background warm-up of the embedding model and vector store.
+
+    ``main`` calls ``start`` before serving so ``list_tools`` answers at once
+    while the heavy imports and model load run in the background; tool calls
+    ``await wait()`` for them instead of loading anything themselves.  Failed
+    steps are retried on the next ``wait``.  ``report`` returns step
+    durations and milestones in seconds since the module started importing.
+    """
+
+    STEPS = (("embedder", _warm_embedder), ("vectors", _connect_vector_store))
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def mark(self, event: str) -> None:
+        """Record the first time ``event`` happened."""
+        self.timings.setdefault(f"{event}_at_s", round(time.perf_counter() - _MODULE_STARTED, 3))
+
+    async def _run_step(self, name: str, step) -> None:
+        started = time.perf_counter()
+        await step()
+        self.timings[f"{name}_s"] = round(time.perf_counter() - started, 3)
+        self.mark(f"{name}_ready")
+        if all(t.done() for t in self._tasks.values() if t is not asyncio.current_task()):
+            self.mark("ready")
+            logging.info(f"Startup timings: {self.report()}")
+
+    def _log_failure(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f"Warm-up step failed: {task.exception()!r}")
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._tasks = loop, {}
+        for name, step in self.STEPS:
+            task = self._tasks.get(name)
+            if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+                task = loop.create_task(self._run_step(name, step))
+                task.add_done_callback(self._log_failure)
+                self._tasks[name] = task
+
+    async def wait_for(self, name: str) -> None:
+        """Wait for one step; for steps that depend on another."""
+        await asyncio.shield(self._tasks[name])
+
+    async def wait(self) -> None:
+        self.start()
+        # Shielded so a caller's deadline cannot cancel the shared warm-up
+        await asyncio.shield(asyncio.gather(*self._tasks.values()))
+
+    def report(self) -> Dict[str, float]:
+        return dict(self.timings)
+
+
+STARTUP = Startup()
+
+
+async def _ensure_clients():
+    if _vector_store is None or _embedder is None:
+        await STARTUP.wait()
+
+
+TRACKING_PARAM_RE = re.compile(r"^(?:utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref_src)$", re.IGNORECASE)
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n+")
+
+
+def _canonical_url(url: str) -> str:
+    """Normalize a URL so the same page always maps to the same point ids."""
+    parsed = urlparse(url.strip())
+    scheme = (parsed.scheme or "http").lower()
+    netloc = (parsed.hostname or "").lower()
+    if parsed.port and not (
+        (scheme == "http" and parsed.port == 80) or (scheme == "https" and parsed.port == 443)
+    ):
+        netloc = f"{netloc}:{parsed.port}"
+    path = parsed.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    params = [
+        (k, v)
+        for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not TRACKING_PARAM_RE.match(k)
+    ]
+    return urlunparse((scheme, netloc, path, "", urlencode(sorted(params)), ""))
+
+
+def _point_id(url: str, chunk_index: int = 0) -> str:
+    """Deterministic Qdrant point id for chunk ``chunk_index`` of ``url``."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{_canonical_url(url)}#{chunk_index}"))
+
+
+def _chunk_text(
+    text: str,
+    max_chars: int = CHUNK_CHARS,
+    overlap: int = CHUNK_OVERLAP,
+    max_chunks: int = MAX_CHUNKS_PER_PAGE,
+) -> List[str]:
+    """Split text into overlapping, sentence-aligned chunks of at most ``max_chars``.
+
+    Sentences are packed greedily; each new chunk starts with the trailing
+    sentences of the previous one (up to ``overlap`` chars), or, when its last
+    sentence alone is longer than that, with the words in its last
+    ``overlap`` chars.  Sentences longer than ``max_chars`` are split on
+    whitespace.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    overlap = max(0, min(overlap, max_chars // 2))
+
+    sentences: List[str] = []
+    for sent in SENTENCE_SPLIT_RE.split(text):
+        sent = " ".join(sent.split())
+        while len(sent) > max_chars:
+            cut = sent.rfind(" ", 0, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            sentences.append(sent[:cut])
+            sent = sent[cut:].lstrip()
+        if sent:
+            sentences.append(sent)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0  # len(" ".join(current))
+    for sent in sentences:
+        if current and size + 1 + len(sent) > max_chars:
+            chunks.append(" ".join(current))
+            if max_chunks and len(chunks) >= max_chunks:
+                return chunks
+            carry: List[str] = []
+            carry_size = 0
+            for prev in reversed(current):
+                grown = carry_size + len(prev) + (1 if carry else 0)
+                if grown > overlap or grown + 1 + len(sent) > max_chars:
+                    break
+                carry.insert(0, prev)
+                carry_size = grown
+            if not carry and overlap:
+                # Prose sentences usually outrun the window; carry its words
+                tail = current[-1][-overlap:]
+                if len(current[-1]) > overlap:
+                    tail = tail[tail.find(" ") + 1:] if " " in tail else ""
+                if tail and len(tail) + 1 + len(sent) <= max_chars:
+                    carry, carry_size = [tail], len(tail)
+            current, size = carry, carry_size
+        size += len(sent) + (1 if current else 0)
+        current.append(sent)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _chunk_documents(docs: List[Dict[str, Any]], max_chunks: int = MAX_CHUNKS_PER_PAGE) -> List[Dict[str, Any]]:
+    """Expand page-level docs into chunk-level docs ready for ``_upsert_texts``.
+
+    Each chunk gets a deterministic id derived from the canonical URL and its
+    index, plus ``parent_id``/``chunk_index``/``chunk_count`` payload fields that
+    point back to the source page.  Each doc yields at most ``max_chunks``
+    chunks (0 = unlimited).
+    """
+    out: List[Dict[str, Any]] = []
+    for doc in docs:
+        meta = doc["metadata"]
+        url = meta.get("url", "")
+        chunks = _chunk_text(doc["text"], max_chunks=max_chunks)
+        parent_id = str(uuid.uuid5(uuid.NAMESPACE_URL, _canonical_url(url))) if url else str(uuid.uuid4())
+        for idx, chunk in enumerate(chunks):
+            out.append(
+                {
+                    "id": _point_id(url, idx) if url else str(uuid.uuid4()),
+                    "text": chunk,
+                    "metadata": {
+                        **meta,
+                        "parent_id": parent_id,
+                        "chunk_index": idx,
+                        "chunk_count": len(chunks),
+                    },
+                }
+            )
+    return out
+
+
+BM25_TOKEN_RE = re.compile(r"\w+")
+BM25_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have if in into is it its of on or "
+    "that the their then there these they this to was were will with".split()
+)
+
+
+def _bm25_tokens(text: str) -> List[str]:
+    return [t for t in BM25_TOKEN_RE.findall(text.lower()) if t not in BM25_STOPWORDS]
+
+
+def _bm25_term_id(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _bm25_document(text: str) -> Dict[int, float]:
+    """BM25 term weights (saturated, length-normalized tf) for a stored chunk.
+
+    IDF is left to Qdrant (``Modifier.IDF`` on the sparse vector), which keeps
+    it correct as the collection grows without re-encoding old points.
+    """
+    tokens = _bm25_tokens(text)
+    if not tokens:
+        return {}
+    counts = Counter(_bm25_term_id(t) for t in tokens)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_TOKENS)
+    return {term: tf * (BM25_K1 + 1) / (tf + norm) for term, tf in counts.items()}
+
+
+def _bm25_query(text: str) -> Dict[int, float]:
+    return {_bm25_term_id(t): 1.0 for t in _bm25_tokens(text)}
+
+
+def _sparse_vector(weights: Dict[int, float]):
+    from qdrant_client.models import SparseVector
+
+    indices = sorted(weights)
+    return SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+async def _upsert_text(text: str, metadata: Dict[str, Any]):
+    await _upsert_texts([{"text": text, "metadata": metadata}])
+
+
 async def _upsert_texts(docs: List[Dict[str, Any]]):
-    """Batch upsert texts with metadata"""
+    """Batch upsert texts with metadata into the vector store.
+
+    Each point stores the dense embedding plus a BM25 sparse vector for
+    hybrid search.  Docs may carry a precomputed point ``id`` (see
+    ``_chunk_documents``); otherwise the id is derived from the metadata URL.
+    Chunks a page had beyond its new ``chunk_count`` are deleted.
+    """
     if not docs:
         return
-    _ensure_clients()
+    await _ensure_clients()
     loop = asyncio.get_running_loop()
 
     texts = [d["text"] for d in docs]
-    vectors = await loop.run_in_executor(None, lambda: _embed_model.encode(texts))
+    with span("embed"):
+        vectors = await _embedder.encode(texts)
+    fetched_at = time.time()
     points = []
     for vec, doc in zip(vectors, docs):
         meta = doc["metadata"]
+        url = meta.get("url")
         points.append(
-            PointStruct(
-                id=meta.get("url") or meta.get("id") or str(uuid.uuid4()),
-                vector=vec.tolist(),
-                payload={"text": doc["text"], **meta},
-            )
+            {
+                "id": doc.get("id") or (_point_id(url) if url else str(uuid.uuid4())),
+                "vector": vec,
+                "sparse": _bm25_document(doc["text"]),
+                "payload": {"text": doc["text"], "fetched_at": fetched_at, "last_hit_at": fetched_at, **meta},
+            }
         )
 
-    await loop.run_in_executor(
-        None,
-        lambda: _qdrant_client.upsert(collection_name=QDRANT_COLLECTION, points=points),
-    )
+    chunk_counts = {
+        d["metadata"]["parent_id"]: d["metadata"]["chunk_count"]
+        for d in docs
+        if "parent_id" in d["metadata"] and "chunk_count" in d["metadata"]
+    }
+    with span("upsert"):
+        await loop.run_in_executor(None, _vector_store.upsert, points)
+        if chunk_counts:
+            await loop.run_in_executor(None, _vector_store.delete_stale_chunks, chunk_counts)
+    _invalidate_cache_for(docs)
 
 
-async def _rag_search(query: str, k: int):
-    _ensure_clients()
-    loop = asyncio.get_running_loop()
-    vector = await loop.run_in_executor(None, lambda: _embed_model.encode([query])[0])
-
-    def _search():
-        return _qdrant_client.search(
-            collection_name=QDRANT_COLLECTION,
-            query_vector=vector.tolist(),
-            limit=k,
-            with_payload=True,
-            with_vectors=True,
-        )
+def _matches_from_results(query_vector: np.ndarray, points) -> List[Dict[str, Any]]:
+    """Turn vector store points into matches for dedup and confidence.
 
-    results = await loop.run_in_executor(None, _search)
+    Without ``HYBRID_SEARCH`` the match ``score`` is the dense cosine.  With
+    it, fused scores only order one query's hits, so each is taken relative
+    to the query's best fused score and then scaled by the query's best
+    cosine: a chunk found only by BM25 ranks where the fusion put it rather
+    than by its (low) dense cosine, while the hits of an off-topic query stay
+    as low as their best cosine and remain comparable with other queries'
+    in dedup and confidence.  The cosine is kept as ``similarity`` and the
+    store's score as ``fusion_score``.
+    """
+    q = np.asarray(query_vector, dtype=np.float32)
+    q_norm = float(np.linalg.norm(q)) or 1.0
+    similarities = []
+    for p in points:
+        vector = p.vector.get("") if isinstance(p.vector, dict) else p.vector
+        similarity = 0.0
+        if vector is not None:
+            v = np.asarray(vector, dtype=np.float32)
+            similarity = float(v @ q) / max(float(np.linalg.norm(v)) * q_norm, 1e-12)
+        similarities.append((vector, similarity))
+    best_fused = max((p.score for p in points), default=0.0) or 1.0
+    ceiling = max((sim for _, sim in similarities), default=0.0)
     matches = []
-    keywords = [kw.lower() for kw in query.split()]
-    for r in results:
-        payload = r.payload or {}
-        text = payload.get("text") or payload.get("content") or ""
-        kw_hits = sum(1 for kw in keywords if kw in text.lower())
+    for p, (vector, similarity) in zip(points, similarities):
+        payload = p.payload or {}
         matches.append(
             {
-                "text": text,
+                "text": payload.get("text") or payload.get("content") or "",
                 "metadata": payload,
-                "score": r.score + kw_hits * 0.05,
-                "vector": r.vector,
+                "score": p.score / best_fused * ceiling if HYBRID_SEARCH else similarity,
+                "similarity": similarity,
+                "fusion_score": p.score,
+                "id": getattr(p, "id", None),
+                "vector": vector,
             }
         )
     return matches
 
 
-def _cosine_similarity(a: List[float], b: List[float]) -> float:
-    a_vec, b_vec = np.array(a), np.array(b)
-    return float(np.dot(a_vec, b_vec) / ((np.linalg.norm(a_vec) * np.linalg.norm(b_vec)) + 1e-10))
+async def _rag_search_many(queries: List[str], k: int) -> List[List[Dict[str, Any]]]:
+    """Embed all queries in one model call and run them as one vector store batch.
+
+    With ``HYBRID_SEARCH`` each query takes ``k * HYBRID_PREFETCH_FACTOR``
+    candidates from both the dense and the BM25 index and fuses them with
+    reciprocal-rank fusion; otherwise it is a dense-only search.
+    """
+    if not queries:
+        return []
+    await _ensure_clients()
+    loop = asyncio.get_running_loop()
+    with span("embed"):
+        vectors = await _embedder.encode(queries)
+    sparse = [_bm25_query(q) for q in queries]
+    with span("vector_search"):
+        batch_results = await loop.run_in_executor(None, _vector_store.search, vectors, sparse, k)
+    _record_hits(p for hits in batch_results for p in hits)
+    return [_matches_from_results(vec, hits) for vec, hits in zip(vectors, batch_results)]
+
+
+# Point id -> last time it was returned by a search; written to the store in
+# bulk by run_maintenance instead of once per query
+_pending_hits: Dict[Any, float] = {}
+PENDING_HITS_MAX = 100_000
+
+
+def _record_hits(points: Iterable[Any]) -> None:
+    # Only the background maintenance loop drains this, so without it (or
+    # beyond the cap) hits are not recorded; on the event loop only
+    if MAINTENANCE_INTERVAL_S <= 0:
+        return
+    now = time.time()
+    for p in points:
+        point_id = getattr(p, "id", None)
+        if point_id is not None and (point_id in _pending_hits or len(_pending_hits) < PENDING_HITS_MAX):
+            _pending_hits[point_id] = now
+
+
+def _take_pending_hits() -> Dict[Any, float]:
+    """Swap out the recorded hits; call on the event loop that records them."""
+    global _pending_hits
+    hits, _pending_hits = _pending_hits, {}
+    return hits
+
+
+def run_maintenance(
+    store: "VectorStore",
+    ttl_days: Optional[float] = None,
+    max_points: Optional[int] = None,
+    hits: Optional[Dict[Any, float]] = None,
+) -> Dict[str, int]:
+    """Expire, evict and compact the vector cache; blocking.
+
+    First writes ``hits`` (default: the pending search hits) to the store.
+    Then deletes points fetched more than ``ttl_days`` ago (default
+    ``WEB_CACHE_TTL_DAYS``), then evicts the least recently hit points above
+    ``max_points`` (default ``MAX_CACHE_POINTS``; 0 = unlimited), then
+    compacts the store if anything was removed.  Finally prunes
+    ``PAGE_STORE`` (see ``PageStore.prune``).  The in-memory result caches
+    belong to the event loop and are left to the caller (see
+    ``_maintenance_loop``).
+    """
+    ttl_days = WEB_CACHE_TTL_DAYS if ttl_days is None else ttl_days
+    max_points = MAX_CACHE_POINTS if max_points is None else max_points
+    hits = _take_pending_hits() if hits is None else hits
+    if hits:
+        store.touch(hits)
+    before = store.count()
+    expired = store.delete_older_than(time.time() - ttl_days * 86400) if ttl_days > 0 else 0
+    evicted = store.evict_lru(max_points) if max_points > 0 else 0
+    if expired or evicted:
+        store.compact()
+    after = store.count()
+    pages_pruned = PAGE_STORE.prune() if PAGE_STORE is not None else 0
+    logging.info(
+        f"Cache maintenance: removed {expired} expired and {evicted} evicted points; "
+        f"{before} -> {after} points; pruned {pages_pruned} cached pages"
+    )
+    return {"before": before, "expired": expired, "evicted": evicted, "after": after, "pages_pruned": pages_pruned}
+
+
+async def _maintenance_loop(interval: float = MAINTENANCE_INTERVAL_S) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await STARTUP.wait()
+            result = await loop.run_in_executor(None, run_maintenance, _vector_store, None, None, _take_pending_hits())
+            if result["expired"] or result["evicted"]:
+                # Cached results may cite removed chunks; the caches are not
+                # thread-safe, so they are cleared here rather than in the job
+                RAG_CACHE.clear()
+                if SEMANTIC_CACHE is not None:
+                    SEMANTIC_CACHE.clear()
+        except Exception as e:
+            logging.warning(f"Cache maintenance failed: {e!r}")
+        await asyncio.sleep(interval)
+
+
+async def _rag_search(query: str, k: int):
+    return (await _rag_search_many([query], k))[0]
 
 
 def _source_type(domain: str) -> str:
@@ -142,7 +2138,17 @@ def _source_type(domain: str) -> str:
     return "other"
 
 
+ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2}):(\d{2}))?")
+
+
+@lru_cache(maxsize=4096)
 def _parse_date(d: str) -> datetime:
+    m = ISO_DATE_RE.fullmatch(d[:19])
+    if m:
+        try:
+            return datetime(*(int(g) for g in m.groups() if g is not None))
+        except ValueError:
+            pass
     for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"):
         try:
             return datetime.strptime(d[:19], fmt)
@@ -154,63 +2160,121 @@ def _parse_date(d: str) -> datetime:
         return datetime(1970, 1, 1)
 
 
+def _stack_vectors(matches: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack match vectors into a row-normalized float32 matrix.
+
+    Returns ``(vectors, has_vector)``; rows without a usable vector are zero.
+    """
+    dim = next((len(m["vector"]) for m in matches if m.get("vector") is not None), 0)
+    vecs = np.zeros((len(matches), dim), dtype=np.float32)
+    has_vec = np.zeros(len(matches), dtype=bool)
+    for i, m in enumerate(matches):
+        v = m.get("vector")
+        if v is not None and len(v) == dim:
+            vecs[i] = v
+            has_vec[i] = True
+    norms = np.linalg.norm(vecs, axis=1)
+    has_vec &= norms > 0
+    vecs[has_vec] /= norms[has_vec, None]
+    return vecs, has_vec
+
+
 def _deduplicate_chunks(matches: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
-    unique_matches: List[Dict[str, Any]] = []
+    """Greedy maximal-marginal-relevance selection of up to ``k`` matches.
+
+    Relevance is the confidence blend of score and recency.  A candidate is
+    excluded once a selected match is more similar than ``DEDUP_THRESHOLD`` or
+    shares its domain; old pages are skipped after the first six picks and each
+    source type is capped at three.  Similarities are computed one vectorized
+    row at a time against the pre-normalized candidate matrix.
+    """
+    if not matches or k <= 0:
+        return []
+    n = len(matches)
+    now = datetime.now()
+    year_ago = now - timedelta(days=365)
+
+    metas = [m.setdefault("metadata", {}) for m in matches]
+    domains = np.array([meta.get("domain", "") for meta in metas], dtype=object)
+    s_types = np.array([_source_type(d) for d in domains], dtype=object)
+    dates = [_parse_date(meta.get("publish_date", meta.get("meta_date", ""))) for meta in metas]
+    is_old = np.array([d < year_ago for d in dates], dtype=bool)
+    recency = np.array([max(0.0, 1 - (now - d).days / 365) for d in dates])
+    scores = np.array([m.get("score", 0) for m in matches], dtype=np.float64)
+    confidence = scores * 0.7 + recency * 0.3
+
+    vecs, has_vec = _stack_vectors(matches)
+    max_sim = np.zeros(n, dtype=np.float32)
+    eligible = np.ones(n, dtype=bool)
     diversity: Dict[str, int] = {}
-    for match in matches:
-        vec = match.get("vector")
-        meta = match.get("metadata", {})
-        dom = meta.get("domain", "")
-        pub_date = _parse_date(meta.get("publish_date", meta.get("meta_date", "")))
-        s_type = _source_type(dom)
-        is_duplicate = False
-        for existing in unique_matches:
-            if vec is not None and existing.get("vector") is not None:
-                if _cosine_similarity(vec, existing["vector"]) > DEDUP_THRESHOLD:
-                    is_duplicate = True
-                    break
-            if dom and dom == existing.get("metadata", {}).get("domain"):
-                is_duplicate = True
-                break
-        if is_duplicate:
-            continue
-        if len(unique_matches) > 5 and pub_date < datetime.now() - timedelta(days=365):
-            continue
-        if diversity.get(s_type, 0) >= 3:
+    selected: List[int] = []
+
+    while len(selected) < k and eligible.any():
+        mmr = np.where(eligible, MMR_LAMBDA * confidence - (1 - MMR_LAMBDA) * max_sim, -np.inf)
+        i = int(np.argmax(mmr))
+        eligible[i] = False
+        if len(selected) > 5 and is_old[i]:
             continue
+        s_type = s_types[i]
         diversity[s_type] = diversity.get(s_type, 0) + 1
-        match["metadata"]["source_type"] = s_type
-        unique_matches.append(match)
+        if diversity[s_type] >= 3:
+            eligible &= s_types != s_type
+        if domains[i]:
+            eligible &= domains != domains[i]
+        if has_vec[i]:
+            sims = vecs @ vecs[i]
+            eligible &= ~(has_vec & (sims > DEDUP_THRESHOLD))
+            np.maximum(max_sim, sims, out=max_sim)
+        selected.append(i)
 
-    now = datetime.now()
-    for m in unique_matches:
-        meta = m.get("metadata", {})
-        pub_date = _parse_date(meta.get("publish_date", meta.get("meta_date", "")))
-        recency = max(0.0, 1 - (now - pub_date).days / 365)
-        m["confidence"] = m.get("score", 0) * 0.7 + recency * 0.3
+    selected.sort(key=lambda i: confidence[i], reverse=True)
+    out = []
+    for i in selected:
+        match = matches[i]
+        match["metadata"]["source_type"] = s_types[i]
+        match["confidence"] = float(confidence[i])
+        out.append(match)
+    return out
 
-    unique_matches.sort(key=lambda m: m.get("confidence", m.get("score", 0)), reverse=True)
-    return unique_matches[:k]
 
+async def _smart_rag_search_many(
+    queries: List[str], k: int = CHUNKS_PER_QUERY
+) -> List[List[Dict[str, Any]]]:
+    """Cached, deduplicated RAG search for several queries at once.
 
-async def _smart_rag_search(query: str, k: int = CHUNKS_PER_QUERY) -> List[Dict[str, Any]]:
-    key = hashlib.sha256(query.encode()).hexdigest()
-    now = time.time()
-    cached = RAG_CACHE.get(key)
-    if cached and now - cached[0] < CACHE_TTL:
-        logging.info(f"Cache hit for query '{query}'")
-        return cached[1][:k]
+    Cache hits are served directly; all misses share a single embedding call
+    and a single Qdrant batch search.  Results are returned in query order.
+    """
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    misses: List[str] = []
+    for query in queries:
+        if query in results or query in misses:
+            continue
+        cached = RAG_CACHE.get(query)
+        if cached is not None:
+            logging.debug(f"Cache hit for query '{query}'")
+            results[query] = cached[:k]
+        else:
+            misses.append(query)
 
-    raw_matches = await _rag_search(query, k * 2)
-    unique_matches = _deduplicate_chunks(raw_matches, k)
-    for match in unique_matches:
-        match["text"] = match["text"][:CHUNK_CHARS]
+    if misses:
+        raw_batches = await _rag_search_many(misses, k * 2)
+        for query, raw_matches in zip(misses, raw_batches):
+            with span("dedup"):
+                unique_matches = _deduplicate_chunks(raw_matches, k)
+            for match in unique_matches:
+                match["text"] = match["text"][:CHUNK_CHARS]
+            logging.debug(
+                f"Raw matches for '{query}': {len(raw_matches)}, Unique after dedup: {len(unique_matches)}"
+            )
+            RAG_CACHE.put(query, unique_matches)
+            results[query] = unique_matches
+
+    return [results[q] for q in queries]
 
-    logging.info(
-        f"Raw matches: {len(raw_matches)}, Unique after dedup: {len(unique_matches)}"
-    )
-    RAG_CACHE[key] = (now, unique_matches)
-    return unique_matches
+
+async def _smart_rag_search(query: str, k: int = CHUNKS_PER_QUERY) -> List[Dict[str, Any]]:
+    return (await _smart_rag_search_many([query], k))[0]
 
 SEARCH_ENGINES = [e.strip() for e in os.getenv("SEARCH_ENGINES", "bing,brave,qwant,mojeek,wikipedia").split(",") if e.strip()]
 
@@ -324,7 +2388,7 @@ def normalize_args(args: Dict[str, Any]) -> Dict[str, Any]:
         queries = [x.strip() for x in args["queries"] if str(x).strip()]
         claim = str(args.get("claim")).strip() if isinstance(args.get("claim"), str) else None
         if LOG_ARG_WARNINGS:
-            print("normalize_args: direct queries provided", flush=True)
+            logging.debug("normalize_args: direct queries provided")
     elif any(k in args for k in ("query", "q", "search", "searches", "questions")):
         key = next(k for k in ("query", "q", "search", "searches", "questions") if k in args)
         v = args[key]
@@ -334,7 +2398,7 @@ def normalize_args(args: Dict[str, Any]) -> Dict[str, Any]:
             queries = [str(v).strip()]
         claim = str(args.get("claim")).strip() if isinstance(args.get("claim"), str) else None
         if LOG_ARG_WARNINGS:
-            print(f"normalize_args: used alias '{key}'", flush=True)
+            logging.debug(f"normalize_args: used alias '{key}'")
     else:
         text_fields = []
         for k in ("prompt", "input", "body", "data", "text"):
@@ -353,11 +2417,11 @@ def normalize_args(args: Dict[str, Any]) -> Dict[str, Any]:
                 if not claim and isinstance(obj.get("claim"), str):
                     claim = obj["claim"].strip() or None
                 if LOG_ARG_WARNINGS:
-                    print("normalize_args: parsed JSON object", flush=True)
+                    logging.debug("normalize_args: parsed JSON object")
             if not queries:
                 extracted = _extract_queries_from_text(t)
                 if extracted and LOG_ARG_WARNINGS:
-                    print("normalize_args: extracted queries from text", flush=True)
+                    logging.debug("normalize_args: extracted queries from text")
                 queries.extend(extracted)
             if not claim:
                 claim = _extract_claim(t)
@@ -374,7 +2438,7 @@ def normalize_args(args: Dict[str, Any]) -> Dict[str, Any]:
         raise ValueError("No queries found. Provide at least one search query.")
     if len(uniq) > MAX_QUERIES:
         if LOG_ARG_WARNINGS:
-            print(f"normalize_args: clipping queries to {MAX_QUERIES}", flush=True)
+            logging.debug(f"normalize_args: clipping queries to {MAX_QUERIES}")
         uniq = uniq[:MAX_QUERIES]
     uniq = [re.sub(r"\s+", " ", q) for q in uniq]
     out: Dict[str, Any] = {"queries": uniq}
@@ -382,111 +2446,1045 @@ def normalize_args(args: Dict[str, Any]) -> Dict[str, Any]:
         out["claim"] = claim
     return out
 
+class AimdLimiter:
+    """Concurrency limit adapted by additive increase / multiplicative decrease.
+
+    A success faster than ``latency_target`` raises the limit by
+    ``1 / limit`` (about one per round of requests); an overload signal
+    (429/503, a transport error or a slow answer) multiplies it by
+    ``backoff``, at most once per ``cooldown`` seconds so one burst of
+    failures counts once.  Waiters are futures on the running loop.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = 1,
+        backoff: float = FETCH_AIMD_BACKOFF,
+        latency_target: float = FETCH_LATENCY_TARGET_MS / 1000,
+        cooldown: float = 1.0,
+    ):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(self.maximum)
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._last_decrease = float("-inf")
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+                elif fut.done() and not fut.cancelled():
+                    self._wake()  # pass the wake-up on
+                raise
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    def record(self, latency: Optional[float], overloaded: bool = False) -> bool:
+        """Feed one outcome back; returns True when the limit was cut."""
+        if overloaded or (latency is not None and latency > self.latency_target):
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return False
+            self._last_decrease = now
+            self.limit = max(float(self.minimum), self.limit * self.backoff)
+            return True
+        self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+        self._wake()
+        return False
+
+
+class _HostState:
+    __slots__ = ("limiter", "next_start", "blocked_until")
+
+    def __init__(self, limiter: AimdLimiter):
+        self.limiter = limiter
+        self.next_start = 0.0
+        self.blocked_until = 0.0
+
+
+class FetchSlot:
+    """Handed out by ``HttpPool.host_slot``; ``record`` the response in it."""
+
+    __slots__ = ("response", "retry_after")
+
+    def __init__(self):
+        self.response: Optional[httpx.Response] = None
+        self.retry_after: Optional[float] = None
+
+    def record(self, response: httpx.Response) -> None:
+        self.response = response
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header (delta seconds or an HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        from email.utils import parsedate_to_datetime
+
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate(spec: str) -> Optional[Tuple[int, float]]:
+    """``"20/60"`` -> (20 requests, 60 seconds); empty or "0" disables."""
+    if not spec or spec.strip() in ("0", "0/0"):
+        return None
+    requests, _, seconds = spec.partition("/")
+    return int(requests), float(seconds or 1)
+
+
+class HttpPool:
+    """Process-lifetime pooled HTTP clients shared by every tool call.
+
+    One client talks to SearXNG, another fetches pages (optionally over
+    HTTP/2).  Both are created lazily on first use, keep connections alive
+    across calls and share ``HTTP_MAX_CONNECTIONS``-style limits.
+
+    Page fetches take a ``host_slot``.  An adaptive global limit caps them
+    (``FETCH_MIN_CONCURRENCY``..``FETCH_MAX_CONCURRENCY``), and so does an
+    adaptive per-host limit (1..``HTTP_MAX_PER_HOST``).  Starts to one host
+    are spaced by ``FETCH_HOST_DELAY_MS``, and a host's ``Retry-After`` holds
+    back its queued fetches.  SearXNG requests take a ``search_slot``, which
+    is rate-capped to ``SEARX_RATE_LIMIT`` with its own adaptive concurrency
+    limit.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        max_per_host: int = HTTP_MAX_PER_HOST,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = HTTP2_ENABLED,
+        max_fetches: int = FETCH_MAX_CONCURRENCY,
+        min_fetches: int = FETCH_MIN_CONCURRENCY,
+        host_delay_ms: float = FETCH_HOST_DELAY_MS,
+        searx_rate: str = SEARX_RATE_LIMIT,
+        max_searches: int = SEARX_MAX_CONCURRENCY,
+    ):
+        self.max_per_host = max_per_host
+        self.max_fetches = max_fetches
+        self.min_fetches = min_fetches
+        self.host_delay = host_delay_ms / 1000
+        self.searx_rate = _parse_rate(searx_rate)
+        self.max_searches = max_searches
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logging.warning("HTTP2=true but the 'h2' package is not installed; using HTTP/1.1")
+            self.http2 = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._search: Optional[httpx.AsyncClient] = None
+        self._pages: Optional[httpx.AsyncClient] = None
+        self._reset_limits()
+
+    def _reset_limits(self) -> None:
+        self._hosts: Dict[str, _HostState] = {}
+        self._fetches = AimdLimiter(self.max_fetches, self.min_fetches)
+        self._searches = AimdLimiter(self.max_searches, 1, latency_target=SEARX_TIMEOUT / 2)
+        self._search_starts: deque = deque()
+        self._searx_paused_until = 0.0
+
+    def _check_loop(self) -> None:
+        # Clients and limiter waiters are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._search = self._pages = None
+            self._reset_limits()
+
+    def search_client(self) -> httpx.AsyncClient:
+        self._check_loop()
+        if self._search is None:
+            self._search = httpx.AsyncClient(limits=self._limits, timeout=15)
+        return self._search
+
+    def page_client(self) -> httpx.AsyncClient:
+        self._check_loop()
+        if self._pages is None:
+            self._pages = httpx.AsyncClient(
+                limits=self._limits,
+                http2=self.http2,
+                timeout=8,
+                headers={"User-Agent": "GabeSearch-mcp/0.1"},
+            )
+        return self._pages
+
+    def _feed_back(self, limiter: AimdLimiter, scope: str, latency: Optional[float], cause: Optional[str]) -> None:
+        if limiter.record(latency, overloaded=cause is not None):
+            cause = cause or "slow"
+            METRICS.inc("gabesearch_backoffs", scope=scope, cause=cause)
+            logging.debug(f"Backing off {scope} ({cause}): limit now {limiter.limit:.1f}")
+
+    @asynccontextmanager
+    async def host_slot(self, url: str):
+        """Admit one page fetch to ``url``'s host; yields a ``FetchSlot``."""
+        self._check_loop()
+        host = (urlparse(url).hostname or "").lower()
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(AimdLimiter(self.max_per_host))
+        await state.limiter.acquire()
+        try:
+            # Space out request starts to this host (reserving a start time
+            # before sleeping) and honour any Retry-After pause
+            start_at = max(time.monotonic(), state.next_start)
+            state.next_start = start_at + self.host_delay
+            while True:
+                delay = max(start_at, state.blocked_until) - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            await self._fetches.acquire()
+            try:
+                slot = FetchSlot()
+                started = time.monotonic()
+                try:
+                    yield slot
+                except httpx.TransportError as e:
+                    cause = type(e).__name__
+                    self._feed_back(state.limiter, "host", None, cause)
+                    self._feed_back(self._fetches, "global", None, cause)
+                    raise
+                latency = time.monotonic() - started
+                status = slot.response.status_code if slot.response is not None else 200
+                if status in (429, 503):
+                    slot.retry_after = _retry_after_seconds(slot.response.headers.get("retry-after"))
+                    state.blocked_until = time.monotonic() + min(
+                        slot.retry_after if slot.retry_after is not None else 1.0, FETCH_RETRY_AFTER_MAX_S
+                    )
+                    self._feed_back(state.limiter, "host", latency, f"http_{status}")
+                else:
+                    self._feed_back(state.limiter, "host", latency, None)
+                    self._feed_back(self._fetches, "global", latency, None)
+            finally:
+                self._fetches.release()
+        finally:
+            state.limiter.release()
+
+    @asynccontextmanager
+    async def search_slot(self):
+        """Admit one SearXNG request within ``SEARX_RATE_LIMIT``; yields a ``FetchSlot``."""
+        self._check_loop()
+        await self._searches.acquire()
+        try:
+            while True:
+                now = time.monotonic()
+                wait = self._searx_paused_until - now
+                if self.searx_rate is not None:
+                    requests, window = self.searx_rate
+                    while self._search_starts and self._search_starts[0] <= now - window:
+                        self._search_starts.popleft()
+                    if len(self._search_starts) >= requests:
+                        wait = max(wait, self._search_starts[0] + window - now)
+                if wait <= 0:
+                    break
+                logging.debug(f"SearXNG rate cap reached; waiting {wait:.1f}s")
+                await asyncio.sleep(wait)
+            self._search_starts.append(time.monotonic())
+            slot = FetchSlot()
+            started = time.monotonic()
+            try:
+                yield slot
+            except httpx.TransportError as e:
+                self._feed_back(self._searches, "searx", None, type(e).__name__)
+                raise
+            if slot.response is not None and slot.response.status_code == 429:
+                # SearXNG's limiter answered; back off before it turns into a ban
+                slot.retry_after = _retry_after_seconds(slot.response.headers.get("retry-after"))
+                self._searx_paused_until = time.monotonic() + (slot.retry_after or 60.0)
+                self._feed_back(self._searches, "searx", None, "http_429")
+            else:
+                self._feed_back(self._searches, "searx", time.monotonic() - started, None)
+        finally:
+            self._searches.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current adaptive limits; hosts listed only while below their maximum."""
+        return {
+            "fetch_limit": round(self._fetches.limit, 1),
+            "fetches_in_flight": self._fetches.in_flight,
+            "search_limit": round(self._searches.limit, 1),
+            "throttled_hosts": {
+                host: round(st.limiter.limit, 1)
+                for host, st in list(self._hosts.items())
+                if st.limiter.limit < self.max_per_host
+            },
+        }
+
+    async def aclose(self) -> None:
+        for client in (self._search, self._pages):
+            if client is not None:
+                await client.aclose()
+        self._search = self._pages = None
+        self._reset_limits()
+
+
+HTTP_POOL = HttpPool()
+
+
+class EngineScoreboard:
+    """In-process health tracking for SearXNG engines.
+
+    Keeps an EWMA of latency and success per engine plus a cooldown after
+    repeated failures (immediately when an engine answers with a non-JSON
+    CAPTCHA page).  ``ranked`` orders healthy engines by success/latency and
+    puts cooling-down engines last; ``hedge_delay`` is a percentile of recent
+    successful latencies used to decide when to fire a backup request.
+    """
+
+    def __init__(
+        self,
+        alpha: float = ENGINE_EWMA_ALPHA,
+        cooldown_s: float = ENGINE_COOLDOWN_S,
+        failure_threshold: int = ENGINE_FAILURE_THRESHOLD,
+        window: int = 64,
+    ):
+        self.alpha = alpha
+        self.cooldown_s = cooldown_s
+        self.failure_threshold = failure_threshold
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._latencies: deque = deque(maxlen=window)
+
+    def _get(self, engine: str) -> Dict[str, Any]:
+        st = self._stats.get(engine)
+        if st is None:
+            st = self._stats[engine] = {
+                "latency_ewma": None,
+                "success_ewma": 1.0,
+                "successes": 0,
+                "failures": 0,
+                "consecutive_failures": 0,
+                "cooldown_until": 0.0,
+                "last_error": "",
+            }
+        return st
+
+    def _update_latency(self, st: Dict[str, Any], latency: float) -> None:
+        prev = st["latency_ewma"]
+        st["latency_ewma"] = latency if prev is None else self.alpha * latency + (1 - self.alpha) * prev
+
+    def record_success(self, engine: str, latency: float) -> None:
+        METRICS.inc("gabesearch_engine_requests", engine=engine, outcome="ok")
+        st = self._get(engine)
+        self._update_latency(st, latency)
+        st["success_ewma"] = self.alpha + (1 - self.alpha) * st["success_ewma"]
+        st["successes"] += 1
+        st["consecutive_failures"] = 0
+        st["cooldown_until"] = 0.0
+        self._latencies.append(latency)
+
+    def record_failure(self, engine: str, latency: float, reason: str, blocked: bool = False) -> None:
+        METRICS.inc("gabesearch_engine_requests", engine=engine, outcome=reason)
+        st = self._get(engine)
+        self._update_latency(st, latency)
+        st["success_ewma"] = (1 - self.alpha) * st["success_ewma"]
+        st["failures"] += 1
+        st["consecutive_failures"] += 1
+        st["last_error"] = reason
+        strikes = st["consecutive_failures"] - self.failure_threshold
+        if blocked or strikes >= 0:
+            backoff = self.cooldown_s * (2 ** min(max(strikes, 0), 4))
+            st["cooldown_until"] = time.monotonic() + backoff
+
+    def cooling(self, engine: str) -> bool:
+        return self._get(engine)["cooldown_until"] > time.monotonic()
+
+    def ranked(self, engines: List[str]) -> List[str]:
+        now = time.monotonic()
+        known = [st["latency_ewma"] for st in self._stats.values() if st["latency_ewma"] is not None]
+        prior = float(np.median(known)) if known else 1.0
+        shuffled = engines.copy()
+        random.shuffle(shuffled)  # random tie-break keeps unknown engines explored
+
+        def score(engine: str) -> float:
+            st = self._get(engine)
+            latency = st["latency_ewma"] if st["latency_ewma"] is not None else prior
+            return st["success_ewma"] / max(latency, 1e-3)
+
+        healthy = [e for e in shuffled if self._get(e)["cooldown_until"] <= now]
+        cooling = [e for e in shuffled if self._get(e)["cooldown_until"] > now]
+        healthy.sort(key=score, reverse=True)
+        cooling.sort(key=lambda e: self._get(e)["cooldown_until"])
+        return healthy + cooling
+
+    def hedge_delay(self) -> float:
+        if not self._latencies:
+            return HEDGE_MAX_DELAY_MS / 1000
+        delay = float(np.percentile(list(self._latencies), HEDGE_PERCENTILE * 100))
+        return min(max(delay, HEDGE_MIN_DELAY_MS / 1000), HEDGE_MAX_DELAY_MS / 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "hedge_delay_ms": int(self.hedge_delay() * 1000),
+            "engines": {
+                engine: {
+                    "latency_ewma_ms": None if st["latency_ewma"] is None else int(st["latency_ewma"] * 1000),
+                    "success_rate": round(st["success_ewma"], 3),
+                    "successes": st["successes"],
+                    "failures": st["failures"],
+                    "cooldown_remaining_s": max(0, int(st["cooldown_until"] - now)),
+                    "last_error": st["last_error"],
+                }
+                for engine, st in list(self._stats.items())
+            },
+        }
+
+
+ENGINE_SCOREBOARD = EngineScoreboard()
+
+
+def _runtime_gauges() -> List[Tuple[str, Dict[str, str], float]]:
+    """Gauge samples of engine health and HTTP limits for ``Metrics.render``."""
+    samples: List[Tuple[str, Dict[str, str], float]] = []
+    for engine, st in ENGINE_SCOREBOARD.snapshot()["engines"].items():
+        samples.append(("gabesearch_engine_success_rate", {"engine": engine}, st["success_rate"]))
+        samples.append(("gabesearch_engine_cooldown_seconds", {"engine": engine}, st["cooldown_remaining_s"]))
+        if st["latency_ewma_ms"] is not None:
+            samples.append(("gabesearch_engine_latency_seconds", {"engine": engine}, st["latency_ewma_ms"] / 1000))
+    pool = HTTP_POOL.stats()
+    samples.append(("gabesearch_http_limit", {"scope": "fetch"}, pool["fetch_limit"]))
+    samples.append(("gabesearch_http_limit", {"scope": "search"}, pool["search_limit"]))
+    for host, limit in pool["throttled_hosts"].items():
+        samples.append(("gabesearch_http_limit", {"scope": "host", "host": host}, limit))
+    samples.append(("gabesearch_fetches_in_flight", {}, pool["fetches_in_flight"]))
+    return samples
+
+
+async def _searx_engine(query: str, engine: str, k: int) -> Optional[List[Dict[str, Any]]]:
+    """Query a single engine; returns None (and records the failure) on a bad answer."""
+    params = {"q": query, "format": "json", "engines": engine}
+    headers = _random_headers()
+    start = time.monotonic()
+    try:
+        logging.debug(f"Searching '{query}' via {engine}")
+        async with HTTP_POOL.search_slot() as slot:
+            start = time.monotonic()
+            r = await HTTP_POOL.search_client().get(SEARX_URL, params=params, headers=headers, timeout=SEARX_TIMEOUT)
+            slot.record(r)
+        if r.status_code == 429:
+            # Our own instance's limiter, not the engine's fault
+            logging.warning(f"SearXNG rate-limited '{query}'; pausing searches")
+            return None
+        content_type = r.headers.get("content-type", "")
+        if "application/json" not in content_type:
+            logging.info(f"{engine} returned non-JSON for '{query}' (type={content_type})")
+            ENGINE_SCOREBOARD.record_failure(engine, time.monotonic() - start, "non_json", blocked=True)
+            return None
+
+        data = r.json()
+        if not data.get("results"):
+            logging.debug(f"{engine} yielded no results for '{query}'")
+            ENGINE_SCOREBOARD.record_failure(engine, time.monotonic() - start, "no_results")
+            return None
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.info(f"Error with engine {engine} for '{query}': {e!r}")
+        ENGINE_SCOREBOARD.record_failure(engine, time.monotonic() - start, type(e).__name__)
+        return None
+
+    ENGINE_SCOREBOARD.record_success(engine, time.monotonic() - start)
+    out = []
+    for item in data.get("results", [])[:k]:
+        out.append({
+            "title": item.get("title", "").strip(),
+            "url": item.get("url", "").strip(),
+            "snippet": item.get("content", "").strip(),
+            "engine": item.get("engine", engine),
+            "publishedDate": item.get("publishedDate", ""),
+            "domain": urlparse(item.get("url", "")).netloc,
+            "query": query,
+            "source_query": query,
+        })
+    return out
+
+
+def _open_cache_db(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class SearchCache:
+    """Query -> links cache in front of SearXNG.
+
+    Keys normalize case and whitespace and include the configured engine set.
+    Entries live for ``ttl`` seconds in memory and, when ``path`` is given, in
+    the SQLite cache database so they survive restarts.  Both hold at most
+    ``max_entries``: memory evicts least-recently-used first, and the table
+    is pruned of expired and oldest rows every ``PRUNE_EVERY`` stores.
+    Concurrent lookups for the same key and ``k`` share one upstream request.
+
+    The memory tier is only touched on the event loop; the executor only
+    runs the SQLite reads and writes, under ``_lock``.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, ttl: float, path: Optional[str] = None, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._mem: "OrderedDict[str, Tuple[float, int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._stores = 0
+
+    @staticmethod
+    def key(query: str, engines: Iterable[str]) -> str:
+        engine_set = ",".join(sorted({e.strip().lower() for e in engines if e.strip()}))
+        return f"{_normalize_query(query)}|{engine_set}"
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            conn = _open_cache_db(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_results ("
+                "key TEXT PRIMARY KEY, k INTEGER NOT NULL, links TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS search_results_stored_at ON search_results (stored_at)")
+            self._conn = conn
+            self._prune(conn)
+        return self._conn
+
+    def _read_row(self, key: str) -> Optional[Tuple[float, int, List[Dict[str, Any]]]]:
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT stored_at, k, links FROM search_results WHERE key = ?", (key,)
+            ).fetchone() if db is not None else None
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    async def _load(self, key: str) -> Optional[Tuple[float, int, List[Dict[str, Any]]]]:
+        entry = self._mem.get(key)
+        if entry is None and self.path is not None:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self._read_row, key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is not None and time.time() - entry[0] >= self.ttl:
+            self._mem.pop(key, None)
+            return None
+        if entry is not None and key in self._mem:
+            self._mem.move_to_end(key)
+        return entry
+
+    def _remember(self, key: str, entry: Tuple[float, int, List[Dict[str, Any]]]) -> None:
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM search_results WHERE stored_at < ?", (time.time() - self.ttl,))
+        db.execute(
+            "DELETE FROM search_results WHERE key NOT IN "
+            "(SELECT key FROM search_results ORDER BY stored_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        db.commit()
+
+    def _write_row(self, key: str, k: int, links: List[Dict[str, Any]], now: float) -> None:
+        with self._lock:
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?)", (key, k, json.dumps(links), now)
+                )
+                db.commit()
+                self._stores += 1
+                if self._stores % self.PRUNE_EVERY == 0:
+                    self._prune(db)
+
+    async def get_or_fetch(self, query: str, k: int, engines: List[str], fetch) -> List[Dict[str, Any]]:
+        key = self.key(query, engines)
+        loop = asyncio.get_running_loop()
+        entry = await self._load(key)
+        if entry is not None and entry[1] >= k:
+            self.hits += 1
+            METRICS.inc("gabesearch_cache_requests", cache="search", result="hit")
+            return [dict(item) for item in entry[2][:k]]
+
+        inflight = self._inflight.get((key, k))
+        if inflight is not None and inflight.get_loop() is loop:
+            self.coalesced += 1
+            METRICS.inc("gabesearch_cache_requests", cache="search", result="coalesced")
+        else:
+            self.misses += 1
+            METRICS.inc("gabesearch_cache_requests", cache="search", result="miss")
+            inflight = self._inflight[(key, k)] = asyncio.ensure_future(self._fetch_and_store(key, query, k, fetch))
+        self._waiters[inflight] = self._waiters.get(inflight, 0) + 1
+        try:
+            links = await asyncio.shield(inflight)
+        finally:
+            self._waiters[inflight] -= 1
+            # Only abandon the upstream request once nobody is waiting for it
+            if not self._waiters[inflight]:
+                del self._waiters[inflight]
+                if not inflight.done():
+                    inflight.cancel()
+        return [dict(item) for item in links[:k]]
+
+    async def _fetch_and_store(self, key: str, query: str, k: int, fetch) -> List[Dict[str, Any]]:
+        try:
+            links = await fetch(query, k)
+            if links:
+                now, stored = time.time(), [dict(item) for item in links]
+                self._remember(key, (now, k, stored))
+                if self.path is not None:
+                    await asyncio.get_running_loop().run_in_executor(None, self._write_row, key, k, stored, now)
+            return links
+        finally:
+            if self._inflight.get((key, k)) is asyncio.current_task():
+                del self._inflight[(key, k)]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._mem),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+SEARCH_CACHE: Optional[SearchCache] = (
+    SearchCache(SEARCH_CACHE_TTL, CACHE_DB_PATH if SEARCH_CACHE_PERSIST else None)
+    if SEARCH_CACHE_TTL > 0
+    else None
+)
+
+
 async def searx_top_links(query: str, k: int):
-    """Get search results with randomized headers and engine rotation."""
+    """Get search results, served from ``SEARCH_CACHE`` when possible."""
+    if SEARCH_CACHE is None:
+        return await _searx_hedged(query, k)
+    return await SEARCH_CACHE.get_or_fetch(query, k, SEARCH_ENGINES, _searx_hedged)
 
-    engines = SEARCH_ENGINES.copy()
-    random.shuffle(engines)
 
-    async with aiohttp.ClientSession() as s:
-        for engine in engines:
-            params = {"q": query, "format": "json", "engines": engine}
-            headers = _random_headers()
-            try:
-                print(f"DEBUG: Searching '{query}' via {engine}", flush=True)
-                async with s.get(SEARX_URL, params=params, headers=headers, timeout=15) as r:
-                    content_type = r.headers.get("content-type", "")
-                    if "application/json" not in content_type:
-                        print(f"DEBUG: {engine} returned non-JSON for '{query}' (type={content_type})", flush=True)
-                        continue
-
-                    data = await r.json()
-                    if not data.get("results"):
-                        print(f"DEBUG: {engine} yielded no results for '{query}'", flush=True)
-                        continue
-
-                    out = []
-                    for item in data.get("results", [])[:k]:
-                        out.append({
-                            "title": item.get("title", "").strip(),
-                            "url": item.get("url", "").strip(),
-                            "snippet": item.get("content", "").strip(),
-                            "engine": item.get("engine", engine),
-                            "publishedDate": item.get("publishedDate", ""),
-                            "domain": urlparse(item.get("url", "")).netloc,
-                            "query": query,
-                            "source_query": query,
-                        })
-                    return out
-            except Exception as e:
-                print(f"DEBUG: error with engine {engine} for '{query}': {e}", flush=True)
+async def _searx_hedged(query: str, k: int):
+    """Get search results from the healthiest engines, hedging slow ones.
+
+    Engines are tried in ``ENGINE_SCOREBOARD`` order.  If the in-flight
+    request has not answered within the hedge delay, the next engine is fired
+    in parallel; a failed answer immediately launches a replacement.  The
+    first good answer wins and the rest are cancelled.
+    """
+    order = ENGINE_SCOREBOARD.ranked(SEARCH_ENGINES)
+    pending: set = set()
+
+    def launch(hedge: bool = False) -> bool:
+        # Cooling-down engines are a last resort after failures, never a hedge
+        if not order or (hedge and ENGINE_SCOREBOARD.cooling(order[0])):
+            return False
+        pending.add(asyncio.create_task(_searx_engine(query, order.pop(0), k)))
+        return True
+
+    launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=ENGINE_SCOREBOARD.hedge_delay(), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if launch(hedge=True):
+                    logging.debug(f"Hedging '{query}' with another engine")
+                else:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
                 continue
+            for task in done:
+                pending.discard(task)
+                results = task.result()
+                if results:
+                    return results
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
     return []
 
+
+class ExtractionTimeout(Exception):
+    """Raised inside an extraction worker when a document exceeds its CPU budget."""
+
+
+def _parse_html(html: str):
+    """Parse HTML into a single lxml tree, or return None for empty/invalid input."""
+    if not html or not html.strip():
+        return None
+    try:
+        parser = lxml.html.HTMLParser(encoding="utf-8")
+        return lxml.html.document_fromstring(html.encode("utf-8", "replace"), parser=parser)
+    except Exception:
+        return None
+
+
+def _metadata_from_tree(tree) -> Dict[str, str]:
+    meta_author = ""
+    meta_date = ""
+    meta_description = ""
+
+    # Try various meta tag formats
+    for meta in tree.iter("meta"):
+        name = (meta.get("name") or "").lower()
+        property_attr = (meta.get("property") or "").lower()
+        content = meta.get("content") or ""
+
+        if name in ["author"] or property_attr in ["article:author"]:
+            meta_author = content
+        elif name in ["date", "publish-date"] or property_attr in ["article:published_time"]:
+            meta_date = content
+        elif name in ["description"] or property_attr in ["og:description"]:
+            meta_description = content
+
+    title = tree.find(".//title")
+    page_title = title.text_content().strip() if title is not None else ""
+
+    return {
+        "page_title": page_title,
+        "meta_author": meta_author,
+        "meta_date": meta_date,
+        "meta_description": meta_description,
+    }
+
+
+def _visible_text(tree) -> str:
+    texts = tree.xpath("//body//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]")
+    if not texts:
+        texts = tree.xpath("//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]")
+    return " ".join(t.strip() for t in texts if t.strip())
+
+
 def extract_page_metadata(html: str, url: str):
     """Extract metadata from HTML"""
+    tree = _parse_html(html)
+    if tree is None:
+        return {}
     try:
-        soup = BeautifulSoup(html, "lxml")
-        
-        # Extract meta tags
-        meta_author = ""
-        meta_date = ""
-        meta_description = ""
-        
-        # Try various meta tag formats
-        for meta in soup.find_all("meta"):
-            name = meta.get("name", "").lower()
-            property_attr = meta.get("property", "").lower()
-            content = meta.get("content", "")
-            
-            if name in ["author"] or property_attr in ["article:author"]:
-                meta_author = content
-            elif name in ["date", "publish-date"] or property_attr in ["article:published_time"]:
-                meta_date = content
-            elif name in ["description"] or property_attr in ["og:description"]:
-                meta_description = content
-        
-        # Try to extract title
-        title_tag = soup.find("title")
-        page_title = title_tag.text.strip() if title_tag else ""
-        
-        return {
-            "page_title": page_title,
-            "meta_author": meta_author,
-            "meta_date": meta_date,
-            "meta_description": meta_description,
-        }
+        return _metadata_from_tree(tree)
     except Exception:
         return {}
 
+
 def clean_html_with_metadata(html: str, url: str):
-    """Extract text and metadata"""
+    """Extract text and metadata from one shared lxml parse of the document."""
+    tree = _parse_html(html)
+    if tree is None:
+        return "", {}
+    try:
+        metadata = _metadata_from_tree(tree)
+    except Exception:
+        metadata = {}
     try:
         import trafilatura
+        # trafilatura works on its own copy of the tree, so ``tree`` stays usable
         txt = trafilatura.extract(
-            html, 
-            include_comments=False, 
+            tree,
+            url=url,
+            include_comments=False,
             include_tables=False,
             output_format="txt"
         )
-        if txt and len(txt) > 200:
-            clean_text = txt
-        else:
-            soup = BeautifulSoup(html, "lxml")
-            clean_text = soup.get_text(separator=" ", strip=True)
+        clean_text = txt if txt and len(txt) > 200 else _visible_text(tree)
+    except ExtractionTimeout:
+        raise
     except Exception:
-        soup = BeautifulSoup(html, "lxml")
-        clean_text = soup.get_text(separator=" ", strip=True)
-    
-    metadata = extract_page_metadata(html, url)
+        clean_text = _visible_text(tree)
     return clean_text, metadata
 
+
+def _on_cpu_limit(signum, frame):
+    raise ExtractionTimeout()
+
+
+def _extract_worker_init() -> None:
+    if hasattr(signal, "setitimer"):
+        signal.signal(signal.SIGPROF, _on_cpu_limit)
+    try:
+        import trafilatura  # noqa: F401  warm the import once per worker
+    except Exception:
+        pass
+
+
+def _extract_in_worker(html: str, url: str, cpu_seconds: float):
+    """Process-pool entry point: extract one page under a CPU-time cap."""
+    capped = cpu_seconds > 0 and hasattr(signal, "setitimer")
+    if capped:
+        signal.setitimer(signal.ITIMER_PROF, cpu_seconds)
+    try:
+        return clean_html_with_metadata(html, url)
+    except ExtractionTimeout:
+        return "", {"extract_error": "cpu_limit"}
+    finally:
+        if capped:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+def _process_pool(max_workers: int, initializer=None) -> ProcessPoolExecutor:
+    """A process pool whose workers start clean instead of forking this process.
+
+    By the time a pool is needed the embedder, HTTP and SQLite threads are
+    running; forking them copies their memory and can inherit held locks.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context(method), initializer=initializer
+    )
+
+
+_extract_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_extract_pool() -> Optional[ProcessPoolExecutor]:
+    global _extract_pool
+    if EXTRACT_WORKERS <= 0:
+        return None
+    if _extract_pool is None:
+        _extract_pool = _process_pool(EXTRACT_WORKERS, initializer=_extract_worker_init)
+    return _extract_pool
+
+
+def _shutdown_extract_pool() -> None:
+    global _extract_pool
+    if _extract_pool is not None:
+        _extract_pool.shutdown(wait=False, cancel_futures=True)
+        _extract_pool = None
+
+
+def _recycle_extract_pool(pool: ProcessPoolExecutor) -> None:
+    """Kill ``pool``'s workers and let the next extraction start a new pool.
+
+    A worker stuck past the wall-clock timeout (in C code the CPU timer
+    cannot interrupt) would otherwise hold its slot for good.  Extractions
+    still running on ``pool`` fail with ``BrokenProcessPool`` and come back
+    empty.
+    """
+    global _extract_pool
+    if _extract_pool is pool:
+        _extract_pool = None
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def extract_page(html: str, url: str):
+    """Run ``clean_html_with_metadata`` off the event loop.
+
+    Uses the ``EXTRACT_WORKERS`` process pool when enabled (with a per-document
+    CPU cap of ``EXTRACT_CPU_SECONDS``), otherwise the default thread pool.
+    Past the wall-clock timeout the pool is recycled, since its worker may
+    still be busy; a thread cannot be stopped and is left to finish.
+    """
+    global _extract_pool
+    loop = asyncio.get_running_loop()
+    pool = _get_extract_pool()
+    wall_timeout = EXTRACT_CPU_SECONDS * 3 if EXTRACT_CPU_SECONDS > 0 else None
+    try:
+        with span("extract"):
+            if pool is None:
+                fut = loop.run_in_executor(None, clean_html_with_metadata, html, url)
+            else:
+                fut = loop.run_in_executor(pool, _extract_in_worker, html, url, EXTRACT_CPU_SECONDS)
+            return await asyncio.wait_for(fut, wall_timeout)
+    except asyncio.TimeoutError:
+        if pool is None:
+            logging.warning(f"Extraction timed out for {url}")
+        else:
+            logging.warning(f"Extraction timed out for {url}; restarting pool")
+            _recycle_extract_pool(pool)
+    except BrokenProcessPool:
+        logging.warning(f"Extraction worker died on {url}; restarting pool")
+        _extract_pool = None
+    return "", {}
+
+
+class PageStore:
+    """SQLite-backed store of cleaned pages keyed by canonical URL.
+
+    Each row keeps the extracted text and metadata together with the
+    ``ETag``/``Last-Modified`` validators so stale pages can be revalidated
+    with a conditional GET instead of being downloaded and parsed again, and
+    a hash of the text so a full re-download can tell it did not change.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = _open_cache_db(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL, "
+                "etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, content_hash TEXT)"
+            )
+            columns = {info[1] for info in conn.execute("PRAGMA table_info(pages)")}
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE pages ADD COLUMN content_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT text, metadata, etag, last_modified, fetched_at, content_hash FROM pages WHERE url = ?",
+                (_canonical_url(url),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "text": row[0],
+            "metadata": json.loads(row[1]),
+            "etag": row[2],
+            "last_modified": row[3],
+            "fetched_at": row[4],
+            "content_hash": row[5],
+        }
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def put(self, url: str, text: str, metadata: Dict[str, Any], etag: str = "", last_modified: str = "") -> None:
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _canonical_url(url), text, json.dumps(metadata), etag, last_modified, time.time(),
+                    self.content_hash(text),
+                ),
+            )
+            conn.commit()
+
+    def touch(self, url: str) -> None:
+        with self._lock:
+            conn = self._db()
+            conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), _canonical_url(url)))
+            conn.commit()
+
+    def prune(self, max_age_days: float = PAGE_CACHE_MAX_AGE_DAYS, max_pages: int = PAGE_CACHE_MAX_PAGES) -> int:
+        """Drop pages older than ``max_age_days`` and the oldest beyond ``max_pages``."""
+        with self._lock:
+            conn = self._db()
+            removed = 0
+            if max_age_days > 0:
+                removed += conn.execute(
+                    "DELETE FROM pages WHERE fetched_at < ?", (time.time() - max_age_days * 86400,)
+                ).rowcount
+            if max_pages > 0:
+                removed += conn.execute(
+                    "DELETE FROM pages WHERE url NOT IN (SELECT url FROM pages ORDER BY fetched_at DESC LIMIT ?)",
+                    (max_pages,),
+                ).rowcount
+            conn.commit()
+            return removed
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+PAGE_STORE: Optional[PageStore] = PageStore(CACHE_DB_PATH) if PAGE_CACHE_ENABLED else None
+
+
 async def fetch_page_with_metadata(url: str, client: httpx.AsyncClient):
-    """Fetch page and extract text + metadata"""
+    """Fetch page and extract text + metadata.
+
+    Pages younger than ``WEB_CACHE_TTL_DAYS`` are served from ``PAGE_STORE``
+    without touching the network; older ones are revalidated with a
+    conditional GET and reused as-is on ``304 Not Modified``.  The returned
+    ``page_cache`` is ``hit``, ``revalidated``, ``unchanged`` (downloaded
+    again, same text) or ``miss``; see ``UNCHANGED_PAGES``.
+    """
+    loop = asyncio.get_running_loop()
+    cached = None
+    if PAGE_STORE is not None:
+        try:
+            cached = await loop.run_in_executor(None, PAGE_STORE.get, url)
+        except Exception as e:
+            logging.warning(f"Page cache read failed for {url}: {e!r}")
+
+    headers = {}
+    if cached:
+        if time.time() - cached["fetched_at"] < WEB_CACHE_TTL_DAYS * 86400:
+            METRICS.inc("gabesearch_cache_requests", cache="page", result="hit")
+            return cached["text"][:PER_PAGE_CHARS], {**cached["metadata"], "page_cache": "hit"}
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    if PAGE_STORE is not None:
+        METRICS.inc("gabesearch_cache_requests", cache="page", result="stale" if cached else "miss")
     try:
-        r = await client.get(url, timeout=8, follow_redirects=True)
+        with span("fetch"):
+            for attempt in range(2):
+                async with HTTP_POOL.host_slot(url) as slot:
+                    r = await client.get(url, headers=headers, timeout=8, follow_redirects=True)
+                    slot.record(r)
+                # One retry when the host asks for a short Retry-After pause
+                if attempt or slot.retry_after is None or slot.retry_after > FETCH_RETRY_AFTER_MAX_S:
+                    break
+        METRICS.inc("gabesearch_fetches", outcome=f"{r.status_code // 100}xx" if r.status_code != 304 else "304")
+        METRICS.inc("gabesearch_fetch_bytes", len(r.content))
+        if r.status_code == 304 and cached:
+            await loop.run_in_executor(None, PAGE_STORE.touch, url)
+            return cached["text"][:PER_PAGE_CHARS], {**cached["metadata"], "page_cache": "revalidated"}
         if 200 <= r.status_code < 300:
-            clean_text, page_meta = clean_html_with_metadata(r.text, url)
+            clean_text, page_meta = await extract_page(r.text, url)
             
             # Combine response metadata
             metadata = {
@@ -497,79 +3495,401 @@ async def fetch_page_with_metadata(url: str, client: httpx.AsyncClient):
                 "fetch_timestamp": datetime.now().isoformat(),
                 **page_meta
             }
-            
-            return clean_text[:PER_PAGE_CHARS], metadata
+
+            page_cache = "miss"
+            if cached and cached.get("content_hash") == PageStore.content_hash(clean_text):
+                page_cache = "unchanged"
+            if PAGE_STORE is not None and clean_text:
+                try:
+                    await loop.run_in_executor(
+                        None,
+                        lambda: PAGE_STORE.put(
+                            url,
+                            clean_text,
+                            metadata,
+                            r.headers.get("etag", ""),
+                            r.headers.get("last-modified", ""),
+                        ),
+                    )
+                except Exception as e:
+                    logging.warning(f"Page cache write failed for {url}: {e!r}")
+
+            return clean_text[:PER_PAGE_CHARS], {**metadata, "page_cache": page_cache}
     except Exception as e:
-        print(f"Fetch error for {url}: {e}", flush=True)
+        METRICS.inc("gabesearch_fetches", outcome="error")
+        logging.info(f"Fetch error for {url}: {e!r}")
     
     return "", {}
 
-async def bulk_retrieve(queries: List[str], claim: Optional[str] = None):
-    print(f"DEBUG: Using {len(queries)} queries: {queries}", flush=True)
-    
-    # Search all queries in parallel
-    search_tasks = [searx_top_links(q, TOP_K) for q in queries]
-    search_results = await asyncio.gather(*search_tasks)
-    
-    # Flatten results but keep query association
-    flat_links = []
-    for q, results in zip(queries, search_results):
-        print(f"DEBUG: Query '{q}' returned {len(results)} results", flush=True)
+# Pages whose text is what was embedded last time; only their missing chunks
+# (expired or evicted since) are embedded again
+UNCHANGED_PAGES = frozenset({"hit", "revalidated", "unchanged"})
+
+
+class Deadline:
+    """Monotonic end-to-end time budget shared by the stages of one tool call."""
+
+    def __init__(self, budget_ms: Optional[float]):
+        self.budget_ms = budget_ms if budget_ms and budget_ms > 0 else None
+        self.expires_at = time.monotonic() + self.budget_ms / 1000 if self.budget_ms else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None for an unlimited budget."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def reserve(self, reserve_ms: float) -> "Deadline":
+        """A deadline that expires ``reserve_ms`` (at most a quarter of the budget) earlier."""
+        child = Deadline(None)
+        if self.expires_at is not None:
+            reserve_s = min(reserve_ms, self.budget_ms / 4) / 1000
+            child.budget_ms = self.budget_ms
+            child.expires_at = self.expires_at - reserve_s
+        return child
+
+
+_PIPELINE_DONE = object()
+
+
+async def bulk_retrieve(
+    queries: List[str], claim: Optional[str] = None, deadline: Optional[Deadline] = None
+):
+    """Search, fetch, chunk, embed and upsert as one streaming pipeline.
+
+    Links are queued for fetching as soon as each query's search returns,
+    pages are extracted and chunked as they land, and chunks are embedded and
+    upserted in micro-batches of up to ``EMBED_MAX_BATCH`` while fetching
+    continues.  Queue depths bound memory between the stages.
+
+    When ``deadline`` expires, outstanding work is cancelled; everything
+    already upserted stays retrievable and ``truncated_stages`` lists the
+    stages that still had work pending.
+    """
+    logging.debug(f"Using {len(queries)} queries: {queries}")
+    loop = asyncio.get_running_loop()
+    link_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_FETCH_QUEUE)
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_EMBED_QUEUE)
+    sources: List[Dict[str, Any]] = []
+    seen_urls: set[str] = set()
+    counts = {"searches": 0, "links": 0, "queued": 0, "fetched": 0, "chunks": 0, "upserted": 0, "reused": 0}
+
+    async def search(q: str):
+        with span("search"):
+            results = await searx_top_links(q, TOP_K)
+        counts["searches"] += 1
+        logging.debug(f"Query '{q}' returned {len(results)} results")
         for item in results:
             item["source_query"] = q
-            flat_links.append(item)
-    
-    print(f"DEBUG: Total {len(flat_links)} links to fetch", flush=True)
-    
-    # Fetch all pages in parallel
-    sources = []
-    to_upsert: List[Dict[str, Any]] = []
-    
-    if flat_links:
-        async with httpx.AsyncClient(headers={"User-Agent": "GabeSearch-mcp/0.1"}) as client:
-            tasks = [fetch_page_with_metadata(item["url"], client) for item in flat_links]
-            pages = await asyncio.gather(*tasks)
-            
-            for item, (text, fetch_metadata) in zip(flat_links, pages):
-                if text:
-                    # Create rich source metadata for citations
-                    source = {
-                        "id": len(sources) + 1,
-                        "title": item.get("title") or fetch_metadata.get("page_title", "Untitled"),
-                        "url": item["url"],
-                        "domain": item["domain"],
-                        "snippet": item["snippet"],
-                        "source_query": item.get("source_query", ""),
-                        "search_engine": item["engine"],
-                        "author": fetch_metadata.get("meta_author", ""),
-                        "publish_date": fetch_metadata.get("meta_date", ""),
-                        "fetch_timestamp": fetch_metadata.get("fetch_timestamp", ""),
-                        "content_type": fetch_metadata.get("content_type", ""),
-                        "word_count": len(text.split()),
-                        "status": "successfully_fetched"
-                    }
-                    sources.append(source)
-                    to_upsert.append({"text": text, "metadata": source})
-
-    if to_upsert:
-        try:
-            await _upsert_texts(to_upsert)
-        except Exception as e:
-            print(f"Batch upsert failed: {e}", flush=True)
+            counts["links"] += 1
+            canonical = _canonical_url(item["url"])
+            if canonical in seen_urls:
+                continue
+            seen_urls.add(canonical)
+            counts["queued"] += 1
+            await link_queue.put(item)
+
+    async def fetch_worker():
+        client = HTTP_POOL.page_client()
+        while True:
+            item = await link_queue.get()
+            if item is _PIPELINE_DONE:
+                return
+            text, fetch_metadata = await fetch_page_with_metadata(item["url"], client)
+            counts["fetched"] += 1
+            if not text:
+                continue
+            # Create rich source metadata for citations
+            source = {
+                "id": len(sources) + 1,
+                "title": item.get("title") or fetch_metadata.get("page_title", "Untitled"),
+                "url": item["url"],
+                "domain": item["domain"],
+                "snippet": item["snippet"],
+                "source_query": item.get("source_query", ""),
+                "search_engine": item["engine"],
+                "author": fetch_metadata.get("meta_author", ""),
+                "publish_date": fetch_metadata.get("meta_date", ""),
+                "fetch_timestamp": fetch_metadata.get("fetch_timestamp", ""),
+                "content_type": fetch_metadata.get("content_type", ""),
+                "word_count": len(text.split()),
+                "page_cache": fetch_metadata.get("page_cache", ""),
+                "status": "successfully_fetched"
+            }
+            sources.append(source)
+            docs = _chunk_documents([{"text": text, "metadata": source}])
+            if source["page_cache"] in UNCHANGED_PAGES and _vector_store is not None:
+                try:
+                    stored = await loop.run_in_executor(None, _vector_store.existing, [d["id"] for d in docs])
+                except Exception as e:
+                    logging.warning(f"Checking stored chunks of {item['url']} failed: {e!r}")
+                    stored = set()
+                counts["reused"] += len(stored)
+                docs = [d for d in docs if d["id"] not in stored]
+            for doc in docs:
+                counts["chunks"] += 1
+                await chunk_queue.put(doc)
+
+    async def embed_worker():
+        done = False
+        while not done:
+            batch: List[Dict[str, Any]] = []
+            doc = await chunk_queue.get()
+            if doc is _PIPELINE_DONE:
+                return
+            batch.append(doc)
+            # Top the batch up for the embedder's coalescing window so each
+            # upsert carries a full batch
+            window_end = loop.time() + EMBED_MAX_WAIT_MS / 1000
+            while len(batch) < EMBED_MAX_BATCH:
+                try:
+                    doc = await asyncio.wait_for(chunk_queue.get(), max(0.0, window_end - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if doc is _PIPELINE_DONE:
+                    done = True
+                    break
+                batch.append(doc)
+            try:
+                await _upsert_texts(batch)
+                counts["upserted"] += len(batch)
+            except Exception as e:
+                logging.warning(f"Batch upsert failed: {e!r}")
+
+    n_fetchers = max(1, min(PIPELINE_FETCH_WORKERS, len(queries) * TOP_K))
+    embedder = asyncio.create_task(embed_worker())
+    fetchers = [asyncio.create_task(fetch_worker()) for _ in range(n_fetchers)]
+
+    async def run():
+        await asyncio.gather(*(search(q) for q in queries))
+        for _ in fetchers:
+            await link_queue.put(_PIPELINE_DONE)
+        await asyncio.gather(*fetchers)
+        await chunk_queue.put(_PIPELINE_DONE)
+        await embedder
 
-    print(f"DEBUG: Successfully fetched {len(sources)} sources", flush=True)
+    truncated: List[str] = []
+    try:
+        await asyncio.wait_for(run(), deadline.remaining() if deadline else None)
+    except asyncio.TimeoutError:
+        if counts["searches"] < len(queries):
+            truncated.append("search")
+        if counts["fetched"] < counts["queued"]:
+            truncated.append("fetch")
+        if counts["upserted"] < counts["chunks"]:
+            truncated.append("embed")
+        logging.info(f"bulk_retrieve deadline hit; cut short: {truncated}")
+    finally:
+        for task in (*fetchers, embedder):
+            task.cancel()
+
+    logging.info(
+        f"Fetched {len(sources)} sources from {counts['links']} links, "
+        f"upserted {counts['upserted']}/{counts['chunks']} chunks, reused {counts['reused']}",
+        extra=counts,
+    )
+    if _embedder is not None:
+        logging.debug(f"Embedding service {_embedder.stats()}")
 
     return {
         "queries": queries,
         "claim": claim,
         "sources": sources,
         "source_count": len(sources),
-        "total_results_found": len(flat_links),
+        "total_results_found": counts["links"],
+        "chunks_upserted": counts["upserted"],
+        "truncated_stages": truncated,
         "retrieval_timestamp": datetime.now().isoformat(),
     }
 
 
-@server.call_tool()
+RESPONSE_FORMATS = ("json", "compact", "text", "legacy")
+
+
+def _legacy_chunk(m: Dict[str, Any]) -> Dict[str, Any]:
+    meta = m.get("metadata", {})
+    return {
+        "text": m["text"],
+        "title": meta.get("title", ""),
+        "url": meta.get("url", ""),
+        "domain": meta.get("domain", ""),
+        "score": m.get("score", 0),
+        "confidence": m.get("confidence", m.get("score", 0)),
+    }
+
+
+def _render_legacy(header: Dict[str, Any], matches: List[Dict[str, Any]]) -> str:
+    chunks = [_legacy_chunk(m) for m in matches]
+    body = {"query": header.get("query", ""), "chunks": chunks, "total_chunks": len(chunks), **header}
+    return json.dumps(body, indent=2)
+
+
+def _render_response(header: Dict[str, Any], sources: List[Dict[str, Any]], fmt: str) -> str:
+    if fmt == "text":
+        flags = " ".join(
+            f"{k}={json.dumps(v, separators=(',', ':'))}" for k, v in header.items() if k != "query" and v not in (None, False, [], {})
+        )
+        lines = [f"Results for: {header.get('query', '')}" + (f" ({flags})" if flags else "")]
+        for src in sources:
+            lines.append(f"[{src['id']}] {src['title'] or src['domain']} <{src['url']}>")
+            lines.extend(f"- {c['text']}" for c in src["chunks"])
+        return "\n".join(lines)
+    body = {**header, "sources": sources}
+    if fmt == "json":
+        return json.dumps(body, indent=2)
+    return json.dumps(body, separators=(",", ":"))
+
+
+def pack_response(
+    header: Dict[str, Any],
+    matches: List[Dict[str, Any]],
+    budget_chars: int = TOTAL_CHARS,
+    fmt: str = RESPONSE_FORMAT,
+) -> str:
+    """Render a tool response that fits ``budget_chars``.
+
+    Matches are taken in confidence order and grouped under one entry per
+    source URL (numbered for citation), so title, url and domain appear once
+    per source instead of once per chunk.  Chunks that would overflow the
+    budget are skipped in favour of smaller, lower-ranked ones.  The header
+    gains a ``packing`` entry with the estimated tokens saved against the
+    old one-object-per-chunk indented JSON.
+
+    ``fmt="legacy"`` renders that old layout instead, in the given order and
+    without a ``packing`` entry, dropping the lowest-ranked chunks until it
+    fits.
+    """
+    if fmt not in RESPONSE_FORMATS:
+        fmt = "compact"
+    if budget_chars <= 0:
+        budget_chars = sys.maxsize
+    confidence = lambda m: m.get("confidence", m.get("score", 0))
+    if fmt == "legacy":
+        kept = list(matches)
+        text = _render_legacy(header, kept)
+        while len(text) > budget_chars and kept:
+            kept.remove(min(kept, key=confidence))
+            text = _render_legacy(header, kept)
+        return text
+    ranked = sorted(matches, key=confidence, reverse=True)
+    legacy_chars = len(_render_legacy(header, ranked))
+    packing = {"chunks": len(ranked), "packed": 0, "chars": 0, "tokens_est": 0, "tokens_saved_est": 0}
+    header = {**header, "packing": packing}
+
+    sources: List[Dict[str, Any]] = []
+    by_url: Dict[str, Dict[str, Any]] = {}
+    used = len(_render_response(header, [], fmt))
+    for m in ranked:
+        meta = m.get("metadata", {})
+        url = meta.get("url", "")
+        chunk = {"text": m["text"], "confidence": round(float(confidence(m)), 3)}
+        src = by_url.get(url)
+        new_src = src is None
+        if new_src:
+            src = {
+                "id": len(sources) + 1,
+                "title": meta.get("title", ""),
+                "url": url,
+                "domain": meta.get("domain", ""),
+                "chunks": [],
+            }
+        # Growth from rendering this chunk (and, for a new source, its entry)
+        before = [] if new_src else [{**src, "chunks": []}]
+        cost = len(_render_response({}, [{**src, "chunks": [chunk]}], fmt)) - len(_render_response({}, before, fmt))
+        if used + cost > budget_chars:
+            continue
+        used += cost
+        src["chunks"].append(chunk)
+        if new_src:
+            by_url[url] = src
+            sources.append(src)
+
+    # The per-piece estimates ignore separators and the growing packing
+    # numbers; drop the lowest-ranked chunks until the real text fits.  The
+    # packing numbers describe the text they are rendered into, so once it
+    # fits, re-render until ``chars`` settles.  A digit flip in the numbers
+    # can keep it one character off forever, hence the cap on those passes
+    chars, settle = used, 2
+    while True:
+        packing["packed"] = sum(len(src["chunks"]) for src in sources)
+        packing["chars"] = chars
+        packing["tokens_est"] = int(chars / CHARS_PER_TOKEN)
+        packing["tokens_saved_est"] = max(0, int((legacy_chars - chars) / CHARS_PER_TOKEN))
+        text = _render_response(header, sources, fmt)
+        fits = len(text) <= budget_chars or not sources
+        if fits and (len(text) == chars or not settle):
+            break
+        chars = len(text)
+        if fits:
+            settle -= 1
+            continue
+        worst = min(sources, key=lambda src: src["chunks"][-1]["confidence"])
+        worst["chunks"].pop()
+        if not worst["chunks"]:
+            sources.remove(worst)
+            for i, src in enumerate(sources, 1):
+                src["id"] = i
+    METRICS.inc("gabesearch_response_tokens_saved", packing["tokens_saved_est"])
+    return text
+
+
+def _packing_options(arguments: dict) -> Tuple[int, str]:
+    """``(budget_chars, fmt)`` from the call's ``max_chars``/``max_tokens``/``format``."""
+    budget = TOTAL_CHARS
+    try:
+        # Per-call limits only narrow the budget (TOTAL_CHARS <= 0 means none)
+        limits = []
+        if arguments.get("max_chars"):
+            limits.append(int(arguments["max_chars"]))
+        if arguments.get("max_tokens"):
+            limits.append(int(float(arguments["max_tokens"]) * CHARS_PER_TOKEN))
+        if limits:
+            budget = min(limits) if budget <= 0 else min(budget, *limits)
+    except (TypeError, ValueError):
+        pass
+    return budget, str(arguments.get("format", RESPONSE_FORMAT)).lower()
+
+
+class ToolCall:
+    """Scope of one tool call: call metrics, a log line and, when traced, spans.
+
+    Tracing is requested per call with ``"trace": true`` (default
+    ``TRACE_RESPONSES``); the handler then adds ``breakdown()`` to its
+    response as ``timings_ms``.
+    """
+
+    def __init__(self, tool: str, arguments: dict):
+        self.tool = tool
+        self.timings: Optional[Dict[str, float]] = {} if arguments.get("trace", TRACE_RESPONSES) else None
+
+    def __enter__(self) -> "ToolCall":
+        self.started = time.perf_counter()
+        self._token = _STAGE_TIMINGS.set(self.timings)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _STAGE_TIMINGS.reset(self._token)
+        self.elapsed = time.perf_counter() - self.started
+        outcome = "ok" if exc_type is None else "error"
+        METRICS.inc("gabesearch_tool_calls", tool=self.tool, outcome=outcome)
+        METRICS.observe("gabesearch_tool_seconds", self.elapsed, tool=self.tool)
+        extra = {"tool": self.tool, "outcome": outcome, "duration_ms": round(self.elapsed * 1000, 1)}
+        if self.timings is not None:
+            extra["timings_ms"] = self.breakdown()
+        logging.info(f"{self.tool} {outcome} in {extra['duration_ms']} ms", extra=extra)
+        return False
+
+    def breakdown(self) -> Dict[str, float]:
+        """Milliseconds per stage, plus ``total`` wall time so far."""
+        total = getattr(self, "elapsed", None) or time.perf_counter() - self.started
+        out = {stage: round(seconds * 1000, 1) for stage, seconds in (self.timings or {}).items()}
+        out["total"] = round(total * 1000, 1)
+        return out
+
+
 async def search_and_retrieve(name: str, arguments: dict):
     if name != "search_and_retrieve":
         raise ValueError(f"Unknown tool: {name}")
@@ -581,48 +3901,109 @@ async def search_and_retrieve(name: str, arguments: dict):
         }
         return [TextContent(type="text", text=json.dumps(err, indent=2))]
 
-    prompt = arguments["prompt"][:200]
-    queries = generate_search_queries(prompt)
+    with ToolCall("search_and_retrieve", arguments) as call:
+        header, matches = await _search_and_retrieve(arguments["prompt"][:200], arguments)
+        if call.timings is not None:
+            header["timings_ms"] = call.breakdown()
+        text = pack_response(header, matches, *_packing_options(arguments))
+    return [TextContent(type="text", text=text)]
+
+
+async def _embed_prompt(prompt: str, deadline: Optional[Deadline] = None) -> Optional[np.ndarray]:
+    """The prompt's embedding for the semantic cache, or ``None``.
+
+    ``None`` also while the model is still warming up: the lookup must not
+    hold a cold call back until startup finishes; ``bulk_retrieve`` waits
+    for it in parallel with the searches instead.  Likewise when a busy
+    embedder does not answer within ``deadline``.
+    """
+    if _embedder is None or (deadline is not None and deadline.expired()):
+        return None
+    try:
+        with span("embed"):
+            vectors = await asyncio.wait_for(_embedder.encode([prompt]), deadline.remaining() if deadline else None)
+        return vectors[0]
+    except asyncio.TimeoutError:
+        logging.info("Embedding prompt for the semantic cache hit the deadline")
+        return None
+    except Exception as e:
+        logging.warning(f"Embedding prompt for the semantic cache failed: {e!r}")
+        return None
+
+
+async def _search_and_retrieve(prompt: str, arguments: dict) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Ingest fresh search results for ``prompt``, then retrieve and dedup chunks.
 
+    Returns the response header and the matches for ``pack_response``.
+    A prompt close enough to one answered recently is served from
+    ``SEMANTIC_CACHE`` unless the call asks for ``"fresh": true``.  Before
+    the embedder is ready there is no lookup, but the answer is still cached.
+    """
+    # The budget starts before the first await, so the prompt embedding
+    # counts against it like every later stage
     start = time.time()
+    try:
+        deadline = Deadline(float(arguments.get("deadline_ms", DEADLINE_MS)))
+    except (TypeError, ValueError):
+        deadline = Deadline(DEADLINE_MS)
+    truncated: List[str] = []
+
+    prompt_vector = await _embed_prompt(prompt, deadline) if SEMANTIC_CACHE is not None else None
+    if prompt_vector is not None and not arguments.get("fresh"):
+        hit = SEMANTIC_CACHE.get(prompt, prompt_vector, CHUNKS_PER_QUERY * 2)
+        if hit is not None:
+            matches, info = hit
+            logging.debug(f"Semantic cache hit for '{prompt}': {info}")
+            header = {
+                "query": prompt,
+                "processing_time_ms": int((time.time() - start) * 1000),
+                "deadline_ms": deadline.budget_ms,
+                "partial": False,
+                "truncated_stages": truncated,
+                "semantic_cache": info,
+            }
+            return header, matches
+
+    queries = generate_search_queries(prompt)
 
     try:
-        await bulk_retrieve(queries)
+        retrieval = await bulk_retrieve(queries, deadline=deadline.reserve(DEADLINE_RETRIEVAL_RESERVE_MS))
+        truncated.extend(retrieval.get("truncated_stages", []))
     except Exception as e:
-        print(f"bulk_retrieve failed: {e}", flush=True)
+        logging.warning(f"bulk_retrieve failed: {e!r}")
 
     all_matches: List[Dict[str, Any]] = []
-    for q in queries:
-        try:
-            all_matches.extend(await _smart_rag_search(q, CHUNKS_PER_QUERY))
-        except Exception as e:
-            print(f"RAG search failed for {q}: {e}", flush=True)
-
-    final_matches = _deduplicate_chunks(all_matches, CHUNKS_PER_QUERY * 2)
-
-    chunks = [
-        {
-            "text": m["text"],
-            "title": m.get("metadata", {}).get("title", ""),
-            "url": m.get("metadata", {}).get("url", ""),
-            "domain": m.get("metadata", {}).get("domain", ""),
-            "score": m.get("score", 0),
-            "confidence": m.get("confidence", m.get("score", 0)),
-        }
-        for m in final_matches
-    ]
+    try:
+        per_query = await asyncio.wait_for(
+            _smart_rag_search_many(queries, CHUNKS_PER_QUERY), deadline.remaining()
+        )
+        for matches in per_query:
+            all_matches.extend(matches)
+    except asyncio.TimeoutError:
+        truncated.append("retrieve")
+        logging.info(f"RAG search for {queries} hit the deadline")
+    except Exception as e:
+        logging.warning(f"RAG search failed for {queries}: {e!r}")
+
+    with span("dedup"):
+        final_matches = _deduplicate_chunks(all_matches, CHUNKS_PER_QUERY * 2)
+    # Partial answers are not cached, so a repeat gets another full try
+    if SEMANTIC_CACHE is not None and final_matches and not truncated:
+        if prompt_vector is None:
+            prompt_vector = await _embed_prompt(prompt, deadline)
+        if prompt_vector is not None:
+            SEMANTIC_CACHE.put(prompt, prompt_vector, final_matches)
 
-    result = {
+    header = {
         "query": prompt,
-        "chunks": chunks,
-        "total_chunks": len(chunks),
         "processing_time_ms": int((time.time() - start) * 1000),
+        "deadline_ms": deadline.budget_ms,
+        "partial": bool(truncated),
+        "truncated_stages": truncated,
     }
+    return header, final_matches
 
-    return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
-
-@server.call_tool()
 async def rag_query(name: str, arguments: dict):
     if name != "rag_query":
         raise ValueError(f"Unknown tool: {name}")
@@ -637,35 +4018,142 @@ async def rag_query(name: str, arguments: dict):
     query = arguments["query"]
     k = int(arguments.get("k", CHUNKS_PER_QUERY))
 
-    matches = await _smart_rag_search(query, k)
-    chunks = [
-        {
-            "text": m["text"],
-            "title": m.get("metadata", {}).get("title", ""),
-            "url": m.get("metadata", {}).get("url", ""),
-            "domain": m.get("metadata", {}).get("domain", ""),
-            "score": m.get("score", 0),
-            "confidence": m.get("confidence", m.get("score", 0)),
+    with ToolCall("rag_query", arguments) as call:
+        matches = await _smart_rag_search(query, k)
+        header: Dict[str, Any] = {"query": query}
+        if call.timings is not None:
+            header["timings_ms"] = call.breakdown()
+        text = pack_response(header, matches, *_packing_options(arguments))
+    return [TextContent(type="text", text=text)]
+
+class FairScheduler:
+    """Admits tool calls fairly across MCP clients.
+
+    At most ``max_concurrent`` calls run at once and at most ``per_client``
+    for any one client.  A free slot goes to the waiting client with the
+    fewest running calls, ties going to the one served least recently, so
+    an agent that queues many calls cannot starve the others.  Waiters are plain futures on the running loop.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_CALLS, per_client: int = MAX_CALLS_PER_CLIENT):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_client = max(1, per_client)
+        self.active = 0
+        self._running: Counter = Counter()
+        self._waiting: Dict[str, deque] = {}
+        # client -> admission sequence number of its latest call
+        self._served: Dict[str, int] = {}
+        self._admitted = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": sum(len(q) for q in self._waiting.values()),
+            "clients": len(set(self._running) | set(self._waiting)),
         }
-        for m in matches
-    ]
 
-    result = {
-        "query": query,
-        "chunks": chunks,
-        "total_chunks": len(chunks),
-    }
-    return [TextContent(type="text", text=json.dumps(result, indent=2))]
+    def _dispatch(self) -> None:
+        while self.active < self.max_concurrent:
+            ready = [c for c in self._waiting if self._running[c] < self.per_client]
+            if not ready:
+                return
+            client = min(ready, key=lambda c: (self._running[c], self._served.get(c, -1)))
+            queue = self._waiting[client]
+            fut = queue.popleft()
+            if not queue:
+                del self._waiting[client]
+            if fut.done():
+                continue
+            self._running[client] += 1
+            self._admitted += 1
+            self._served[client] = self._admitted
+            self.active += 1
+            fut.set_result(None)
+
+    def _release(self, client: str) -> None:
+        self.active -= 1
+        self._running[client] -= 1
+        if not self._running[client]:
+            del self._running[client]
+            if client not in self._waiting:
+                del self._served[client]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, client: str):
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client, deque()).append(fut)
+        started = time.perf_counter()
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release(client)  # admitted just as we were cancelled
+            else:
+                queue = self._waiting.get(client)
+                if queue is not None and fut in queue:
+                    queue.remove(fut)
+                    if not queue:
+                        del self._waiting[client]
+            raise
+        METRICS.observe("gabesearch_scheduler_wait_seconds", time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release(client)
+
+
+def _make_scheduler(transport: str = MCP_TRANSPORT) -> FairScheduler:
+    """The call scheduler for ``transport``.
+
+    Only SSE serves several clients from one process; a stdio process has
+    exactly one, which gets the whole ``MAX_CONCURRENT_CALLS``.
+    """
+    per_client = MAX_CALLS_PER_CLIENT if transport == "sse" else MAX_CONCURRENT_CALLS
+    return FairScheduler(MAX_CONCURRENT_CALLS, per_client)
+
+
+SCHEDULER = _make_scheduler()
+
+# Identity of the MCP client whose session is being served (see _SseApp)
+_CLIENT_ID: "contextvars.ContextVar[str]" = contextvars.ContextVar("client_id", default="stdio")
+
+TOOL_HANDLERS = {"search_and_retrieve": search_and_retrieve, "rag_query": rag_query}
+
+
+@server.call_tool()
+async def call_tool(name: str, arguments: dict):
+    """The single MCP tool entry point: schedule the call, then dispatch it.
+
+    The MCP server keeps one handler per request type, so each tool cannot
+    register its own ``call_tool`` handler.
+    """
+    handler = TOOL_HANDLERS.get(name)
+    if handler is None:
+        raise ValueError(f"Unknown tool: {name}")
+    async with SCHEDULER.slot(_CLIENT_ID.get()):
+        return await handler(name, arguments)
+
 
 @server.list_tools()
 async def list_tools():
+    STARTUP.mark("first_list_tools")
     return [
         Tool(
             name="search_and_retrieve",
             description="Search, scrape, vectorize into Qdrant, and return deduplicated RAG chunks for a prompt.",
             inputSchema={
                 "type": "object",
-                "properties": {"prompt": {"type": "string"}},
+                "properties": {
+                    "prompt": {"type": "string"},
+                    "deadline_ms": {"type": "integer", "minimum": 0},
+                    "fresh": {"type": "boolean"},
+                    "trace": {"type": "boolean"},
+                    "max_chars": {"type": "integer", "minimum": 1},
+                    "max_tokens": {"type": "integer", "minimum": 1},
+                    "format": {"type": "string", "enum": list(RESPONSE_FORMATS)},
+                },
                 "required": ["prompt"],
                 "additionalProperties": False,
             },
@@ -678,6 +4166,10 @@ async def list_tools():
                 "properties": {
                     "query": {"type": "string"},
                     "k": {"type": "integer", "minimum": 1},
+                    "trace": {"type": "boolean"},
+                    "max_chars": {"type": "integer", "minimum": 1},
+                    "max_tokens": {"type": "integer", "minimum": 1},
+                    "format": {"type": "string", "enum": list(RESPONSE_FORMATS)},
                 },
                 "required": ["query"],
                 "additionalProperties": False,
@@ -685,11 +4177,131 @@ async def list_tools():
         ),
     ]
 
+class _SseApp:
+    """ASGI app serving MCP over SSE to any number of concurrent clients.
+
+    ``GET /sse`` opens a session and ``POST /messages/`` carries the client's
+    requests.  Every session runs on the shared ``server``; calls are tagged
+    with the client id from the ``X-MCP-Client`` header or ``?client=``
+    query parameter (each connection is its own client otherwise) for
+    ``SCHEDULER``.  ``GET /healthz`` reports startup, scheduler,
+    engine health and HTTP limit state.
+    """
+
+    def __init__(self):
+        from mcp.server.sse import SseServerTransport
+
+        self.transport = SseServerTransport("/messages/")
+        self.sessions = 0
+
+    @staticmethod
+    def _client_id(scope) -> Optional[str]:
+        for key, value in scope.get("headers", []):
+            if key == b"x-mcp-client" and value:
+                return value.decode("latin-1")[:128]
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        return query.get("client", "")[:128] or None
+
+    async def _session(self, scope, receive, send) -> None:
+        self.sessions += 1
+        client = self._client_id(scope) or f"session-{self.sessions}"
+        _CLIENT_ID.set(client)
+        logging.info(f"MCP client {client} connected", extra={"client": client})
+        try:
+            async with self.transport.connect_sse(scope, receive, send) as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, server.create_initialization_options())
+        finally:
+            logging.info(f"MCP client {client} disconnected", extra={"client": client})
+
+    async def _health(self, send) -> None:
+        body = json.dumps(
+            {
+                "startup": STARTUP.report(),
+                "scheduler": SCHEDULER.stats(),
+                "engines": ENGINE_SCOREBOARD.snapshot(),
+                "http": HTTP_POOL.stats(),
+            }
+        ).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send) -> None:
+        path, method = scope["path"], scope["method"]
+        if path == "/sse" and method == "GET":
+            await self._session(scope, receive, send)
+        elif path.startswith("/messages") and method == "POST":
+            await self.transport.handle_post_message(scope, receive, send)
+        elif path == "/healthz" and method == "GET":
+            await self._health(send)
+        else:
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b"Not found"})
+
+
+async def serve_sse(host: str = MCP_HOST, port: int = MCP_PORT) -> None:
+    """Serve MCP over SSE with uvicorn until cancelled."""
+    import uvicorn
+
+    config = uvicorn.Config(_SseApp(), host=host, port=port, log_level=LOG_LEVEL.lower(), lifespan="off")
+    logging.info(f"Serving MCP over SSE on http://{host}:{port}/sse")
+    await uvicorn.Server(config).serve()
+
+
 async def main():
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream, write_stream, server.create_initialization_options()
-        )
+    STARTUP.mark("main")
+    STARTUP.start()
+    metrics_server = start_metrics_server() if METRICS.enabled else None
+    maintenance = None
+    if MAINTENANCE_INTERVAL_S > 0:
+        maintenance = asyncio.create_task(_maintenance_loop())
+    try:
+        if MCP_TRANSPORT == "sse":
+            await serve_sse()
+        elif MCP_TRANSPORT == "stdio":
+            async with stdio_server() as (read_stream, write_stream):
+                await server.run(
+                    read_stream, write_stream, server.create_initialization_options()
+                )
+        else:
+            raise ValueError(f"Unknown MCP_TRANSPORT {MCP_TRANSPORT!r}; expected stdio or sse")
+    finally:
+        if maintenance is not None:
+            maintenance.cancel()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        _shutdown_extract_pool()
+        await HTTP_POOL.aclose()
+        if PAGE_STORE is not None:
+            PAGE_STORE.close()
+        if SEARCH_CACHE is not None:
+            SEARCH_CACHE.close()
+        if _embedder is not None:
+            _embedder.close()
+        if _vector_store is not None:
+            _vector_store.close()
+
+
+def maintenance_cli(argv: Optional[List[str]] = None) -> Dict[str, int]:
+    """``python server.py maintain``: one maintenance pass without the model."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="server.py maintain", description=run_maintenance.__doc__.splitlines()[0])
+    parser.add_argument("--ttl-days", type=float, default=WEB_CACHE_TTL_DAYS)
+    parser.add_argument("--max-points", type=int, default=MAX_CACHE_POINTS)
+    parser.add_argument("--store", choices=["qdrant", "local"], default=VECTOR_STORE)
+    args = parser.parse_args(argv)
+    store = _open_vector_store(args.store)
+    try:
+        store.bootstrap(None)
+        result = run_maintenance(store, ttl_days=args.ttl_days, max_points=args.max_points)
+    finally:
+        store.close()
+    print(json.dumps(result))
+    return result
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if sys.argv[1:2] == ["maintain"]:
+        maintenance_cli(sys.argv[2:])
+    else:
+        asyncio.run(main())
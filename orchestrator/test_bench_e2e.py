@@ -0,0 +1,46 @@
+import orchestrator.bench_e2e as bench
+import orchestrator.server as srv
+
+# Module globals run_benchmark swaps out for the duration of a run
+BENCH_GLOBALS = (
+    "SEARX_URL", "SEARCH_ENGINES", "TOP_K", "RAG_CACHE", "ENGINE_SCOREBOARD", "HTTP_POOL",
+    "SEARCH_CACHE", "PAGE_STORE", "SEMANTIC_CACHE", "_embedder", "_vector_store",
+)
+
+
+def test_offline_run_reports_latency_stages_and_rss(tmp_path, monkeypatch):
+    assert bench.srv is srv
+    for name in BENCH_GLOBALS:
+        monkeypatch.setattr(srv, name, getattr(srv, name))
+    monkeypatch.setattr(srv, "EXTRACT_WORKERS", 0)
+    out = tmp_path / "run.json"
+    result = bench.main([
+        "--requests", "6", "--concurrency", "3", "--prompts", "2", "--pages", "12", "--hosts", "2",
+        "--page-kb", "4", "--slow-ms", "50", "--engines", "a:5:0", "b:5:1", "--embedder", "hash",
+        "--out", str(out),
+    ])
+    assert result["totals"]["requests"] == 6 and result["totals"]["errors"] == 0
+    assert set(result["tools"]) <= {"search_and_retrieve", "rag_query"}
+    for stats in result["tools"].values():
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    if "search_and_retrieve" in result["tools"]:
+        assert {"search", "fetch", "extract", "upsert", "embed"} <= set(result["stages"])
+    assert result["peak_rss_mb"]["self"] > 0
+    assert out.exists()
+    assert any(line.startswith("throughput_rps") for line in bench.compare(result, result))
+
+
+def test_fake_searx_links_are_stable_per_query():
+    corpus = bench.Corpus(pages=30, hosts=3)
+    searx = bench.FakeSearx(corpus, {"a": (0, 0)}, results=5)
+    try:
+        urls = lambda q: [r["url"] for r in searx.links(q)]
+        assert urls("Vector  DB") == urls("vector db") != urls("other topic")
+        assert len({urlhost(r["url"]) for r in searx.links("x")}) > 1
+    finally:
+        searx.close()
+        corpus.close()
+
+
+def urlhost(url):
+    return url.split("/")[2].split(":")[0]
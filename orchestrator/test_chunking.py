@@ -0,0 +1,67 @@
+import uuid
+
+from orchestrator.server import _canonical_url, _chunk_documents, _chunk_text, _point_id
+
+
+def _sentences(n):
+    return " ".join(f"Sentence number {i} has a handful of words." for i in range(n))
+
+
+def test_chunks_respect_size_and_overlap():
+    chunks = _chunk_text(_sentences(100), max_chars=200, overlap=60, max_chunks=0)
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    # Every chunk after the first repeats the tail sentence of its predecessor
+    for prev, cur in zip(chunks, chunks[1:]):
+        tail = prev.rsplit(". ", 1)[-1]
+        assert cur.startswith(tail)
+
+
+def test_chunks_are_sentence_aligned():
+    chunks = _chunk_text(_sentences(50), max_chars=200, overlap=0, max_chunks=0)
+    assert all(c.startswith("Sentence") and c.endswith(".") for c in chunks)
+
+
+def test_long_sentence_is_split():
+    chunks = _chunk_text("word " * 500, max_chars=100, overlap=0, max_chunks=0)
+    assert all(len(c) <= 100 for c in chunks)
+    assert sum(c.count("word") for c in chunks) == 500
+
+
+def test_max_chunks_cap():
+    assert len(_chunk_text(_sentences(200), max_chars=100, overlap=0, max_chunks=5)) == 5
+
+
+def test_empty_text():
+    assert _chunk_text("   ") == []
+
+
+def test_canonical_url():
+    assert _canonical_url("HTTPS://Example.com:443/a/?utm_source=x&b=2&a=1#top") == "https://example.com/a?a=1&b=2"
+    assert _point_id("https://example.com/a/", 3) == _point_id("https://EXAMPLE.com/a?utm_medium=y", 3)
+    assert _point_id("https://example.com/a", 0) != _point_id("https://example.com/a", 1)
+
+
+def test_chunk_documents_back_references():
+    docs = [{"text": _sentences(40), "metadata": {"url": "https://example.com/p", "domain": "example.com"}}]
+    out = _chunk_documents(docs)
+    assert len(out) > 1
+    assert len({d["id"] for d in out}) == len(out)
+    for idx, d in enumerate(out):
+        meta = d["metadata"]
+        assert d["id"] == _point_id("https://example.com/p", idx)
+        assert meta["parent_id"] == str(uuid.uuid5(uuid.NAMESPACE_URL, "https://example.com/p"))
+        assert meta["chunk_index"] == idx
+        assert meta["chunk_count"] == len(out)
+        assert meta["domain"] == "example.com"
+
+
+def test_prose_sentences_still_overlap():
+    # Real sentences outrun the overlap window, so the carried text is a
+    # word-aligned tail of the previous chunk rather than whole sentences
+    sentence = "The {} experiment measured how retrieval quality changes when long articles are split into passages of different sizes and overlaps."
+    text = " ".join(sentence.format(i) for i in range(30))
+    chunks = _chunk_text(text, max_chars=350, overlap=60, max_chunks=0)
+    assert len(chunks) > 5 and all(len(c) <= 350 for c in chunks)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur[:40] in prev[-60:]
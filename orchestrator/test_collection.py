@@ -0,0 +1,147 @@
+from types import SimpleNamespace
+
+import pytest
+from qdrant_client import QdrantClient, models
+
+import orchestrator.server as srv
+
+
+class FakeCollections:
+    """Just enough of QdrantClient's collection API to observe the bootstrap."""
+
+    def __init__(self):
+        self.collections = {}
+        self.calls = []
+
+    def collection_exists(self, name):
+        return name in self.collections
+
+    def get_collection(self, name):
+        c = self.collections[name]
+        return SimpleNamespace(
+            config=SimpleNamespace(
+                params=SimpleNamespace(vectors=c["vectors"], sparse_vectors=c["sparse"]),
+                hnsw_config=c["hnsw"],
+                quantization_config=c["quantization"],
+            ),
+            payload_schema=dict(c["indexes"]),
+        )
+
+    def create_collection(self, name, vectors_config, sparse_vectors_config, hnsw_config, quantization_config):
+        self.calls.append(("create", name))
+        self.collections[name] = {
+            "vectors": vectors_config,
+            "sparse": sparse_vectors_config,
+            "hnsw": hnsw_config,
+            "quantization": quantization_config,
+            "indexes": {},
+        }
+
+    def delete_collection(self, name):
+        self.calls.append(("delete", name))
+        del self.collections[name]
+
+    def update_collection(self, name, **diff):
+        self.calls.append(("update", name, sorted(diff)))
+        c = self.collections[name]
+        if "hnsw_config" in diff:
+            c["hnsw"] = diff["hnsw_config"]
+        if "quantization_config" in diff:
+            q = diff["quantization_config"]
+            c["quantization"] = None if q == models.Disabled.DISABLED else q
+        if "sparse_vectors_config" in diff:
+            c["sparse"] = {**(c["sparse"] or {}), **diff["sparse_vectors_config"]}
+        if "vectors_config" in diff:
+            c["vectors"] = c["vectors"].model_copy(update={"on_disk": diff["vectors_config"][""].on_disk})
+
+    def create_payload_index(self, name, field, field_schema):
+        self.calls.append(("index", field))
+        self.collections[name]["indexes"][field] = field_schema
+
+
+def test_fresh_collection_is_created_with_indexes():
+    client = FakeCollections()
+    assert srv._ensure_collection(client, 384, "web") == "created"
+    c = client.collections["web"]
+    assert c["vectors"].size == 384 and c["vectors"].distance == models.Distance.COSINE
+    assert c["sparse"][srv.SPARSE_VECTOR].modifier == models.Modifier.IDF
+    assert (c["hnsw"].m, c["hnsw"].ef_construct) == (srv.QDRANT_HNSW_M, srv.QDRANT_HNSW_EF_CONSTRUCT)
+    assert c["indexes"] == {
+        "domain": models.PayloadSchemaType.KEYWORD,
+        "url": models.PayloadSchemaType.KEYWORD,
+        "source_query": models.PayloadSchemaType.KEYWORD,
+        "fetched_at": models.PayloadSchemaType.FLOAT,
+        "last_hit_at": models.PayloadSchemaType.FLOAT,
+        "pinned": models.PayloadSchemaType.BOOL,
+        "parent_id": models.PayloadSchemaType.KEYWORD,
+        "chunk_index": models.PayloadSchemaType.INTEGER,
+    }
+
+
+def test_second_bootstrap_is_a_no_op():
+    client = FakeCollections()
+    srv._ensure_collection(client, 384, "web")
+    client.calls.clear()
+    assert srv._ensure_collection(client, 384, "web") == "unchanged"
+    assert client.calls == []
+
+
+def test_changed_settings_are_migrated_in_place(monkeypatch):
+    client = FakeCollections()
+    srv._ensure_collection(client, 384, "web")
+    monkeypatch.setattr(srv, "QDRANT_HNSW_M", 32)
+    monkeypatch.setattr(srv, "QDRANT_QUANTIZATION", "int8")
+    monkeypatch.setattr(srv, "QDRANT_ON_DISK", True)
+    assert srv._ensure_collection(client, 384, "web") == "updated"
+    assert client.calls[-1] == ("update", "web", ["hnsw_config", "quantization_config", "vectors_config"])
+    c = client.collections["web"]
+    assert c["hnsw"].m == 32 and c["vectors"].on_disk
+    assert c["quantization"].scalar.type == models.ScalarType.INT8
+    params = srv._search_params()
+    assert params.quantization.rescore and params.quantization.oversampling == srv.QDRANT_OVERSAMPLING
+
+
+def test_dimension_change_is_an_error_without_opt_in():
+    client = FakeCollections()
+    srv._ensure_collection(client, 384, "web")
+    with pytest.raises(RuntimeError, match="384-dim"):
+        srv._ensure_collection(client, 768, "web")
+    assert ("delete", "web") not in client.calls
+    assert client.collections["web"]["vectors"].size == 384
+
+
+def test_dimension_change_recreates_collection_when_asked(monkeypatch):
+    monkeypatch.setattr(srv, "QDRANT_RECREATE", True)
+    client = FakeCollections()
+    srv._ensure_collection(client, 384, "web")
+    assert srv._ensure_collection(client, 768, "web") == "recreated"
+    assert ("delete", "web") in client.calls
+    assert client.collections["web"]["vectors"].size == 768
+    assert len(client.collections["web"]["indexes"]) == len(srv.QDRANT_PAYLOAD_INDEXES)
+
+
+def test_sparse_vector_is_added_in_place():
+    client = FakeCollections()
+    srv._ensure_collection(client, 384, "web")
+    client.collections["web"]["sparse"] = None
+    client.calls.clear()
+    assert srv._ensure_collection(client, 384, "web") == "updated"
+    assert client.calls == [("update", "web", ["sparse_vectors_config"])]
+    assert client.collections["web"]["sparse"][srv.SPARSE_VECTOR].modifier == models.Modifier.IDF
+
+
+def test_collection_without_sparse_vector_is_kept_unless_recreate_is_set(monkeypatch):
+    # Qdrant (like the in-memory client) may refuse to add a new sparse vector
+    client = QdrantClient(":memory:")
+    client.create_collection("web", vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE))
+    client.upsert("web", [models.PointStruct(id=1, vector=[1.0, 0.0, 0.0, 0.0])])
+    with pytest.raises(RuntimeError, match="QDRANT_RECREATE"):
+        srv._ensure_collection(client, 4, "web")
+    assert client.count("web").count == 1
+    monkeypatch.setattr(srv, "QDRANT_RECREATE", True)
+    assert srv._ensure_collection(client, 4, "web") == "recreated"
+    assert srv.SPARSE_VECTOR in client.get_collection("web").config.params.sparse_vectors
+
+
+def test_default_search_params_are_left_to_the_server():
+    assert srv._search_params() is None
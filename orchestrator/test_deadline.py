@@ -0,0 +1,76 @@
+import asyncio
+import json
+import time
+
+import orchestrator.server as srv
+from orchestrator.test_pipeline import _install
+
+
+def test_deadline_remaining_and_reserve():
+    unlimited = srv.Deadline(0)
+    assert unlimited.remaining() is None and not unlimited.expired()
+    d = srv.Deadline(1000)
+    assert 0.9 < d.remaining() <= 1.0
+    assert d.reserve(500).remaining() <= 0.75 + 1e-3  # reserve capped at a quarter of the budget
+
+
+def test_bulk_retrieve_returns_partial_results_on_deadline(monkeypatch):
+    _install(monkeypatch, {"fast": 0.0, "slow": 5.0}, fetch_delay=0.05)
+    start = time.perf_counter()
+    result = asyncio.run(srv.bulk_retrieve(["fast", "slow"], deadline=srv.Deadline(300)))
+    assert time.perf_counter() - start < 1.0
+    assert result["truncated_stages"] == ["search"]
+    assert result["source_count"] == 3
+    assert result["chunks_upserted"] > 0
+
+
+def test_fetch_stage_reported_when_cut(monkeypatch):
+    _install(monkeypatch, {"a": 0.0}, fetch_delay=5.0)
+    result = asyncio.run(srv.bulk_retrieve(["a"], deadline=srv.Deadline(200)))
+    assert result["truncated_stages"] == ["fetch"]
+    assert result["source_count"] == 0
+
+
+def test_search_and_retrieve_reports_cut_stages(monkeypatch):
+    _install(monkeypatch, {q: 5.0 for q in srv.generate_search_queries("topic")})
+
+    async def fake_rag(queries, k):
+        return [[] for _ in queries]
+
+    monkeypatch.setattr(srv, "_smart_rag_search_many", fake_rag)
+    start = time.perf_counter()
+    out = asyncio.run(srv.search_and_retrieve("search_and_retrieve", {"prompt": "topic", "deadline_ms": 400}))
+    body = json.loads(out[0].text)
+    assert time.perf_counter() - start < 1.5
+    assert body["partial"] is True and body["truncated_stages"] == ["search"]
+    assert body["deadline_ms"] == 400
+
+
+def test_slow_prompt_embedding_counts_against_the_deadline(monkeypatch):
+    _install(monkeypatch, {q: 5.0 for q in srv.generate_search_queries("topic")})
+
+    class SlowModel:
+        def encode(self, texts):
+            time.sleep(1.0)
+            return [[1.0, 0.0]] * len(texts)
+
+    async def fake_rag(queries, k):
+        return [[] for _ in queries]
+
+    monkeypatch.setattr(srv, "_smart_rag_search_many", fake_rag)
+    monkeypatch.setattr(srv, "_vector_store", object())
+    monkeypatch.setattr(srv, "SEMANTIC_CACHE", srv.SemanticCache(10, threshold=0.9, ttl=60))
+
+    async def run():
+        srv._embedder = srv.EmbeddingService(SlowModel)
+        try:
+            start = time.perf_counter()
+            header, _ = await srv._search_and_retrieve("topic", {"deadline_ms": 400})
+            return header, time.perf_counter() - start
+        finally:
+            srv._embedder.close()
+
+    monkeypatch.setattr(srv, "_embedder", None)
+    header, elapsed = asyncio.run(run())
+    # Without the deadline the embedding alone would take a second
+    assert elapsed < 0.8 and header["partial"] is True
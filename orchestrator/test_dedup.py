@@ -0,0 +1,76 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from orchestrator.server import _deduplicate_chunks
+
+
+def _match(domain, vector, score=0.5, days_old=10):
+    date = (datetime.now() - timedelta(days=days_old)).strftime("%Y-%m-%d")
+    return {
+        "text": domain,
+        "score": score,
+        "vector": vector,
+        "metadata": {"domain": domain, "publish_date": date},
+    }
+
+
+def test_near_duplicate_vectors_are_dropped():
+    matches = [
+        _match("a.com", [1.0, 0.0, 0.0], score=0.9),
+        _match("b.com", [0.99, 0.05, 0.0], score=0.8),
+        _match("c.com", [0.0, 1.0, 0.0], score=0.7),
+    ]
+    out = _deduplicate_chunks(matches, 10)
+    assert [m["text"] for m in out] == ["a.com", "c.com"]
+
+
+def _candidates(n, dim=16, seed=0):
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed).standard_normal((n, dim))
+    suffixes = ["arxiv.org", "medium.com", "wikipedia.org", "example.com"]
+    return [
+        _match(f"d{rng.randrange(n // 10)}.{rng.choice(suffixes)}", vectors[i].tolist(), rng.random(), rng.randint(0, 900))
+        for i in range(n)
+    ]
+
+
+def test_one_match_per_domain():
+    matches = [_match("a.com", [1.0, 0.0], 0.9), _match("a.com", [0.0, 1.0], 0.8)]
+    assert len(_deduplicate_chunks(matches, 10)) == 1
+
+
+def test_source_type_cap_and_metadata():
+    matches = [_match(f"site{i}.com", [float(i == j) for j in range(8)], 0.9 - i * 0.01) for i in range(8)]
+    out = _deduplicate_chunks(matches, 10)
+    assert len(out) == 3
+    assert all(m["metadata"]["source_type"] == "other" for m in out)
+
+
+def test_old_pages_skipped_after_six_picks():
+    matches = [
+        _match(f"{kind}{i}.{suffix}", [float(j == 3 * s + i) for j in range(12)], 0.9, days_old=10)
+        for s, (kind, suffix) in enumerate([("a", "arxiv.org"), ("m", "medium.com")])
+        for i in range(3)
+    ]
+    matches.append(_match("w.wikipedia.org", [0.0] * 11 + [1.0], 1.5, days_old=800))
+    out = _deduplicate_chunks(matches, 10)
+    assert "w.wikipedia.org" in [m["text"] for m in out]
+    matches[-1]["score"] = 0.0
+    out = _deduplicate_chunks(matches, 10)
+    assert "w.wikipedia.org" not in [m["text"] for m in out]
+
+
+def test_sorted_by_confidence_and_limited():
+    out = _deduplicate_chunks(_candidates(500), 5)
+    assert len(out) == 5
+    conf = [m["confidence"] for m in out]
+    assert conf == sorted(conf, reverse=True)
+
+
+def test_missing_vectors_fall_back_to_domain_rule():
+    matches = [_match("a.com", None, 0.9), _match("b.org", None, 0.8), _match("a.com", None, 0.7)]
+    out = _deduplicate_chunks(matches, 10)
+    assert [m["text"] for m in out] == ["a.com", "b.org"]
+
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+import orchestrator.server as srv
+
+
+def _tokenizer(words):
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{w: i + 2 for i, w in enumerate(words)}}
+    tok = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tok.pre_tokenizer = Whitespace()
+    return tok
+
+
+class FakeSession:
+    """Emits a CLS state of (token count, 3, 0) so pooling is easy to check."""
+
+    def __init__(self):
+        self.feeds = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, outputs, feeds):
+        self.feeds.append(feeds)
+        mask = feeds["attention_mask"]
+        hidden = np.zeros(mask.shape + (3,), dtype=np.float32)
+        hidden[:, 0, 0] = mask.sum(axis=1) * 4
+        hidden[:, 0, 1] = 3
+        return [hidden]
+
+
+def test_onnx_embedder_pools_cls_and_normalizes():
+    session = FakeSession()
+    texts = ["one two three four five six", "one", "one two"]
+    embedder = srv.OnnxEmbedder(session, _tokenizer(["one", "two", "three"]), batch_size=2)
+    out = embedder.encode(texts)
+    counts = np.array([6, 1, 2], dtype=np.float32)
+    expected = np.stack([counts * 4, np.full(3, 3.0), np.zeros(3)], axis=1)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.allclose(out, expected)
+    # Only inputs the graph declares are fed, and batches are length-sorted
+    assert all(set(f) == {"input_ids", "attention_mask"} for f in session.feeds)
+    assert [f["input_ids"].shape for f in session.feeds] == [(2, 2), (1, 6)]
+
+
+def test_onnx_embedder_truncates_long_inputs():
+    session = FakeSession()
+    embedder = srv.OnnxEmbedder(session, _tokenizer(["a"]), max_length=8)
+    embedder.encode(["a " * 100])
+    assert session.feeds[0]["input_ids"].shape == (1, 8)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        srv._load_embed_model("tensorflow")
+
+
+PARITY_TEXTS = [
+    "How do transformers handle long-range dependencies?",
+    "Qdrant stores dense vectors together with a JSON payload.",
+    "The quick brown fox jumps over the lazy dog.",
+    "bge-small-en-v1.5 is a 384 dimensional English embedding model.",
+]
+
+
+@pytest.mark.parametrize("backend,min_cosine", [("onnx", 0.999), ("onnx-int8", 0.97)])
+def test_onnx_backends_agree_with_reference_model(backend, min_cosine):
+    pytest.importorskip("onnxruntime")
+    try:
+        reference = srv._load_embed_model("flag")
+        candidate = srv._load_embed_model(backend)
+    except Exception as e:  # model weights need network access or a warm HF cache
+        pytest.skip(f"embedding model unavailable: {e}")
+    ref = np.asarray(reference.encode(PARITY_TEXTS))
+    got = candidate.encode(PARITY_TEXTS)
+    cosines = np.sum(ref * got, axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(got, axis=1))
+    assert cosines.min() >= min_cosine
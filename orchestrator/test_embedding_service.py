@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+import numpy as np
+
+import orchestrator.server as srv
+
+
+class CountingModel:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.threads = set()
+        self.fail = fail
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        self.threads.add(threading.current_thread().name)
+        if self.fail:
+            raise RuntimeError("boom")
+        return np.array([[float(len(t)), 1.0] for t in texts])
+
+
+def _run(service, *requests):
+    async def go():
+        try:
+            return await asyncio.gather(*(service.encode(r) for r in requests))
+        finally:
+            service.close()
+
+    return asyncio.run(go())
+
+
+def test_concurrent_requests_share_one_model_call():
+    model = CountingModel()
+    service = srv.EmbeddingService(lambda: model, max_batch=64, max_wait_ms=20)
+    out = _run(service, ["a"], ["bb", "ccc"], ["dddd"])
+    assert len(model.calls) == 1 and sorted(model.calls[0]) == ["a", "bb", "ccc", "dddd"]
+    assert [r[:, 0].tolist() for r in out] == [[1.0], [2.0, 3.0], [4.0]]
+    assert all(name.startswith("embed") for name in model.threads)
+    stats = service.stats()
+    assert stats["requests"] == 3 and stats["batches"] == 1 and stats["max_batch_size"] == 4
+
+
+def test_large_requests_are_split_at_max_batch():
+    model = CountingModel()
+    service = srv.EmbeddingService(lambda: model, max_batch=4, max_wait_ms=1)
+    texts = [f"t{'x' * i}" for i in range(10)]
+    (out,) = _run(service, texts)
+    assert all(len(call) <= 4 for call in model.calls)
+    assert out[:, 0].tolist() == [float(len(t)) for t in texts]
+
+
+def test_model_errors_reach_every_caller():
+    service = srv.EmbeddingService(lambda: CountingModel(fail=True), max_wait_ms=10)
+
+    async def go():
+        try:
+            return await asyncio.gather(service.encode(["a"]), service.encode(["b"]), return_exceptions=True)
+        finally:
+            service.close()
+
+    results = asyncio.run(go())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_empty_request_skips_the_model():
+    model = CountingModel()
+    service = srv.EmbeddingService(lambda: model)
+    (out,) = _run(service, [])
+    assert out.shape[0] == 0 and model.calls == []
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+import orchestrator.server as srv
+
+
+@pytest.fixture
+def board(monkeypatch, fake_searx):
+    board = srv.EngineScoreboard(alpha=0.5, cooldown_s=60, failure_threshold=2)
+    monkeypatch.setattr(srv, "ENGINE_SCOREBOARD", board)
+    monkeypatch.setattr(srv, "HTTP_POOL", srv.HttpPool())
+    monkeypatch.setattr(srv, "HEDGE_MIN_DELAY_MS", 50)
+    monkeypatch.setattr(srv, "HEDGE_MAX_DELAY_MS", 150)
+    return board
+
+
+def _search(query, engines, monkeypatch):
+    monkeypatch.setattr(srv, "SEARCH_ENGINES", engines)
+
+    async def run():
+        try:
+            return await srv.searx_top_links(query, 3)
+        finally:
+            await srv.HTTP_POOL.aclose()
+
+    return asyncio.run(run())
+
+
+def test_ranking_prefers_fast_reliable_engines():
+    board = srv.EngineScoreboard(alpha=0.5)
+    board.record_success("fast", 0.1)
+    board.record_success("slow", 2.0)
+    board.record_failure("flaky", 0.1, "no_results")
+    board.record_failure("flaky", 0.1, "no_results")
+    assert board.ranked(["slow", "flaky", "fast"]) == ["fast", "slow", "flaky"]
+    assert board.snapshot()["engines"]["flaky"]["cooldown_remaining_s"] > 0
+
+
+def test_captcha_engine_goes_to_cooldown(board, fake_searx, monkeypatch):
+    fake_searx.failing.add("bing")
+    board.record_success("bing", 0.01)  # bing looks best until it serves a CAPTCHA
+    board.record_success("brave", 0.1)
+    for _ in range(3):
+        results = _search("q", ["bing", "brave"], monkeypatch)
+        assert results and results[0]["engine"] == "brave"
+    # bing was tried once: afterwards it is ranked last and never used as a hedge
+    assert [e for _, e in fake_searx.requests].count("bing") == 1
+    assert board.ranked(["bing", "brave"]) == ["brave", "bing"]
+
+
+def test_hedged_request_takes_first_good_answer(board, fake_searx, monkeypatch):
+    fake_searx.latency = {"slow": 2.0, "quick": 0.0}
+    board.record_success("slow", 0.01)  # looks best on paper
+    board.record_success("quick", 0.05)
+    start = time.perf_counter()
+    results = _search("q", ["slow", "quick"], monkeypatch)
+    assert time.perf_counter() - start < 1.5
+    assert results[0]["engine"] == "quick"
+    assert [e for _, e in fake_searx.requests][:2] == ["slow", "quick"]
+
+
+def test_all_engines_failing_returns_empty(board, fake_searx, monkeypatch):
+    fake_searx.failing.update({"a", "b"})
+    assert _search("q", ["a", "b"], monkeypatch) == []
+    snap = board.snapshot()["engines"]
+    assert snap["a"]["last_error"] == "non_json" and snap["b"]["failures"] == 1
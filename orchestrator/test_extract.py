@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+import orchestrator.server as srv
+
+PAGE = (
+    "<?xml version='1.0' encoding='utf-8'?><html><head><title> Title </title>"
+    "<meta name='author' content='Ann'><meta property='article:published_time' content='2024-02-03'>"
+    "<meta property='og:description' content='Desc'><script>var hidden = 1;</script></head>"
+    "<body><p>" + "A readable sentence of body text. " * 20 + "</p><style>.x{}</style></body></html>"
+)
+
+
+def test_text_and_metadata_from_one_parse():
+    text, meta = srv.clean_html_with_metadata(PAGE, "https://example.com")
+    assert "readable sentence" in text and "hidden" not in text
+    assert meta == {
+        "page_title": "Title",
+        "meta_author": "Ann",
+        "meta_date": "2024-02-03",
+        "meta_description": "Desc",
+    }
+
+
+def test_short_page_falls_back_to_visible_text():
+    text, _ = srv.clean_html_with_metadata("<html><body><p>tiny</p><script>x()</script></body></html>", "u")
+    assert text == "tiny"
+
+
+def test_empty_document():
+    assert srv.clean_html_with_metadata("  ", "u") == ("", {})
+    assert srv.extract_page_metadata("", "u") == {}
+
+
+@pytest.fixture
+def process_pool(monkeypatch):
+    monkeypatch.setattr(srv, "EXTRACT_WORKERS", 1)
+    srv._shutdown_extract_pool()
+    yield
+    srv._shutdown_extract_pool()
+
+
+def test_extract_page_on_process_pool(process_pool):
+    text, meta = asyncio.run(srv.extract_page(PAGE, "https://example.com"))
+    assert "readable sentence" in text and meta["meta_author"] == "Ann"
+
+
+def test_cpu_cap_stops_pathological_documents(process_pool, monkeypatch):
+    monkeypatch.setattr(srv, "EXTRACT_CPU_SECONDS", 1.0)
+    huge = "<html><body>" + "<div><p>para text words here.</p></div>" * 100000 + "</body></html>"
+
+    async def run():
+        # Start the worker first so its startup does not count against the wall-clock timeout
+        await srv.extract_page(PAGE, "https://example.com")
+        return await srv.extract_page(huge, "https://example.com")
+
+    text, meta = asyncio.run(run())
+    assert text == "" and meta.get("extract_error") == "cpu_limit"
+
+
+def test_wall_timeout_recycles_a_stuck_pool(process_pool, monkeypatch):
+    monkeypatch.setattr(srv, "EXTRACT_CPU_SECONDS", 1.0)
+
+    async def run():
+        await srv.extract_page(PAGE, "https://example.com")
+        stuck = srv._extract_pool
+        workers = list(stuck._processes.values())
+        # Sleeping uses no CPU, so only the wall-clock timeout can end it
+        blocker = asyncio.get_running_loop().run_in_executor(stuck, time.sleep, 60)
+        timed_out = await srv.extract_page(PAGE, "https://example.com")
+        await asyncio.gather(blocker, return_exceptions=True)
+        for worker in workers:
+            worker.join(5)
+        text, _ = await srv.extract_page(PAGE, "https://example.com")
+        return timed_out, stuck, workers, text
+
+    timed_out, stuck, workers, text = asyncio.run(run())
+    assert timed_out == ("", {})
+    assert srv._extract_pool is not stuck and not any(w.is_alive() for w in workers)
+    assert "readable sentence" in text
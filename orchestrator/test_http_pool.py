@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import httpx
+
+import orchestrator.server as srv
+
+
+def test_clients_are_reused_and_closed():
+    pool = srv.HttpPool()
+
+    async def run():
+        first = pool.page_client()
+        assert pool.page_client() is first
+        assert pool.search_client() is pool.search_client()
+        await pool.aclose()
+        assert pool.page_client() is not first
+        await pool.aclose()
+
+    asyncio.run(run())
+
+
+def test_host_slots_cap_per_host_concurrency():
+    pool = srv.HttpPool(max_per_host=2, host_delay_ms=0)
+    active = {"a.com": 0, "b.com": 0}
+    peak = {"a.com": 0, "b.com": 0}
+
+    async def hit(host):
+        async with pool.host_slot(f"https://{host}/x"):
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+
+    async def run():
+        await asyncio.gather(*(hit(h) for h in ["a.com", "b.com"] * 5))
+
+    asyncio.run(run())
+    assert peak == {"a.com": 2, "b.com": 2}
+
+
+def test_searx_requests_share_pooled_client(fake_searx, monkeypatch):
+    pool = srv.HttpPool()
+    monkeypatch.setattr(srv, "HTTP_POOL", pool)
+    monkeypatch.setattr(srv, "SEARCH_ENGINES", ["bing"])
+
+    async def run():
+        first = await srv.searx_top_links("alpha", 3)
+        client = pool.search_client()
+        second = await srv.searx_top_links("beta", 3)
+        assert pool.search_client() is client
+        await pool.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [r["title"] for r in first] == ["alpha 0", "alpha 1", "alpha 2"]
+    assert second[0]["source_query"] == "beta"
+    assert fake_searx.requests == [("alpha", "bing"), ("beta", "bing")]
+
+
+def test_aimd_limit_halves_on_overload_and_recovers():
+    limiter = srv.AimdLimiter(8, minimum=2, latency_target=1.0, cooldown=60)
+    assert limiter.record(0.1) is False and limiter.limit == 8
+    assert limiter.record(None, overloaded=True) is True and limiter.limit == 4
+    # A second failure within the cooldown belongs to the same burst
+    assert limiter.record(5.0) is False and limiter.limit == 4
+    for _ in range(40):
+        limiter.record(0.1)
+    assert limiter.limit == 8
+
+
+def test_retry_after_pauses_the_host_and_is_retried(monkeypatch):
+    monkeypatch.setattr(srv, "HTTP_POOL", srv.HttpPool(host_delay_ms=0))
+    monkeypatch.setattr(srv, "EXTRACT_WORKERS", 0)
+    calls = []
+
+    def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        return httpx.Response(200, html="<html><body><p>" + "Recovered page text. " * 20 + "</p></body></html>")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            text, _ = await srv.fetch_page_with_metadata("https://busy.example/a", client)
+            return text, srv.HTTP_POOL.stats()
+
+    text, stats = asyncio.run(run())
+    assert "Recovered page text" in text
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.95
+    # Halved by the 429, then one additive step back up after the retry succeeded
+    assert stats["throttled_hosts"] == {"busy.example": 2.5}
+
+
+def test_long_retry_after_is_not_waited_for(monkeypatch):
+    monkeypatch.setattr(srv, "FETCH_RETRY_AFTER_MAX_S", 0.2)
+    monkeypatch.setattr(srv, "HTTP_POOL", srv.HttpPool(host_delay_ms=0))
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503, headers={"Retry-After": "30"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await srv.fetch_page_with_metadata("https://busy.example/a", client)
+
+    text, _ = asyncio.run(run())
+    assert text == "" and len(calls) == 1
+
+
+def test_host_starts_are_spaced_by_politeness_delay():
+    pool = srv.HttpPool(host_delay_ms=50)
+    starts = []
+
+    async def hit():
+        async with pool.host_slot("https://polite.example/x"):
+            starts.append(time.monotonic())
+
+    async def run():
+        await asyncio.gather(*(hit() for _ in range(3)))
+
+    asyncio.run(run())
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert min(gaps) >= 0.045
+
+
+def test_search_slots_respect_rate_cap():
+    pool = srv.HttpPool(searx_rate="2/0.3")
+    starts = []
+
+    async def search():
+        async with pool.search_slot():
+            starts.append(time.monotonic())
+
+    async def run():
+        await asyncio.gather(*(search() for _ in range(3)))
+
+    asyncio.run(run())
+    assert starts[2] - starts[0] >= 0.29
+
+
+def test_searx_429_pauses_searches_without_blaming_the_engine(fake_searx, monkeypatch):
+    monkeypatch.setattr(srv, "HTTP_POOL", srv.HttpPool())
+    monkeypatch.setattr(srv, "ENGINE_SCOREBOARD", srv.EngineScoreboard())
+    fake_searx.status = 429
+
+    async def run():
+        return await srv._searx_engine("alpha", "bing", 3)
+
+    assert asyncio.run(run()) is None
+    assert srv.ENGINE_SCOREBOARD._get("bing")["failures"] == 0
+
+
+def test_retry_after_parsing():
+    assert srv._retry_after_seconds("7") == 7.0
+    assert srv._retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert srv._retry_after_seconds("soon") is None
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+import orchestrator.server as srv
+
+
+class TopicModel:
+    """Puts the 'merges' document on its own axis, far from every query."""
+
+    def encode(self, texts):
+        return np.array([[0.0, 1.0] if "merges" in t else [1.0, 0.0] for t in texts])
+
+
+@pytest.fixture(params=["qdrant", "local"])
+def store(request, monkeypatch, tmp_path):
+    if request.param == "qdrant":
+        store = srv.QdrantStore(QdrantClient(":memory:"))
+    else:
+        store = srv.LocalVectorStore(str(tmp_path))
+    store.bootstrap(2)
+    monkeypatch.setattr(srv, "_vector_store", store)
+    monkeypatch.setattr(srv, "_embedder", srv.EmbeddingService(TopicModel))
+    monkeypatch.setattr(srv, "RAG_CACHE", srv.RagCache(100, 1 << 20, 60))
+    docs = [
+        {"text": f"General note {i} about search engines and ranking.", "metadata": {"url": f"https://n{i}.com"}}
+        for i in range(20)
+    ]
+    docs.append({"text": "Reciprocal rank fusion merges zebrafish rankings.", "metadata": {"url": "https://z.com"}})
+    asyncio.run(srv._upsert_texts(docs))
+    yield store
+    srv._embedder.close()
+    store.close()
+
+
+def test_bm25_weights():
+    doc = srv._bm25_document("The cat sat on the cat mat")
+    cat, mat = srv._bm25_term_id("cat"), srv._bm25_term_id("mat")
+    assert srv._bm25_term_id("the") not in doc
+    assert doc[cat] > doc[mat] > 0
+    assert srv._bm25_query("The CAT") == {cat: 1.0}
+
+
+def test_sparse_branch_finds_what_dense_search_misses(store, monkeypatch):
+    (hybrid,) = asyncio.run(srv._rag_search_many(["zebrafish"], 3))
+    found = [m for m in hybrid if "zebrafish" in m["text"]]
+    assert len(found) == 1
+    # Ranked by the fusion, with the dense cosine kept alongside
+    assert found[0]["similarity"] == pytest.approx(0.0) and found[0]["score"] > 0.9
+    assert all(m["similarity"] == pytest.approx(1.0) for m in hybrid if m is not found[0])
+    assert isinstance(found[0]["metadata"]["fetched_at"], float)
+
+    monkeypatch.setattr(srv, "HYBRID_SEARCH", False)
+    (dense,) = asyncio.run(srv._rag_search_many(["zebrafish"], 3))
+    assert len(dense) == 3
+    assert not any("zebrafish" in m["text"] for m in dense)
+
+
+def test_sparse_only_hit_survives_dedup(monkeypatch):
+    monkeypatch.setattr(srv, "HYBRID_SEARCH", True)
+    rrf = lambda *ranks: sum(1 / (srv.RRF_K + r) for r in ranks)  # noqa: E731
+
+    def point(name, vector, score):
+        return SimpleNamespace(id=name, score=score, vector=vector, payload={"text": name, "domain": f"{name}.com"})
+
+    # Fused order: d1 was ranked by both branches, s only by BM25 (first),
+    # d2 and d3 only by dense search
+    points = [
+        point("d1", [1.0, 0.0, 0.0, 0.0], rrf(1, 2)),
+        point("s", [0.05, 0.0, 0.0, 1.0], rrf(1)),
+        point("d2", [0.7, 0.7, 0.0, 0.0], rrf(2)),
+        point("d3", [0.7, 0.0, 0.7, 0.0], rrf(3)),
+    ]
+    matches = srv._matches_from_results(np.array([1.0, 0.0, 0.0, 0.0]), points)
+    assert matches[1]["similarity"] < 0.1
+    kept = [m["text"] for m in srv._deduplicate_chunks(matches, 2)]
+    assert kept == ["d1", "s"]
+
+    monkeypatch.setattr(srv, "HYBRID_SEARCH", False)
+    matches = srv._matches_from_results(np.array([1.0, 0.0, 0.0, 0.0]), points)
+    assert "s" not in [m["text"] for m in srv._deduplicate_chunks(matches, 2)]
+
+
+def test_off_topic_query_does_not_score_like_an_on_topic_one(monkeypatch):
+    monkeypatch.setattr(srv, "HYBRID_SEARCH", True)
+    rrf = lambda *ranks: sum(1 / (srv.RRF_K + r) for r in ranks)  # noqa: E731
+
+    def point(name, vector, score):
+        return SimpleNamespace(id=name, score=score, vector=vector, payload={"text": name, "domain": f"{name}.com"})
+
+    query = np.array([1.0, 0.0, 0.0, 0.0])
+    on_topic = srv._matches_from_results(query, [point("on", [1.0, 0.1, 0.0, 0.0], rrf(1, 1))])
+    off_topic = srv._matches_from_results(query, [point("off", [0.1, 1.0, 0.0, 0.0], rrf(1, 1))])
+    assert on_topic[0]["score"] > 0.9
+    assert off_topic[0]["score"] < 0.2
+
+    kept = srv._deduplicate_chunks(off_topic + on_topic, 1)
+    assert [m["text"] for m in kept] == ["on"]
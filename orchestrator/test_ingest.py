@@ -0,0 +1,131 @@
+import asyncio
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import orchestrator.ingest_files as ing
+import orchestrator.server as srv
+
+
+class HashModel:
+    def encode(self, texts):
+        return np.array([[float(len(t) % 7) + 1.0, 1.0, float(len(t) % 3)] for t in texts])
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = srv.LocalVectorStore(str(tmp_path / "vectors"))
+    store.bootstrap(3)
+    monkeypatch.setattr(srv, "_vector_store", store)
+    monkeypatch.setattr(srv, "_embedder", srv.EmbeddingService(HashModel))
+    yield store
+    srv._embedder.close()
+    store.close()
+
+
+def _corpus(root):
+    (root / "sub" / ".git").mkdir(parents=True)
+    (root / "a.md").write_text("# Alpha\n\n" + "Alpha sentence about vectors. " * 40)
+    (root / "sub" / "b.txt").write_text("Bravo plain text file.")
+    (root / "sub" / "c.html").write_text(
+        "<html><head><title>Charlie</title></head><body><p>" + "Charlie page body text. " * 30 + "</p></body></html>"
+    )
+    (root / "sub" / "ignored.bin").write_bytes(b"\x00\x01")
+    (root / "sub" / ".git" / "config.txt").write_text("hidden")
+
+
+def _run(root, tmp_path, **kwargs):
+    return asyncio.run(
+        ing.ingest([str(root)], workers=2, batch_size=8, manifest_path=str(tmp_path / "manifest.sqlite3"),
+                   progress_every=0, **kwargs)
+    )
+
+
+def test_ingest_walks_chunks_and_upserts(tmp_path, store):
+    root = tmp_path / "docs"
+    _corpus(root)
+    summary = _run(root, tmp_path)
+    assert summary["files"] == 3 and summary["ingested"] == 3 and summary["failed"] == 0
+    assert summary["chunks"] == store.count() > 3
+    hits = store.search(np.array([[1.0, 1.0, 0.0]]), [srv._bm25_query("charlie page")], 50)[0]
+    charlie = [h for h in hits if h.payload["path"].endswith("c.html")]
+    assert charlie and charlie[0].payload["title"] == "Charlie" and charlie[0].payload["pinned"]
+    assert "files_per_s" in summary and "chunks_per_s" in summary
+
+
+def test_rerun_skips_unchanged_and_drops_stale_chunks(tmp_path, store):
+    root = tmp_path / "docs"
+    _corpus(root)
+    _run(root, tmp_path)
+    assert _run(root, tmp_path)["skipped"] == 3
+
+    (root / "a.md").write_text("Short now.")
+    summary = _run(root, tmp_path)
+    assert summary["ingested"] == 1 and summary["skipped"] == 2
+    a_chunks = [
+        h for per_query in store.search(np.eye(3), [{}] * 3, 1000) for h in per_query
+        if h.payload["path"].endswith("a.md")
+    ]
+    assert {h.payload["text"] for h in a_chunks} == {"Short now."}
+
+
+def test_pinned_documents_survive_maintenance(tmp_path, store):
+    root = tmp_path / "docs"
+    _corpus(root)
+    _run(root, tmp_path)
+    count = store.count()
+    result = srv.run_maintenance(store, ttl_days=1e-9, max_points=1)
+    assert result["expired"] == 0 and result["evicted"] == 0 and store.count() == count
+
+
+def _chunks_of(store, name):
+    return list({
+        h.id: h for per_query in store.search(np.eye(3), [{}] * 3, 10000) for h in per_query
+        if h.payload["path"].endswith(name)
+    }.values())
+
+
+def test_long_documents_are_not_held_to_the_page_cap(tmp_path, store):
+    root = tmp_path / "docs"
+    root.mkdir()
+    text = " ".join(f"Sentence number {i} of a long local manual." for i in range(2000))
+    (root / "long.txt").write_text(text)
+    summary = _run(root, tmp_path)
+    chunks = {h.payload["chunk_index"]: h.payload for h in _chunks_of(store, "long.txt")}
+    assert summary["chunks"] == len(chunks) > srv.MAX_CHUNKS_PER_PAGE
+    assert summary["truncated"] == 0
+    assert "Sentence number 1999 " in chunks[max(chunks)]["text"]
+    assert {p["chunk_count"] for p in chunks.values()} == {len(chunks)}
+
+
+def test_max_chunks_truncates_and_reports(tmp_path, store, capsys):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "long.txt").write_text(" ".join(f"Sentence number {i} of a long local manual." for i in range(500)))
+    (root / "short.txt").write_text("Fits in one chunk.")
+    summary = _run(root, tmp_path, max_chunks=5)
+    assert summary["truncated"] == 1 and summary["chunks"] == 6
+    assert {h.payload["chunk_count"] for h in _chunks_of(store, "long.txt")} == {5}
+    assert "Truncated" in capsys.readouterr().err
+
+
+def test_deleted_files_are_purged(tmp_path, store):
+    root = tmp_path / "docs"
+    _corpus(root)
+    _run(root, tmp_path)
+    a_chunks = len(_chunks_of(store, "a.md"))
+    count = store.count()
+    (root / "a.md").unlink()
+    summary = _run(root, tmp_path)
+    assert summary["removed"] == 1 and summary["skipped"] == 2
+    assert store.count() == count - a_chunks and not _chunks_of(store, "a.md")
+    manifest = ing.Manifest(str(tmp_path / "manifest.sqlite3"))
+    assert sorted(Path(p).name for p, _ in manifest.items()) == ["b.txt", "c.html"]
+    manifest.close()
+    # Another tree's entries are not touched by an ingest of this one
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "x.txt").write_text("Unrelated.")
+    assert _run(other, tmp_path)["removed"] == 0
+    assert _run(root, tmp_path)["removed"] == 0
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+import orchestrator.server as srv
+
+
+def _points(vectors, prefix="p"):
+    return [
+        {"id": f"{prefix}{i}", "vector": v, "sparse": {}, "payload": {"text": f"{prefix}{i}", "n": i}}
+        for i, v in enumerate(vectors)
+    ]
+
+
+def _random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.fixture(autouse=True)
+def dense_only(monkeypatch):
+    monkeypatch.setattr(srv, "HYBRID_SEARCH", False)
+
+
+def _texts(store, query, k):
+    return [hit.payload["text"] for hit in store.search(np.asarray([query]), [{}], k)[0]]
+
+
+def test_brute_force_matches_exact_cosine(tmp_path):
+    vectors = _random_vectors(3000)
+    store = srv.LocalVectorStore(str(tmp_path))
+    store.bootstrap(16)
+    store.upsert(_points(vectors))
+    query = vectors[42] + 0.1
+    hits = store.search(np.asarray([query]), [{}], 5)[0]
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normed @ (query / np.linalg.norm(query))))[:5]
+    assert [h.payload["n"] for h in hits] == expected.tolist()
+    assert hits[0].score == pytest.approx(float(np.max(normed @ (query / np.linalg.norm(query)))), rel=1e-5)
+    assert len(hits[0].vector) == 16
+    store.close()
+
+
+def test_store_persists_and_overwrites_by_id(tmp_path):
+    store = srv.LocalVectorStore(str(tmp_path))
+    store.bootstrap(4)
+    store.upsert(_points(np.eye(4)))
+    store.upsert([{"id": "p0", "vector": np.array([0, 1.0, 0, 0]), "sparse": {}, "payload": {"text": "moved"}}])
+    store.close()
+
+    reopened = srv.LocalVectorStore(str(tmp_path))
+    reopened.bootstrap(4)
+    assert _texts(reopened, [1.0, 0, 0, 0], 1) != ["p0"]
+    assert set(_texts(reopened, [0, 1.0, 0, 0], 2)) == {"p1", "moved"}
+    assert len(reopened._ids) == 4
+    reopened.close()
+
+
+def test_layout_change_is_an_error_and_keeps_the_data(tmp_path):
+    store = srv.LocalVectorStore(str(tmp_path))
+    store.bootstrap(4)
+    store.upsert(_points(np.eye(4)))
+    store.close()
+    with pytest.raises(RuntimeError, match="LOCAL_STORE_PATH"):
+        srv.LocalVectorStore(str(tmp_path)).bootstrap(8)
+    reopened = srv.LocalVectorStore(str(tmp_path))
+    reopened.bootstrap(4)
+    assert reopened.count() == 4
+    reopened.close()
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class Partial(srv.VectorStore):
+        def bootstrap(self, dim):
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        Partial()
+
+
+def test_int8_storage_keeps_ranking(tmp_path):
+    vectors = _random_vectors(500)
+    store = srv.LocalVectorStore(str(tmp_path), dtype="int8")
+    store.bootstrap(16)
+    store.upsert(_points(vectors))
+    assert _texts(store, vectors[7], 1) == ["p7"]
+    assert (tmp_path / "vectors.bin").stat().st_size == store._vectors.shape[0] * 16
+    store.close()
+
+
+def test_ivf_index_finds_near_neighbours(tmp_path):
+    vectors = _random_vectors(4000, seed=1)
+    store = srv.LocalVectorStore(str(tmp_path), ivf_lists=16, ivf_probes=4)
+    store.bootstrap(16)
+    store.upsert(_points(vectors))
+    hits = 0
+    for i in range(0, 4000, 200):
+        hits += _texts(store, vectors[i], 1) == [f"p{i}"]
+    assert store._centroids is not None
+    assert hits >= 18
+    store.close()
+
+
+def test_rrf_fuse_rewards_agreement():
+    fused = srv._rrf_fuse([[1, 2, 3], [3, 4]])
+    assert fused[0][0] == 3
+    assert {key for key, _ in fused} == {1, 2, 3, 4}
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+import orchestrator.server as srv
+
+DAY = 86400
+
+
+def _point(i, age_days, last_hit_days=None):
+    fetched = time.time() - age_days * DAY
+    last_hit = fetched if last_hit_days is None else time.time() - last_hit_days * DAY
+    vector = np.zeros(4)
+    vector[i % 4] = 1.0
+    return {
+        "id": srv._point_id(f"https://p{i}.com"),
+        "vector": vector,
+        "sparse": srv._bm25_document(f"page number {i}"),
+        "payload": {"text": f"p{i}", "fetched_at": fetched, "last_hit_at": last_hit},
+    }
+
+
+@pytest.fixture(params=["qdrant", "local"])
+def store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(srv, "_pending_hits", {})
+    store = srv.QdrantStore(QdrantClient(":memory:")) if request.param == "qdrant" else srv.LocalVectorStore(str(tmp_path))
+    store.bootstrap(4)
+    yield store
+    store.close()
+
+
+def _texts(store):
+    hits = store.search(np.eye(4), [{}] * 4, 10)
+    return sorted({h.payload["text"] for per_query in hits for h in per_query})
+
+
+def test_expired_points_are_deleted(store):
+    store.upsert([_point(0, 1), _point(1, 20), _point(2, 3), _point(3, 40)])
+    result = srv.run_maintenance(store, ttl_days=10, max_points=0)
+    assert result == {"before": 4, "expired": 2, "evicted": 0, "after": 2, "pages_pruned": 0}
+    assert _texts(store) == ["p0", "p2"]
+
+
+def test_lru_eviction_prefers_recent_hits(store):
+    store.upsert([_point(i, 1, last_hit_days=1) for i in range(4)])
+    srv._pending_hits[srv._point_id("https://p0.com")] = time.time()
+    result = srv.run_maintenance(store, ttl_days=0, max_points=2)
+    assert result["evicted"] == 2 and result["after"] == 2
+    assert "p0" in _texts(store)
+    assert srv._pending_hits == {}
+
+
+def test_searches_record_hits(store, monkeypatch):
+    class Model:
+        def encode(self, texts):
+            return np.tile([1.0, 0, 0, 0], (len(texts), 1))
+
+    monkeypatch.setattr(srv, "_vector_store", store)
+    monkeypatch.setattr(srv, "_embedder", srv.EmbeddingService(Model))
+    store.upsert([_point(0, 1)])
+    (matches,) = asyncio.run(srv._rag_search_many(["page"], 3))
+    srv._embedder.close()
+    assert str(matches[0]["id"]) == srv._point_id("https://p0.com")
+    assert list(map(str, srv._pending_hits)) == [srv._point_id("https://p0.com")]
+
+
+def test_local_compaction_shrinks_and_survives_reopen(tmp_path):
+    store = srv.LocalVectorStore(str(tmp_path))
+    store.bootstrap(4)
+    store.upsert([_point(i, 30 if i % 3 else 1) for i in range(3000)])
+    size_before = (tmp_path / "vectors.bin").stat().st_size
+    result = srv.run_maintenance(store, ttl_days=10, max_points=0)
+    assert result["after"] == 1000
+    assert store._rows == 1000
+    assert (tmp_path / "vectors.bin").stat().st_size < size_before
+    store.close()
+
+    reopened = srv.LocalVectorStore(str(tmp_path))
+    reopened.bootstrap(None)
+    assert reopened.count() == 1000
+    hits = reopened.search(np.array([[1.0, 0, 0, 0]]), [srv._bm25_query("page")], 5)[0]
+    assert hits and all(int(h.payload["text"][1:]) % 3 == 0 for h in hits)
+    reopened.close()
+
+
+def test_cli_runs_against_local_store(tmp_path, monkeypatch, capsys):
+    store = srv.LocalVectorStore(str(tmp_path))
+    store.bootstrap(4)
+    store.upsert([_point(0, 1), _point(1, 20)])
+    store.close()
+    monkeypatch.setattr(srv, "LOCAL_STORE_PATH", str(tmp_path))
+    srv.maintenance_cli(["--store", "local", "--ttl-days", "10"])
+    assert json.loads(capsys.readouterr().out.strip().splitlines()[-1])["expired"] == 1
+
+
+def test_pinned_points_are_never_removed(store):
+    pinned = _point(1, 400)
+    pinned["payload"]["pinned"] = True
+    store.upsert([_point(0, 400), pinned, _point(2, 1)])
+    result = srv.run_maintenance(store, ttl_days=10, max_points=1)
+    assert result["expired"] == 1 and result["evicted"] == 0
+    assert _texts(store) == ["p1", "p2"]
+
+
+def test_points_without_last_hit_are_evicted_oldest_first(store):
+    old = [_point(i, 30 - i) for i in range(3)]
+    for p in old:
+        del p["payload"]["last_hit_at"]  # stored before LRU tracking
+    store.upsert(old + [_point(3, 1)])
+    result = srv.run_maintenance(store, ttl_days=0, max_points=2)
+    assert result["evicted"] == 2
+    assert _texts(store) == ["p2", "p3"]
+
+
+def test_loop_clears_result_caches_on_the_event_loop(store, monkeypatch):
+    cleared = []
+
+    class Cache:
+        def clear(self):
+            cleared.append(threading.get_ident())
+
+    class Ready:
+        async def wait(self):
+            pass
+
+    async def stop(_):
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(srv, "_vector_store", store)
+    monkeypatch.setattr(srv, "STARTUP", Ready())
+    monkeypatch.setattr(srv, "RAG_CACHE", Cache())
+    monkeypatch.setattr(srv, "SEMANTIC_CACHE", Cache())
+    monkeypatch.setattr(srv, "WEB_CACHE_TTL_DAYS", 10)
+    monkeypatch.setattr(srv.asyncio, "sleep", stop)
+    store.upsert([_point(0, 1), _point(1, 20)])
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(srv._maintenance_loop())
+    assert store.count() == 1
+    assert cleared == [threading.get_ident()] * 2
+
+
+def test_hits_are_not_recorded_without_maintenance(monkeypatch):
+    monkeypatch.setattr(srv, "_pending_hits", {})
+    monkeypatch.setattr(srv, "MAINTENANCE_INTERVAL_S", 0)
+    srv._record_hits([srv.LocalHit("a", 1.0, {}, [])])
+    assert srv._pending_hits == {}
+    monkeypatch.setattr(srv, "MAINTENANCE_INTERVAL_S", 60)
+    monkeypatch.setattr(srv, "PENDING_HITS_MAX", 1)
+    srv._record_hits([srv.LocalHit("a", 1.0, {}, []), srv.LocalHit("b", 1.0, {}, [])])
+    assert list(srv._pending_hits) == ["a"]
+
+
+class _FourDims:
+    def encode(self, texts):
+        return np.array([[1.0, float(len(t) % 5), 0.0, 1.0] for t in texts])
+
+
+def test_shorter_refetch_drops_the_extra_chunks(store, monkeypatch):
+    monkeypatch.setattr(srv, "_vector_store", store)
+    monkeypatch.setattr(srv, "_embedder", srv.EmbeddingService(_FourDims))
+    meta = {"url": "https://shrinking.com/a", "domain": "shrinking.com"}
+    other = {"url": "https://other.com/b", "domain": "other.com"}
+    long_text = " ".join(f"Sentence {i} about a page that later shrinks." for i in range(60))
+
+    async def ingest(*docs):
+        await srv._upsert_texts(srv._chunk_documents([{"text": t, "metadata": m} for t, m in docs]))
+
+    try:
+        asyncio.run(ingest((long_text, meta), (long_text, other)))
+        before = store.count()
+        asyncio.run(ingest(("Now it is a single sentence.", meta)))
+    finally:
+        srv._embedder.close()
+    per_page = before // 2
+    assert per_page > 1 and store.count() == per_page + 1
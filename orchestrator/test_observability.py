@@ -0,0 +1,67 @@
+import asyncio
+import json
+import logging
+
+import httpx
+
+import orchestrator.server as srv
+from orchestrator.test_rag_search import _install_fakes
+
+
+def _rag_query(**arguments):
+    out = asyncio.run(srv.rag_query("rag_query", {"query": "alpha", **arguments}))
+    return json.loads(out[0].text)
+
+
+def test_spans_are_free_when_disabled(monkeypatch):
+    monkeypatch.setattr(srv, "METRICS", srv.Metrics(enabled=False))
+    assert srv.span("fetch") is srv._NO_SPAN
+    srv.METRICS.inc("gabesearch_fetches", outcome="ok")
+    assert "gabesearch_fetches_total" not in srv.METRICS.render()
+
+
+def test_traced_call_returns_stage_breakdown(monkeypatch):
+    _install_fakes(monkeypatch)
+    body = _rag_query(trace=True)
+    assert {"embed", "vector_search", "dedup", "total"} <= set(body["timings_ms"])
+    assert body["timings_ms"]["total"] >= body["timings_ms"]["embed"]
+    assert "timings_ms" not in _rag_query()
+
+
+def test_metrics_endpoint_serves_openmetrics(monkeypatch):
+    _install_fakes(monkeypatch)
+    monkeypatch.setattr(srv, "METRICS", srv.Metrics(enabled=True))
+    _rag_query()
+    _rag_query()
+    httpd = srv.start_metrics_server(0, "127.0.0.1")
+    try:
+        r = httpx.get(f"http://127.0.0.1:{httpd.server_address[1]}/metrics")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert r.headers["content-type"].startswith("application/openmetrics-text")
+    text = r.text
+    assert text.endswith("# EOF\n")
+    assert 'gabesearch_tool_calls_total{outcome="ok",tool="rag_query"} 2' in text
+    assert 'gabesearch_cache_requests_total{cache="rag",result="hit"} 1' in text
+    assert 'gabesearch_stage_seconds_count{stage="vector_search"} 1' in text
+    assert 'gabesearch_embed_batch_size_bucket{le="1"} 1' in text
+
+
+def test_engine_health_and_http_limits_are_gauges(monkeypatch):
+    monkeypatch.setattr(srv, "ENGINE_SCOREBOARD", srv.EngineScoreboard())
+    monkeypatch.setattr(srv, "METRICS", srv.Metrics(enabled=True))
+    srv.ENGINE_SCOREBOARD.record_success("duckduckgo", 0.25)
+    srv.ENGINE_SCOREBOARD.record_failure("bing", 1.0, "captcha", blocked=True)
+    text = srv.METRICS.render(srv._runtime_gauges())
+    assert "# TYPE gabesearch_engine_success_rate gauge" in text
+    assert 'gabesearch_engine_latency_seconds{engine="duckduckgo"} 0.25' in text
+    assert 'gabesearch_engine_cooldown_seconds{engine="bing"} 0' not in text
+    assert f'gabesearch_http_limit{{scope="fetch"}} {srv.HTTP_POOL.stats()["fetch_limit"]:g}' in text
+    assert "gabesearch_fetches_in_flight 0" in text
+
+
+def test_json_log_lines_keep_structured_fields():
+    record = logging.makeLogRecord({"msg": "rag_query ok", "levelname": "INFO", "duration_ms": 12.5})
+    line = json.loads(srv._JsonLogFormatter().format(record))
+    assert line["msg"] == "rag_query ok" and line["level"] == "info" and line["duration_ms"] == 12.5
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import orchestrator.server as srv
+from orchestrator.test_rag_search import _install_fakes
+
+
+def _match(url, text, confidence):
+    return {
+        "text": text,
+        "score": confidence,
+        "confidence": confidence,
+        "metadata": {"url": url, "title": f"Title of {url}", "domain": url.split("/")[2]},
+    }
+
+
+MATCHES = [
+    _match("https://a.com/1", "alpha " * 40, 0.9),
+    _match("https://b.com/1", "beta " * 40, 0.8),
+    _match("https://a.com/1", "second alpha " * 20, 0.7),
+    _match("https://c.com/1", "gamma " * 200, 0.6),
+    _match("https://d.com/1", "delta", 0.5),
+]
+
+
+def test_chunks_are_grouped_by_source_in_confidence_order():
+    body = json.loads(srv.pack_response({"query": "q"}, list(reversed(MATCHES)), 100000, "compact"))
+    assert [s["url"] for s in body["sources"]] == ["https://a.com/1", "https://b.com/1", "https://c.com/1", "https://d.com/1"]
+    assert [s["id"] for s in body["sources"]] == [1, 2, 3, 4]
+    assert [c["confidence"] for c in body["sources"][0]["chunks"]] == [0.9, 0.7]
+    assert body["packing"]["packed"] == body["packing"]["chunks"] == 5
+    assert body["packing"]["tokens_saved_est"] > 0
+
+
+def test_budget_is_enforced_and_filled_with_smaller_chunks():
+    for fmt in srv.RESPONSE_FORMATS:
+        text = srv.pack_response({"query": "q"}, MATCHES, 1300, fmt)
+        assert len(text) <= 1300
+    body = json.loads(srv.pack_response({"query": "q"}, MATCHES, 1300, "compact"))
+    urls = [s["url"] for s in body["sources"]]
+    # The oversized gamma chunk is skipped, the small delta chunk still fits
+    assert "https://c.com/1" not in urls and "https://d.com/1" in urls
+    assert body["packing"]["packed"] < body["packing"]["chunks"]
+
+
+def test_text_format_is_citation_numbered():
+    text = srv.pack_response({"query": "q", "partial": False}, MATCHES[:3], 0, "text")
+    lines = text.splitlines()
+    assert lines[0].startswith("Results for: q (")
+    assert lines[1] == "[1] Title of https://a.com/1 <https://a.com/1>"
+    assert lines[2].startswith("- alpha") and lines[3].startswith("- second alpha")
+    assert lines[4].startswith("[2] Title of https://b.com/1")
+
+
+def test_tool_honours_format_and_max_tokens(monkeypatch):
+    _install_fakes(monkeypatch)
+    out = asyncio.run(srv.rag_query("rag_query", {"query": "alpha", "format": "text", "max_tokens": 50}))
+    text = out[0].text
+    assert text.startswith("Results for: alpha") and len(text) <= 50 * srv.CHARS_PER_TOKEN
+
+
+def test_packing_chars_is_the_length_of_the_response():
+    for budget in (0, 1300, 5000):
+        text = srv.pack_response({"query": "q"}, MATCHES, budget, "compact")
+        assert json.loads(text)["packing"]["chars"] == len(text)
+
+
+def test_legacy_format_keeps_the_old_layout():
+    body = json.loads(srv.pack_response({"query": "q", "partial": False}, MATCHES, 0, "legacy"))
+    assert list(body)[:3] == ["query", "chunks", "total_chunks"] and "packing" not in body
+    assert body["total_chunks"] == len(body["chunks"]) == 5
+    assert set(body["chunks"][0]) == {"text", "title", "url", "domain", "score", "confidence"}
+    body = json.loads(srv.pack_response({"query": "q"}, MATCHES, 1500, "legacy"))
+    # Over budget, the lowest-confidence chunks go first
+    assert [c["confidence"] for c in body["chunks"]] == [0.9, 0.8, 0.7]
+
+
+def test_max_chars_cannot_raise_the_total_budget(monkeypatch):
+    monkeypatch.setattr(srv, "TOTAL_CHARS", 1000)
+    assert srv._packing_options({"max_chars": 50000})[0] == 1000
+    assert srv._packing_options({"max_chars": 400, "max_tokens": 50})[0] == 200
+    monkeypatch.setattr(srv, "TOTAL_CHARS", 0)
+    assert srv._packing_options({"max_chars": 50000})[0] == 50000
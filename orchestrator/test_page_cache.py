@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import httpx
+
+import orchestrator.server as srv
+
+HTML = "<html><head><title>T</title></head><body><p>" + "Body text. " * 50 + "</p></body></html>"
+
+
+def _client(requests, status=200):
+    def handler(request):
+        requests.append(request)
+        if status == 304:
+            return httpx.Response(304)
+        return httpx.Response(200, html=HTML, headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def _fetch(url, client):
+    async def run():
+        async with client:
+            return await srv.fetch_page_with_metadata(url, client)
+
+    return asyncio.run(run())
+
+
+def test_fresh_entry_skips_network(tmp_path, monkeypatch):
+    monkeypatch.setattr(srv, "PAGE_STORE", srv.PageStore(str(tmp_path / "cache.sqlite3")))
+    requests = []
+    text, meta = _fetch("https://example.com/a", _client(requests))
+    assert text and meta["page_cache"] == "miss"
+    text2, meta2 = _fetch("https://EXAMPLE.com/a/?utm_source=x", _client(requests))
+    assert text2 == text and meta2["page_cache"] == "hit"
+    assert len(requests) == 1
+
+
+def test_stale_entry_revalidated_with_conditional_get(tmp_path, monkeypatch):
+    store = srv.PageStore(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(srv, "PAGE_STORE", store)
+    requests = []
+    text, _ = _fetch("https://example.com/a", _client(requests))
+
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + (srv.WEB_CACHE_TTL_DAYS + 1) * 86400)
+    monkeypatch.setattr(srv, "clean_html_with_metadata", lambda *a: (_ for _ in ()).throw(AssertionError("re-extracted")))
+    text2, meta2 = _fetch("https://example.com/a", _client(requests, status=304))
+
+    assert text2 == text and meta2["page_cache"] == "revalidated"
+    assert requests[-1].headers["If-None-Match"] == '"v1"'
+    assert requests[-1].headers["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert store.get("https://example.com/a")["fetched_at"] > real_time() + 86400
+
+
+def test_cache_disabled(monkeypatch):
+    monkeypatch.setattr(srv, "PAGE_STORE", None)
+    requests = []
+    _fetch("https://example.com/a", _client(requests))
+    _fetch("https://example.com/a", _client(requests))
+    assert len(requests) == 2
+
+
+def test_same_text_after_full_download_is_unchanged(tmp_path, monkeypatch):
+    store = srv.PageStore(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(srv, "PAGE_STORE", store)
+    requests = []
+    _fetch("https://example.com/a", _client(requests))
+    real_time = time.time
+    # Stale, and the server ignores the validators
+    monkeypatch.setattr(time, "time", lambda: real_time() + (srv.WEB_CACHE_TTL_DAYS + 1) * 86400)
+    _, meta = _fetch("https://example.com/a", _client(requests))
+    assert len(requests) == 2 and meta["page_cache"] == "unchanged"
+
+
+def test_prune_drops_old_and_excess_pages(tmp_path, monkeypatch):
+    store = srv.PageStore(str(tmp_path / "cache.sqlite3"))
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    for i in range(5):
+        store.put(f"https://example.com/{i}", f"page {i}", {})
+        now[0] += 86400
+    assert store.prune(max_age_days=2.5, max_pages=0) == 3
+    assert store.prune(max_age_days=0, max_pages=1) == 1
+    assert store.get("https://example.com/4") is not None and store.get("https://example.com/3") is None
+    store.close()
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import orchestrator.server as srv
+
+SENTENCES = " ".join(f"Sentence {i} of the page body goes here." for i in range(40))
+
+
+def _install(monkeypatch, search_delay, fetch_delay=0.01, embed_delay=0.0):
+    events = []
+    start = time.perf_counter()
+
+    def mark(kind, what):
+        events.append((time.perf_counter() - start, kind, what))
+
+    async def fake_search(query, k):
+        await asyncio.sleep(search_delay[query])
+        mark("search", query)
+        return [
+            {"title": f"{query} {i}", "url": f"https://{query}{i}.example/p", "domain": f"{query}{i}.example",
+             "snippet": "", "engine": "fake"}
+            for i in range(k)
+        ]
+
+    async def fake_fetch(url, client):
+        await asyncio.sleep(fetch_delay)
+        mark("fetch", url)
+        return SENTENCES, {"page_title": url}
+
+    async def fake_upsert(docs):
+        await asyncio.sleep(embed_delay)
+        mark("upsert", len(docs))
+
+    monkeypatch.setattr(srv, "searx_top_links", fake_search)
+    monkeypatch.setattr(srv, "fetch_page_with_metadata", fake_fetch)
+    monkeypatch.setattr(srv, "_upsert_texts", fake_upsert)
+    monkeypatch.setattr(srv, "TOP_K", 3)
+    return events
+
+
+def test_fetches_start_before_slowest_search(monkeypatch):
+    events = _install(monkeypatch, {"fast": 0.0, "slow": 0.3})
+    result = asyncio.run(srv.bulk_retrieve(["fast", "slow"]))
+    slow_done = next(t for t, kind, what in events if kind == "search" and what == "slow")
+    first_fetch = min(t for t, kind, _ in events if kind == "fetch")
+    first_upsert = min(t for t, kind, _ in events if kind == "upsert")
+    assert first_fetch < slow_done
+    assert first_upsert < slow_done
+    assert result["source_count"] == 6
+    assert result["chunks_upserted"] == sum(n for _, kind, n in events if kind == "upsert")
+
+
+def test_micro_batches_respect_batch_size(monkeypatch):
+    events = _install(monkeypatch, {"a": 0.0, "b": 0.0})
+    monkeypatch.setattr(srv, "EMBED_MAX_BATCH", 5)
+    result = asyncio.run(srv.bulk_retrieve(["a", "b"]))
+    sizes = [n for _, kind, n in events if kind == "upsert"]
+    assert len(sizes) > 1 and max(sizes) <= 5
+    assert sum(sizes) == result["chunks_upserted"] > 0
+
+
+def test_duplicate_links_fetched_once(monkeypatch):
+    events = _install(monkeypatch, {"same": 0.0})
+    result = asyncio.run(srv.bulk_retrieve(["same", "same"]))
+    assert result["total_results_found"] == 6
+    assert result["source_count"] == 3
+    assert len([e for e in events if e[1] == "fetch"]) == 3
+
+
+def test_unchanged_pages_only_embed_missing_chunks(monkeypatch):
+    _install(monkeypatch, {"q": 0.0})
+
+    async def cached_fetch(url, client):
+        return SENTENCES, {"page_title": url, "page_cache": "hit"}
+
+    class Stored:
+        # Every chunk of the first page is stored; chunk 0 of the others too
+        def existing(self, ids):
+            first = {d["id"] for d in srv._chunk_documents([{"text": SENTENCES, "metadata": {"url": "https://q0.example/p"}}])}
+            return {i for i in ids if i in first or i in starts}
+
+    starts = {srv._point_id(f"https://q{i}.example/p", 0) for i in range(3)}
+    monkeypatch.setattr(srv, "fetch_page_with_metadata", cached_fetch)
+    monkeypatch.setattr(srv, "_vector_store", Stored())
+    result = asyncio.run(srv.bulk_retrieve(["q"]))
+    per_page = len(srv._chunk_text(SENTENCES))
+    assert result["source_count"] == 3
+    assert result["chunks_upserted"] == 2 * (per_page - 1)
@@ -0,0 +1,72 @@
+import time
+
+from orchestrator.server import RagCache
+
+
+def _matches(url, text="chunk text"):
+    return [
+        {
+            "text": text,
+            "score": 0.5,
+            "vector": [0.1] * 384,
+            "metadata": {"url": url, "domain": "example.com", "text": text * 10},
+        }
+    ]
+
+
+def test_vectors_stripped_and_copies_returned():
+    cache = RagCache(10, 1 << 20, 60)
+    cache.put("q", _matches("https://a"))
+    out = cache.get("  Q ")
+    assert "vector" not in out[0] and "text" not in out[0]["metadata"]
+    out[0]["metadata"]["source_type"] = "other"
+    assert "source_type" not in cache.get("q")[0]["metadata"]
+
+
+def test_lru_eviction_by_count():
+    cache = RagCache(2, 1 << 20, 60)
+    cache.put("a", _matches("https://a"))
+    cache.put("b", _matches("https://b"))
+    cache.get("a")
+    cache.put("c", _matches("https://c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_byte_budget():
+    cache = RagCache(100, 600, 60)
+    for i in range(5):
+        cache.put(f"q{i}", _matches(f"https://{i}", "x" * 200))
+    assert cache.bytes <= 600
+    assert len(cache) < 5
+    assert cache.get("q4") is not None
+
+
+def test_ttl_expiry(monkeypatch):
+    cache = RagCache(10, 1 << 20, 60)
+    cache.put("q", _matches("https://a"))
+    real = time.time()
+    monkeypatch.setattr(time, "time", lambda: real + 61)
+    assert cache.get("q") is None
+    assert cache.expirations == 1 and len(cache) == 0 and cache.bytes == 0
+
+
+def test_invalidate_by_query_and_url():
+    cache = RagCache(10, 1 << 20, 60)
+    cache.put("alpha", _matches("https://a"))
+    cache.put("beta", _matches("https://b"))
+    cache.put("gamma", _matches("https://c"))
+    assert cache.invalidate(queries=["ALPHA"], urls=["https://b"]) == 2
+    assert cache.get("alpha") is None and cache.get("beta") is None
+    assert cache.get("gamma") is not None
+
+
+def test_stats():
+    cache = RagCache(10, 1 << 20, 60)
+    cache.get("q")
+    cache.put("q", _matches("https://a"))
+    cache.get("q")
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+    assert stats["entries"] == 1 and stats["bytes"] > 0
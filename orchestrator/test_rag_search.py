@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+import orchestrator.server as srv
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0, 0.0] for t in texts])
+
+
+class FakeQdrant:
+    def __init__(self):
+        self.batches = []
+
+    def query_batch_points(self, collection_name, requests):
+        self.batches.append(requests)
+        out = []
+        for i, req in enumerate(requests):
+            point = SimpleNamespace(
+                score=0.5,
+                payload={"text": f"hit {i}", "domain": f"d{i}.com", "url": f"https://d{i}.com"},
+                vector=[1.0, float(i), 0.0],
+            )
+            out.append(SimpleNamespace(points=[point]))
+        return out
+
+
+def _install_fakes(monkeypatch):
+    model, client = FakeModel(), FakeQdrant()
+    monkeypatch.setattr(srv, "_embedder", srv.EmbeddingService(lambda: model))
+    monkeypatch.setattr(srv, "_vector_store", srv.QdrantStore(client))
+    monkeypatch.setattr(srv, "RAG_CACHE", srv.RagCache(100, 1 << 20, 60))
+    return model, client
+
+
+def test_batched_search_uses_one_encode_and_one_round_trip(monkeypatch):
+    model, client = _install_fakes(monkeypatch)
+    out = asyncio.run(srv._smart_rag_search_many(["alpha", "beta", "gamma"], 5))
+    assert len(model.calls) == 1 and model.calls[0] == ["alpha", "beta", "gamma"]
+    assert len(client.batches) == 1 and len(client.batches[0]) == 3
+    assert [m[0]["text"] for m in out] == ["hit 0", "hit 1", "hit 2"]
+
+
+def test_batched_search_fans_results_into_cache(monkeypatch):
+    model, client = _install_fakes(monkeypatch)
+    asyncio.run(srv._smart_rag_search_many(["alpha", "beta"], 5))
+    out = asyncio.run(srv._smart_rag_search_many(["beta", "delta", "alpha"], 5))
+    # Only the uncached query is embedded and searched the second time
+    assert model.calls[1] == ["delta"]
+    assert len(client.batches[1]) == 1
+    assert [m[0]["text"] for m in out] == ["hit 1", "hit 0", "hit 0"]
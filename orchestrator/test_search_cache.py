@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import orchestrator.server as srv
+
+
+def _fetcher(calls, delay=0.0):
+    async def fetch(query, k):
+        calls.append(query)
+        await asyncio.sleep(delay)
+        return [{"title": f"{query} {i}", "url": f"https://{i}.example"} for i in range(k)]
+
+    return fetch
+
+
+def test_key_normalizes_case_whitespace_and_engine_order():
+    assert srv.SearchCache.key("  Rust   ASYNC ", ["brave", "bing"]) == srv.SearchCache.key("rust async", ["bing", "brave "])
+    assert srv.SearchCache.key("rust", ["bing"]) != srv.SearchCache.key("rust", ["brave"])
+
+
+def test_hits_within_ttl_and_smaller_k():
+    cache = srv.SearchCache(ttl=60)
+    calls = []
+
+    async def run():
+        first = await cache.get_or_fetch("Rust async", 3, ["bing"], _fetcher(calls))
+        first[0]["source_query"] = "mutated"
+        again = await cache.get_or_fetch("rust  async", 2, ["bing"], _fetcher(calls))
+        return again
+
+    again = asyncio.run(run())
+    assert calls == ["Rust async"]
+    assert len(again) == 2 and "source_query" not in again[0]
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    cache = srv.SearchCache(ttl=60)
+    calls = []
+    asyncio.run(cache.get_or_fetch("q", 3, ["bing"], _fetcher(calls)))
+    real = time.time
+    monkeypatch.setattr(time, "time", lambda: real() + 61)
+    asyncio.run(cache.get_or_fetch("q", 3, ["bing"], _fetcher(calls)))
+    assert calls == ["q", "q"]
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    calls = []
+    asyncio.run(srv.SearchCache(60, path).get_or_fetch("q", 3, ["bing"], _fetcher(calls)))
+    out = asyncio.run(srv.SearchCache(60, path).get_or_fetch("Q", 3, ["bing"], _fetcher(calls)))
+    assert calls == ["q"] and len(out) == 3
+
+
+def test_concurrent_requests_are_coalesced():
+    cache = srv.SearchCache(ttl=60)
+    calls = []
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("q", 3, ["bing"], _fetcher(calls, 0.05)) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == ["q"]
+    assert all(len(r) == 3 for r in results)
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_empty_results_not_cached():
+    cache = srv.SearchCache(ttl=60)
+    calls = []
+
+    async def empty(query, k):
+        calls.append(query)
+        return []
+
+    asyncio.run(cache.get_or_fetch("q", 3, ["bing"], empty))
+    asyncio.run(cache.get_or_fetch("q", 3, ["bing"], empty))
+    assert calls == ["q", "q"]
+
+
+def test_abandoned_request_is_cancelled():
+    cache = srv.SearchCache(ttl=60)
+    calls = []
+
+    async def run():
+        with_timeout = asyncio.wait_for(cache.get_or_fetch("q", 3, ["bing"], _fetcher(calls, 1.0)), 0.05)
+        try:
+            await with_timeout
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0)
+        return dict(cache._inflight)
+
+    assert asyncio.run(run()) == {}
+
+
+def test_coalescing_is_per_k():
+    cache = srv.SearchCache(ttl=60)
+    calls = []
+
+    async def run():
+        fetch = _fetcher(calls, 0.05)
+        return await asyncio.gather(
+            cache.get_or_fetch("q", 3, ["bing"], fetch), cache.get_or_fetch("q", 8, ["bing"], fetch)
+        )
+
+    small, large = asyncio.run(run())
+    assert calls == ["q", "q"]
+    assert len(small) == 3 and len(large) == 8
+
+
+def test_memory_and_table_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(srv.SearchCache, "PRUNE_EVERY", 1)
+    path = str(tmp_path / "cache.sqlite3")
+    cache = srv.SearchCache(60, path, max_entries=2)
+    calls = []
+
+    async def run():
+        for q in ("a", "b", "a", "c"):
+            await cache.get_or_fetch(q, 3, ["bing"], _fetcher(calls))
+
+    asyncio.run(run())
+    # "a" was used more recently than "b", so "b" is the one evicted
+    assert list(cache._mem) == [srv.SearchCache.key(q, ["bing"]) for q in ("a", "c")]
+    assert cache.stats()["evictions"] == 1
+    (rows,) = cache._db().execute("SELECT COUNT(*) FROM search_results").fetchone()
+    assert rows == 2
+    cache.close()
+
+
+def test_memory_tier_stays_on_the_event_loop(tmp_path):
+    import threading
+    from collections import OrderedDict
+
+    threads = set()
+
+    class Watched(OrderedDict):
+        def __getitem__(self, key):
+            threads.add(threading.current_thread())
+            return super().__getitem__(key)
+
+        def __setitem__(self, key, value):
+            threads.add(threading.current_thread())
+            super().__setitem__(key, value)
+
+        def get(self, key, default=None):
+            threads.add(threading.current_thread())
+            return super().get(key, default)
+
+        def move_to_end(self, key, last=True):
+            threads.add(threading.current_thread())
+            super().move_to_end(key, last)
+
+    path = str(tmp_path / "cache.sqlite3")
+    warm = srv.SearchCache(60, path)
+    asyncio.run(warm.get_or_fetch("q", 3, ["bing"], _fetcher([])))
+    warm.close()
+    cache = srv.SearchCache(60, path)
+    cache._mem = Watched()
+
+    async def run():
+        await cache.get_or_fetch("q", 3, ["bing"], _fetcher([]))  # loaded from the table
+        await cache.get_or_fetch("other", 3, ["bing"], _fetcher([]))  # fetched and stored
+
+    asyncio.run(run())
+    cache.close()
+    assert threads == {threading.main_thread()}
@@ -0,0 +1,146 @@
+import asyncio
+
+import numpy as np
+
+import orchestrator.server as srv
+
+
+def _match(domain, vector=None, score=0.8):
+    return {
+        "text": f"about {domain}",
+        "score": score,
+        "vector": vector,
+        "metadata": {"domain": domain, "url": f"https://{domain}/", "text": "payload copy"},
+    }
+
+
+def test_similar_prompt_hits_and_distant_prompt_misses():
+    cache = srv.SemanticCache(10, threshold=0.9, ttl=60)
+    cache.put("LLM reasoning 2024", [1.0, 0.0, 0.0], [_match("a.com", [0.1, 0.2])])
+    matches, info = cache.get("LLM reasoning capabilities in 2024", [0.95, 0.2, 0.0])
+    assert [m["text"] for m in matches] == ["about a.com"]
+    assert "text" not in matches[0]["metadata"]
+    assert info["prompt"] == "LLM reasoning 2024" and info["merged"] == 1 and info["similarity"] > 0.97
+    assert cache.get("protein folding", [0.0, 1.0, 0.0]) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["min_hit_similarity"] > 0.97
+
+
+def test_hits_hand_out_copies():
+    cache = srv.SemanticCache(10, threshold=0.9, ttl=60)
+    cache.put("q", [1.0, 0.0], [_match("a.com")])
+    cache.get("q", [1.0, 0.0])[0][0]["metadata"]["source_type"] = "changed"
+    assert "source_type" not in cache.get("q", [1.0, 0.0])[0][0]["metadata"]
+
+
+def test_close_answers_are_merged_and_deduplicated():
+    cache = srv.SemanticCache(10, threshold=0.9, ttl=60, merge=3)
+    cache.put("first", [1.0, 0.0, 0.0], [_match("a.com", [1.0, 0.0]), _match("b.com", [0.0, 1.0])])
+    cache.put("second", [0.98, 0.1, 0.0], [_match("a.com", [1.0, 0.0]), _match("c.com", [0.7, 0.7])])
+    cache.put("unrelated", [0.0, 0.0, 1.0], [_match("d.com", [0.5, 0.5])])
+    matches, info = cache.get("first again", [1.0, 0.05, 0.0])
+    assert info["merged"] == 2
+    assert sorted(m["metadata"]["domain"] for m in matches) == ["a.com", "b.com", "c.com"]
+    assert cache.stats()["merged"] == 1
+
+
+def test_entries_expire_and_are_evicted_least_recently_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(srv.time, "time", lambda: now[0])
+    cache = srv.SemanticCache(2, threshold=0.9, ttl=60)
+    cache.put("a", [1.0, 0.0, 0.0], [_match("a.com")])
+    cache.put("b", [0.0, 1.0, 0.0], [_match("b.com")])
+    assert cache.get("a", [1.0, 0.0, 0.0]) is not None
+    cache.put("c", [0.0, 0.0, 1.0], [_match("c.com")])
+    assert cache.get("b", [0.0, 1.0, 0.0]) is None and cache.stats()["evictions"] == 1
+    now[0] += 61
+    assert cache.get("a", [1.0, 0.0, 0.0]) is None
+    assert len(cache) == 0 and cache.stats()["expirations"] == 2
+
+
+class WordEmbedder:
+    """Bag-of-words vectors, so rephrasings that share words are close."""
+
+    VOCAB = ["llm", "reasoning", "2024", "capabilities", "in", "protein", "folding"]
+
+    def encode(self, texts):
+        return np.array([[float(w in t.lower().split()) for w in self.VOCAB] for t in texts])
+
+
+def test_rephrased_prompt_is_served_without_web_traffic(monkeypatch):
+    monkeypatch.setattr(srv, "_embedder", srv.EmbeddingService(WordEmbedder))
+    monkeypatch.setattr(srv, "_vector_store", object())
+    monkeypatch.setattr(srv, "SEMANTIC_CACHE", srv.SemanticCache(10, threshold=0.7, ttl=60))
+    retrievals = []
+
+    async def fake_bulk_retrieve(queries, deadline=None):
+        retrievals.append(queries)
+        return {}
+
+    async def fake_search_many(queries, k):
+        return [[_match("a.com", [1.0, 0.0], 0.9), _match("b.com", [0.0, 1.0], 0.8)] for _ in queries]
+
+    monkeypatch.setattr(srv, "bulk_retrieve", fake_bulk_retrieve)
+    monkeypatch.setattr(srv, "_smart_rag_search_many", fake_search_many)
+
+    async def run():
+        try:
+            first = await srv._search_and_retrieve("LLM reasoning 2024", {})
+            again = await srv._search_and_retrieve("LLM reasoning capabilities in 2024", {})
+            forced = await srv._search_and_retrieve("LLM reasoning 2024", {"fresh": True})
+            other = await srv._search_and_retrieve("protein folding", {})
+            return first, again, forced, other
+        finally:
+            srv._embedder.close()
+
+    first, again, forced, other = asyncio.run(run())
+    assert len(retrievals) == 3
+    assert "semantic_cache" not in first[0] and "semantic_cache" not in forced[0]
+    assert again[0]["semantic_cache"]["prompt"] == "LLM reasoning 2024"
+    assert [m["text"] for m in again[1]] == [m["text"] for m in first[1]]
+    assert "semantic_cache" not in other[0]
+    assert srv.SEMANTIC_CACHE.stats()["hits"] == 1
+
+
+def test_near_misses_do_not_hit():
+    # Embeddings put these pairs far above any usable threshold; identical
+    # vectors make the signature check the only thing standing in the way
+    cache = srv.SemanticCache(10, threshold=0.95, ttl=60)
+    pairs = [
+        ("best open source LLM in 2023", "best open source LLM in 2024"),
+        ("does sqlite support concurrent writes", "does sqlite not support concurrent writes"),
+        ("why isn't my build cached", "why is my build cached"),
+        ("who founded OpenAI", "who founded Anthropic"),
+        ("Python 3.12 release notes", "Python 3.13 release notes"),
+    ]
+    for i, (stored, asked) in enumerate(pairs):
+        vector = np.eye(len(pairs))[i]
+        cache.put(stored, vector, [_match(f"{i}.com")])
+        assert cache.get(asked, vector) is None, asked
+        assert cache.get(f"{stored} explained", vector) is not None
+
+
+def test_cold_start_skips_the_lookup_but_fills_the_cache(monkeypatch):
+    monkeypatch.setattr(srv, "_embedder", None)
+    monkeypatch.setattr(srv, "SEMANTIC_CACHE", srv.SemanticCache(10, threshold=0.9, ttl=60))
+
+    async def fake_bulk_retrieve(queries, deadline=None):
+        # Startup finishes while the searches run
+        srv._embedder = srv.EmbeddingService(WordEmbedder)
+        return {}
+
+    async def fake_search_many(queries, k):
+        return [[_match("a.com", [1.0, 0.0], 0.9)] for _ in queries]
+
+    monkeypatch.setattr(srv, "bulk_retrieve", fake_bulk_retrieve)
+    monkeypatch.setattr(srv, "_smart_rag_search_many", fake_search_many)
+
+    async def run():
+        try:
+            return await srv._search_and_retrieve("LLM reasoning 2024", {})
+        finally:
+            srv._embedder.close()
+
+    header, matches = asyncio.run(run())
+    assert "semantic_cache" not in header and matches
+    assert len(srv.SEMANTIC_CACHE) == 1 and srv.SEMANTIC_CACHE.stats()["misses"] == 0
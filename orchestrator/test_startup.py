@@ -0,0 +1,87 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import orchestrator.server as srv
+
+
+def test_module_import_skips_heavy_dependencies():
+    code = (
+        "import sys, server; "
+        "print(sorted(m for m in ('torch', 'FlagEmbedding', 'qdrant_client', 'transformers') if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(srv.__file__).parent, capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip().splitlines()[-1] == "[]"
+
+
+class SlowModel:
+    loads = 0
+
+    def __init__(self):
+        SlowModel.loads += 1
+
+    def encode(self, texts):
+        return np.ones((len(texts), 2))
+
+
+@pytest.fixture
+def startup(monkeypatch):
+    SlowModel.loads = 0
+    connects = []
+
+    async def connect():
+        await asyncio.sleep(0.01)
+        connects.append(1)
+        srv._vector_store = object()
+
+    monkeypatch.setattr(srv, "_load_embed_model", SlowModel)
+    monkeypatch.setattr(srv, "_embedder", None)
+    monkeypatch.setattr(srv, "_vector_store", None)
+    monkeypatch.setattr(srv.Startup, "STEPS", (("embedder", srv._warm_embedder), ("vectors", connect)))
+    state = srv.Startup()
+    monkeypatch.setattr(srv, "STARTUP", state)
+    yield state, connects
+    if srv._embedder is not None:
+        srv._embedder.close()
+
+
+def test_tool_calls_wait_for_one_shared_warm_up(startup):
+    state, connects = startup
+
+    async def go():
+        state.start()
+        await asyncio.gather(*(srv._ensure_clients() for _ in range(5)))
+
+    asyncio.run(go())
+    assert SlowModel.loads == 1 and connects == [1]
+    assert srv._embedder is not None and srv._vector_store is not None
+    report = state.report()
+    assert {"embedder_s", "vectors_s", "embedder_ready_at_s", "vectors_ready_at_s", "ready_at_s"} <= set(report)
+
+
+def test_failed_warm_up_is_retried(startup, monkeypatch):
+    state, _ = startup
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("weights not downloaded")
+        return SlowModel()
+
+    monkeypatch.setattr(srv, "_load_embed_model", flaky)
+
+    async def go():
+        with pytest.raises(OSError):
+            await srv._ensure_clients()
+        assert srv._embedder is None
+        await srv._ensure_clients()
+
+    asyncio.run(go())
+    assert len(attempts) == 2 and srv._embedder is not None
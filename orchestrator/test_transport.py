@@ -0,0 +1,135 @@
+import asyncio
+import json
+import socket
+
+import httpx
+import pytest
+
+import orchestrator.server as srv
+from orchestrator.test_rag_search import _install_fakes
+
+
+def test_scheduler_admits_clients_round_robin():
+    async def run():
+        sched = srv.FairScheduler(max_concurrent=1, per_client=1)
+        order = []
+        release = asyncio.Event()
+
+        async def call(client, tag):
+            async with sched.slot(client):
+                order.append(tag)
+                await release.wait()
+
+        tasks = [asyncio.create_task(call("a", f"a{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("b", "b0")))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return order, sched.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["a0", "b0", "a1", "a2"]
+    assert stats == {"active": 0, "waiting": 0, "clients": 0}
+
+
+def test_scheduler_per_client_limit_and_cancelled_waiters():
+    async def run():
+        sched = srv.FairScheduler(max_concurrent=4, per_client=1)
+        running = []
+        release = asyncio.Event()
+
+        async def call(client):
+            async with sched.slot(client):
+                running.append(client)
+                await release.wait()
+
+        first = asyncio.create_task(call("a"))
+        queued = asyncio.create_task(call("a"))
+        other = asyncio.create_task(call("b"))
+        await asyncio.sleep(0.01)
+        assert sorted(running) == ["a", "b"] and sched.stats()["waiting"] == 1
+        queued.cancel()
+        await asyncio.sleep(0)
+        assert sched.stats()["waiting"] == 0
+        release.set()
+        await asyncio.gather(first, other)
+        return sched.stats()
+
+    assert asyncio.run(run())["active"] == 0
+
+
+def test_per_client_limit_applies_to_sse_only():
+    async def admitted(sched, calls):
+        running = []
+        release = asyncio.Event()
+
+        async def call():
+            async with sched.slot("stdio"):
+                running.append(1)
+                await release.wait()
+
+        tasks = [asyncio.create_task(call()) for _ in range(calls)]
+        await asyncio.sleep(0.01)
+        count = len(running)
+        release.set()
+        await asyncio.gather(*tasks)
+        return count
+
+    stdio = srv._make_scheduler("stdio")
+    sse = srv._make_scheduler("sse")
+    assert asyncio.run(admitted(stdio, srv.MAX_CONCURRENT_CALLS + 1)) == srv.MAX_CONCURRENT_CALLS
+    assert asyncio.run(admitted(sse, srv.MAX_CONCURRENT_CALLS)) == srv.MAX_CALLS_PER_CLIENT
+
+
+def test_unknown_tool_is_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(srv.call_tool("nope", {}))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_sse_clients_share_one_process(monkeypatch):
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+
+    model, _ = _install_fakes(monkeypatch)
+    port = _free_port()
+
+    async def client(name, query):
+        url = f"http://127.0.0.1:{port}/sse"
+        async with sse_client(url, headers={"X-MCP-Client": name}) as streams:
+            async with ClientSession(*streams) as session:
+                await session.initialize()
+                tools = await session.list_tools()
+                result = await session.call_tool("rag_query", {"query": query})
+                return [t.name for t in tools.tools], json.loads(result.content[0].text)
+
+    async def run():
+        task = asyncio.create_task(srv.serve_sse("127.0.0.1", port))
+        try:
+            async with httpx.AsyncClient() as http:
+                for _ in range(100):
+                    try:
+                        health = (await http.get(f"http://127.0.0.1:{port}/healthz")).json()
+                        break
+                    except httpx.ConnectError:
+                        await asyncio.sleep(0.05)
+            return health, await asyncio.gather(client("one", "alpha"), client("two", "beta"))
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    health, results = asyncio.run(run())
+    assert health["scheduler"]["active"] == 0
+    assert "hedge_delay_ms" in health["engines"] and "fetch_limit" in health["http"]
+    for tools, body in results:
+        assert set(tools) == {"search_and_retrieve", "rag_query"}
+        assert body["sources"]
+    assert {body["query"] for _, body in results} == {"alpha", "beta"}
+    # Both clients were served by the same embedder
+    assert sorted(q for call in model.calls for q in call) == ["alpha", "beta"]